@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the per-update cost of extracting a pull request's custom field
+values, against a project whose enum fields have hundreds of options.
+
+Run from the repository root:
+    ENV=test python scripts/benchmark_custom_field_extraction.py
+"""
+
+import argparse
+import os
+import sys
+import timeit
+from typing import Dict, List
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import src.asana.helpers as asana_helpers  # noqa: E402
+from test.impl.builders import builder, build  # noqa: E402
+
+
+def _enum_field(name: str, gid: str, option_names: List[str], subtype: str) -> Dict:
+    return {
+        "custom_field": {
+            "gid": gid,
+            "name": name,
+            "resource_subtype": subtype,
+            "enum_options": [
+                {"gid": f"{gid}-{i}", "name": option_name, "enabled": True}
+                for i, option_name in enumerate(option_names)
+            ],
+        }
+    }
+
+
+def _project_custom_fields(num_options: int, num_label_fields: int) -> List[Dict]:
+    # The options SGTM looks for are last, so that a linear scan would be worst case.
+    filler = [f"Option {i}" for i in range(num_options)]
+    fields = [
+        _enum_field(
+            "PR Status",
+            "pr-status",
+            filler + ["Open", "Draft", "Closed", "Merged"],
+            "enum",
+        ),
+        _enum_field("Build", "build", filler + ["Success", "Failure"], "enum"),
+        _enum_field(
+            "Review Status",
+            "review-status",
+            filler + ["Needs Review", "Changes Requested", "Approved"],
+            "enum",
+        ),
+        {
+            "custom_field": {
+                "gid": "branch",
+                "name": "Branch Name (SGTM)",
+                "resource_subtype": "text",
+            }
+        },
+    ]
+    for i in range(num_label_fields):
+        fields.append(
+            _enum_field(
+                f"Labels (SGTM) [repo-{i}]",
+                f"labels-{i}",
+                filler + ["bug", "enhancement"],
+                "multi_enum",
+            )
+        )
+    return fields
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--options", type=int, default=500)
+    parser.add_argument("--label-fields", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    custom_fields = _project_custom_fields(args.options, args.label_fields)
+    pull_request = build(
+        builder.pull_request()
+        .closed(False)
+        .isDraft(False)
+        .labels([builder.label().name("bug"), builder.label().name("enhancement")])
+    )
+
+    with patch(
+        "src.asana.helpers.dynamodb_client.get_asana_id_from_github_node_id",
+        return_value="project",
+    ), patch(
+        "src.asana.client.get_project_custom_fields", return_value=custom_fields
+    ), patch(
+        "src.config.SGTM_FEATURE__SYNC_GITHUB_LABELS_ENABLED", True
+    ):
+        # Compiling the project's settings is paid once per TTL, on the first update.
+        asana_helpers._project_custom_fields_cache.clear()
+        cold = timeit.timeit(
+            lambda: asana_helpers._custom_fields_from_pull_request(pull_request),
+            number=1,
+        )
+        warm = timeit.timeit(
+            lambda: asana_helpers._custom_fields_from_pull_request(pull_request),
+            number=args.iterations,
+        )
+
+    print(f"{len(custom_fields)} fields, {args.options} filler options per enum field")
+    print(f"first update (fetch + compile): {cold * 1e6:.1f}us")
+    print(f"subsequent updates: {warm / args.iterations * 1e6:.1f}us per update")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Benchmark of GraphQL queries through a fresh HTTPEndpoint per query (one TCP and TLS handshake
+each) against the pooled, keep-alive session that SGTM keeps per org, using a local HTTPS stub.
+
+Requires the openssl command line tool, to create a throwaway certificate. Run from the
+repository root:
+    ENV=test python scripts/benchmark_github_http_sessions.py
+"""
+
+import argparse
+import functools
+import json
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sgqlc.endpoint.http import HTTPEndpoint  # type: ignore
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.github.get_app_token import SessionURLOpener, new_http_session  # noqa: E402
+
+_RESPONSE = json.dumps({"data": {"viewer": {"login": "sgtm"}}}).encode()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(_RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, context: ssl.SSLContext):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.socket = context.wrap_socket(self.socket, server_side=True)
+        self.handshakes = 0
+
+    def process_request(self, request, client_address):
+        self.handshakes += 1
+        super().process_request(request, client_address)
+
+
+def _create_certificate(directory: str):
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "rsa:2048",
+            "-nodes",
+            "-days",
+            "1",
+            "-subj",
+            "/CN=127.0.0.1",
+            "-addext",
+            "subjectAltName=IP:127.0.0.1",
+            "-keyout",
+            key,
+            "-out",
+            cert,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return cert, key
+
+
+def _run(server: _StubServer, make_endpoint, queries: int):
+    server.handshakes = 0
+    start = time.perf_counter()
+    for _ in range(queries):
+        make_endpoint()("query { viewer { login } }")
+    return time.perf_counter() - start, server.handshakes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = _create_certificate(directory)
+        server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        server_context.load_cert_chain(cert, key)
+        server = _StubServer(server_context)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"https://127.0.0.1:{server.server_address[1]}/graphql"
+        headers = {"Authorization": "bearer token"}
+
+        client_context = ssl.create_default_context(cafile=cert)
+        fresh_urlopen = functools.partial(
+            urllib.request.urlopen, context=client_context
+        )
+        session = new_http_session()
+        session.verify = cert
+        # Keep CA bundle environment variables from overriding the stub certificate.
+        session.trust_env = False
+        pooled_endpoint = HTTPEndpoint(url, headers, urlopen=SessionURLOpener(session))
+
+        for name, make_endpoint in [
+            (
+                "new endpoint per query",
+                lambda: HTTPEndpoint(url, headers, urlopen=fresh_urlopen),
+            ),
+            ("pooled session", lambda: pooled_endpoint),
+        ]:
+            elapsed, handshakes = _run(server, make_endpoint, args.queries)
+            print(
+                f"{name}: {elapsed / args.queries * 1e3:.2f}ms per query, "
+                f"{handshakes} TLS handshakes for {args.queries} queries"
+            )
+
+        session.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
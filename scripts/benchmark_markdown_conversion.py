@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark of converting Github markdown to Asana rich text, over a corpus of realistic pull
+request descriptions and comments (Graphite stacks, Cursor Bugbot reviews, coverage tables...).
+Reports conversions per second and the peak memory allocated by a conversion, for a Markdown
+instance created per conversion and for the reused one.
+
+Run from the repository root:
+    ENV=test python scripts/benchmark_markdown_conversion.py
+"""
+
+import argparse
+import glob
+import os
+import sys
+import timeit
+import tracemalloc
+from typing import Callable, Dict
+
+import mistune  # type: ignore
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.markdown_parser import (  # noqa: E402
+    GithubToAsanaRenderer,
+    convert_github_markdown_to_asana_xml,
+)
+
+CORPUS_DIRECTORY = os.path.join(os.path.dirname(__file__), "markdown_corpus")
+
+
+def _load_corpus() -> Dict[str, str]:
+    corpus = {}
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIRECTORY, "*.md"))):
+        with open(path) as f:
+            corpus[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    return corpus
+
+
+def _convert_with_new_markdown(text: str) -> str:
+    # What convert_github_markdown_to_asana_xml used to do
+    markdown = mistune.create_markdown(
+        renderer=GithubToAsanaRenderer(escape=False),
+        plugins=["strikethrough"],
+    )
+    return markdown(text)
+
+
+def _peak_allocated(convert: Callable[[str], str], text: str) -> int:
+    """Returns the most memory allocated at once during a conversion"""
+    convert(text)
+    tracemalloc.start()
+    convert(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    corpus = _load_corpus()
+    for name, convert in [
+        ("new Markdown per conversion", _convert_with_new_markdown),
+        ("reused Markdown", convert_github_markdown_to_asana_xml),
+    ]:
+        print(name)
+        for document, text in corpus.items():
+            assert convert(text) == convert_github_markdown_to_asana_xml(text)
+            seconds = timeit.timeit(lambda: convert(text), number=args.iterations)
+            peak = _peak_allocated(convert, text)
+            print(
+                f"  {document:<16} {args.iterations / seconds:>8.0f} conversions/s,"
+                f" peak {peak / 1024:>7.1f}KiB allocated"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark of auto-linking bare URLs on pathological inputs, for the regex SGTM used to use and
+for the linear-time scanner that replaced it. The regex backtracks exponentially on a URL
+followed by a run of punctuation and an unclosed parenthesis; the scanner's time grows linearly
+with the input.
+
+Run from the repository root:
+    ENV=test python scripts/benchmark_url_scanning.py
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from typing import Callable, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.markdown_parser import _link_bare_urls  # noqa: E402
+
+# The regex _link_bare_urls replaced, from https://gist.github.com/gruber/8891611
+GRUBER_URL_REGEX = re.compile(
+    r"""(?i)([^"\>\<\/\.]|^)\b((?:https?:(/{1,3}))(?:[^\s()<>{}\[\]]+|\([^\s()]*?\([^\s()]+\)[^\s()]*?\)|\([^\s]+?\))+(?:\([^\s()]*?\([^\s()]+\)[^\s()]*?\)|\([^\s]+?\)|[^\s`!()\[\]{};:'".,<>?«»“”‘’]))"""
+)
+
+# Pathological inputs, by how many times their repeated part is repeated
+PATHOLOGICAL_INPUTS: Dict[str, Callable[[int], str]] = {
+    "punctuation then (": lambda n: "http://a" + "!" * n + "(",
+    "unclosed parens": lambda n: "https://a" + "(" * n,
+    "balanced parens": lambda n: "https://a" + "(b)" * n + "!",
+    "long url": lambda n: "https://example.com/" + "a" * n,
+}
+
+
+def _link_with_regex(text: str) -> str:
+    return GRUBER_URL_REGEX.sub(
+        lambda match: match.group(1)
+        + f'<a href="{match.group(2)}">{match.group(2)}</a>',
+        text,
+    )
+
+
+def _seconds(link: Callable[[str], str], text: str) -> float:
+    start = time.perf_counter()
+    link(text)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--regex-limit-seconds",
+        type=float,
+        default=2,
+        help="stop growing an input for the regex once it takes this long",
+    )
+    args = parser.parse_args()
+
+    for name, make_input in PATHOLOGICAL_INPUTS.items():
+        print(name)
+        regex_too_slow = False
+        for n in [10, 14, 18, 20, 22, 1000, 100000]:
+            text = make_input(n)
+            scanner = _seconds(_link_bare_urls, text)
+            if regex_too_slow:
+                regex = "skipped"
+            else:
+                seconds = _seconds(_link_with_regex, text)
+                regex_too_slow = seconds > args.regex_limit_seconds
+                regex = f"{seconds * 1000:.2f}ms"
+            print(f"  n={n:<7} regex {regex:>12}   scanner {scanner * 1000:>9.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,44 @@
-from typing import List, Iterator, Dict, Optional
+import io
+import time
+import uuid
+from typing import Any, BinaryIO, List, Iterator, Dict, Optional, Tuple
 from typing_extensions import Literal
 import asana  # type: ignore
+from asana.client import STATUS_MAP as ASANA_STATUS_ERRORS  # type: ignore
+from asana.error import AsanaError, ServerError  # type: ignore
 from src.config import ASANA_API_KEY
+from src.logger import logger
 
 # See: https://developers.asana.com/docs/input-output-options
 # As we use more opt_fields, add to this list
-OptFields = Literal["custom_fields"]
+OptFields = Literal["custom_fields", "due_on", "assignee"]
+
+
+class AsanaTask(object):
+    """
+    A lightweight, read-only record of the task fields SGTM reads. Fields that weren't requested
+    through opt_fields are None.
+    """
+
+    __slots__ = ("gid", "due_on", "assignee_gid")
+
+    def __init__(
+        self, gid: str, due_on: Optional[str] = None, assignee_gid: Optional[str] = None
+    ):
+        self.gid = gid
+        self.due_on = due_on
+        self.assignee_gid = assignee_gid
+
+    @staticmethod
+    def from_dict(task: dict) -> "AsanaTask":
+        return AsanaTask(
+            gid=task.get("gid", ""),
+            due_on=task.get("due_on"),
+            assignee_gid=(task.get("assignee") or {}).get("gid"),
+        )
+
+    def __repr__(self) -> str:
+        return f"AsanaTask(gid={self.gid!r}, due_on={self.due_on!r}, assignee_gid={self.assignee_gid!r})"
 
 
 def validate_object_id(object_id: str, message: str):
@@ -22,6 +55,222 @@ def validate_object_id(object_id: str, message: str):
         raise ValueError(message)
 
 
+def _validate_update_task(task_id: str, fields: dict):
+    validate_object_id(task_id, "AsanaClient.update_task requires a task_id")
+    if fields is None or not fields:
+        raise ValueError(
+            "AsanaClient.update_task requires a collection of fields to upsert"
+        )
+
+
+def _validate_add_followers(task_id: str, followers: List[str]):
+    validate_object_id(task_id, "AsanaClient.add_followers requires a task_id")
+    if followers is None or not followers:
+        raise ValueError(
+            "AsanaClient.add_followers requires a list of followers to add"
+        )
+    for follower in followers:
+        validate_object_id(follower, "Followers should be Asana domain-user-ids")
+
+
+class BatchedWrite(object):
+    """
+    The outcome of a write submitted through a WriteBatch. Once the batch is executed, either body
+    holds the response data of the write, or error holds the AsanaError it failed with.
+    """
+
+    def __init__(self, description: str):
+        self.description = description
+        self.body: Optional[Any] = None
+        self.error: Optional[Exception] = None
+
+    def raise_for_error(self):
+        """
+        Raises the error the write failed with, if any, as if it had been made directly
+        """
+        if self.error is not None:
+            raise self.error
+
+
+def _retry_after_seconds(headers: Optional[Dict[str, str]]) -> Optional[float]:
+    for name, value in (headers or {}).items():
+        if name.lower() == "retry-after":
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
+
+
+class WriteBatch(object):
+    """
+    Collects Asana writes, and submits them through Asana's batch API, which runs up to
+    MAX_ACTIONS_PER_REQUEST actions per request. Actions in a batch are independent: one failing
+    doesn't prevent the others, and each action's outcome is reported on its BatchedWrite.
+    See: https://developers.asana.com/reference/createbatchrequest
+    """
+
+    MAX_ACTIONS_PER_REQUEST = 10
+
+    def __init__(self, asana_api_client: asana.Client):
+        self.asana_api_client = asana_api_client
+        self._actions: List[Tuple[Dict, BatchedWrite]] = []
+
+    def __len__(self) -> int:
+        return len(self._actions)
+
+    def update_task(self, task_id: str, fields: dict) -> BatchedWrite:
+        """
+        Queues an update of the specified Asana task, setting the provided fields
+        """
+        _validate_update_task(task_id, fields)
+        return self._add_action(
+            {"relative_path": f"/tasks/{task_id}", "method": "put", "data": fields},
+            f"update task {task_id}",
+        )
+
+    def complete_task(self, task_id: str) -> BatchedWrite:
+        return self.update_task(task_id, {"completed": True})
+
+    def add_followers(self, task_id: str, followers: List[str]) -> BatchedWrite:
+        """
+        Queues adding followers to the specified task. The followers should be Asana domain-user ids.
+        """
+        _validate_add_followers(task_id, followers)
+        return self._add_action(
+            {
+                "relative_path": f"/tasks/{task_id}/addFollowers",
+                "method": "post",
+                "data": {"followers": followers},
+            },
+            f"add followers to task {task_id}",
+        )
+
+    def execute(self) -> None:
+        """
+        Submits the queued writes, and records the outcome of each on its BatchedWrite. python-asana
+        only retries the batch request itself, so writes that are rate limited (429) or hit a server
+        error (5xx) are retried here the way it retries requests: after their Retry-After delay, or
+        with exponential backoff, up to the client's max_retries times. If a batch request fails as
+        a whole, each of its writes gets that request's error.
+        """
+        actions, self._actions = self._actions, []
+        max_retries = self.asana_api_client.options["max_retries"]
+        for retry_count in range(max_retries + 1):
+            retryable_actions, retry_after = self._execute_actions(actions)
+            if not retryable_actions or retry_count == max_retries:
+                return
+            if retry_after is None:
+                retry_after = self.asana_api_client.RETRY_DELAY * (
+                    self.asana_api_client.RETRY_BACKOFF**retry_count
+                )
+            logger.warning(
+                f"Retrying {len(retryable_actions)} Asana batch actions in {retry_after}s"
+            )
+            time.sleep(retry_after)
+            actions = retryable_actions
+
+    def _execute_actions(
+        self, actions: List[Tuple[Dict, BatchedWrite]]
+    ) -> Tuple[List[Tuple[Dict, BatchedWrite]], Optional[float]]:
+        """
+        Submits the actions once. Returns the ones that failed with a retryable status, and the
+        longest Retry-After delay they asked for, if any.
+        """
+        retryable_actions = []
+        retry_after: Optional[float] = None
+        for start in range(0, len(actions), self.MAX_ACTIONS_PER_REQUEST):
+            chunk = actions[start : start + self.MAX_ACTIONS_PER_REQUEST]
+            try:
+                results = self.asana_api_client.post(
+                    "/batch", {"actions": [action for action, _ in chunk]}
+                )
+            except Exception as e:
+                logger.error(f"Asana batch request of {len(chunk)} actions failed: {e}")
+                for _, write in chunk:
+                    write.error = e
+                continue
+
+            for (action, write), result in zip(chunk, results):
+                status_code = result["status_code"]
+                body = result.get("body") or {}
+                if 200 <= status_code < 300:
+                    write.body = body.get("data")
+                    write.error = None
+                    continue
+                messages = "; ".join(
+                    error.get("message", "") for error in body.get("errors") or []
+                )
+                write.error = AsanaError(
+                    message=f"Failed to {write.description} ({status_code}): {messages}",
+                    status=status_code,
+                )
+                if status_code == 429 or 500 <= status_code < 600:
+                    retryable_actions.append((action, write))
+                    action_retry_after = _retry_after_seconds(result.get("headers"))
+                    if action_retry_after is not None:
+                        retry_after = max(retry_after or 0.0, action_retry_after)
+        return retryable_actions, retry_after
+
+    def _add_action(self, action: Dict, description: str) -> BatchedWrite:
+        write = BatchedWrite(description)
+        self._actions.append((action, write))
+        return write
+
+
+class MultipartFileBody(object):
+    """
+    A multipart/form-data request body with a single file field, which reads the file from a stream
+    as the request is sent, rather than building the whole body in memory like requests' files=
+    does. Its length is known upfront, so that it's sent with a Content-Length.
+    """
+
+    def __init__(
+        self,
+        stream: BinaryIO,
+        size: int,
+        file_name: str,
+        file_type: Optional[str] = None,
+    ):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        # Quotes and newlines would end the header, so they're percent-encoded, like browsers do
+        quoted_file_name = (
+            file_name.replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+        )
+        head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{quoted_file_name}"\r\n'
+            + (f"Content-Type: {file_type}\r\n" if file_type else "")
+            + "\r\n"
+        ).encode()
+        tail = f"\r\n--{boundary}--\r\n".encode()
+        self._head = io.BytesIO(head)
+        self._stream = stream
+        self._stream_remaining = size
+        self._tail = io.BytesIO(tail)
+        self._length = len(head) + size + len(tail)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._length
+        chunk = self._head.read(size)
+        if chunk:
+            return chunk
+        if self._stream_remaining > 0:
+            chunk = self._stream.read(min(size, self._stream_remaining))
+            if not chunk:
+                raise IOError(
+                    f"Attachment stream ended {self._stream_remaining} bytes early"
+                )
+            self._stream_remaining -= len(chunk)
+            return chunk
+        return self._tail.read(size)
+
+
 class AsanaClient(object):
     """
     Encapsulates the Asana client interface, as exposed to the world. There is a single (singleton) instance of
@@ -47,12 +296,20 @@ class AsanaClient(object):
             cls._singleton = AsanaClient()
         return cls._singleton
 
-    def get_task(self, task_id: str) -> dict:
+    def get_task(
+        self, task_id: str, opt_fields: Optional[List[OptFields]] = None
+    ) -> AsanaTask:
         """
-        Gets an Asana Task given a task id
+        Gets an Asana Task given a task id. `opt_fields` limits the response to the fields the
+        caller needs; by default, the full task is fetched.
+        See: https://developers.asana.com/docs/input-output-options
         """
         validate_object_id(task_id, "AsanaClient.get_task requires a task_id")
-        return self.asana_api_client.tasks.find_by_id(task_id)
+        if opt_fields is None:
+            task = self.asana_api_client.tasks.find_by_id(task_id)
+        else:
+            task = self.asana_api_client.tasks.find_by_id(task_id, fields=opt_fields)
+        return AsanaTask.from_dict(task)
 
     def create_task(self, project_id: str, due_date_str: Optional[str] = None) -> str:
         """
@@ -70,24 +327,14 @@ class AsanaClient(object):
         """
         Updates the specified Asana task, setting the provided fields
         """
-        validate_object_id(task_id, "AsanaClient.update_task requires a task_id")
-        if fields is None or not fields:
-            raise ValueError(
-                "AsanaClient.update_task requires a collection of fields to upsert"
-            )
+        _validate_update_task(task_id, fields)
         self.asana_api_client.tasks.update(task_id, fields)
 
     def add_followers(self, task_id: str, followers: List[str]):
         """
         Adds followers to the specified task. The followers should be Asana domain-user ids.
         """
-        validate_object_id(task_id, "AsanaClient.add_followers requires a task_id")
-        if followers is None or not followers:
-            raise ValueError(
-                "AsanaClient.add_followers requires a list of followers to add"
-            )
-        for follower in followers:
-            validate_object_id(follower, "Followers should be Asana domain-user-ids")
+        _validate_add_followers(task_id, followers)
         self.asana_api_client.tasks.add_followers(task_id, {"followers": followers})
 
     def add_comment(self, task_id: str, comment_body: str) -> str:
@@ -117,6 +364,9 @@ class AsanaClient(object):
         )
         self.asana_api_client.stories.delete(comment_id)
 
+    def new_write_batch(self) -> WriteBatch:
+        return WriteBatch(self.asana_api_client)
+
     def get_project_custom_fields(self, project_id: str) -> Iterator[Dict]:
         return self.asana_api_client.custom_field_settings.find_by_project(project_id)
 
@@ -140,17 +390,53 @@ class AsanaClient(object):
         attachment_content: str,
         attachment_name: str,
         attachment_type: Optional[str] = None,
+        timeout: Optional[float] = None,
     ) -> None:
+        options = {} if timeout is None else {"timeout": timeout}
         self.asana_api_client.attachments.create_on_task(
-            task_id, attachment_content, attachment_name, attachment_type
+            task_id, attachment_content, attachment_name, attachment_type, **options
+        )
+
+    def create_attachment_on_task_from_stream(
+        self,
+        task_id: str,
+        stream: BinaryIO,
+        size: int,
+        attachment_name: str,
+        attachment_type: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """
+        Uploads size bytes read from stream as an attachment, without holding the whole file in
+        memory, returning the attachment's gid. A stream can't be replayed, so the upload isn't
+        retried.
+        """
+        validate_object_id(
+            task_id,
+            "AsanaClient.create_attachment_on_task_from_stream requires a task_id",
         )
+        body = MultipartFileBody(stream, size, attachment_name, attachment_type)
+        # asana.Client.request serializes every body to JSON, so this goes through its session
+        api_client = self.asana_api_client
+        response = api_client.session.post(
+            api_client.options["base_url"] + f"/tasks/{task_id}/attachments",
+            data=body,
+            headers=dict(api_client.headers, **{"Content-Type": body.content_type}),
+            auth=api_client.auth,
+            timeout=timeout,
+        )
+        if response.status_code in ASANA_STATUS_ERRORS:
+            raise ASANA_STATUS_ERRORS[response.status_code](response)
+        if 500 <= response.status_code < 600:
+            raise ServerError(response)
+        return response.json()["data"]["gid"]
 
 
-def get_task(task_id: str) -> dict:
+def get_task(task_id: str, opt_fields: Optional[List[OptFields]] = None) -> AsanaTask:
     """
-    Gets an Asana Task given a task id
+    Gets an Asana Task given a task id, limited to opt_fields if provided
     """
-    return AsanaClient.singleton().get_task(task_id)
+    return AsanaClient.singleton().get_task(task_id, opt_fields)
 
 
 def create_task(project_id: str, due_date_str: Optional[str] = None) -> str:
@@ -178,6 +464,13 @@ def add_followers(task_id: str, followers: List[str]):
     return AsanaClient.singleton().add_followers(task_id, followers)
 
 
+def new_write_batch() -> WriteBatch:
+    """
+    Creates a batch of writes, to be submitted together with WriteBatch.execute
+    """
+    return AsanaClient.singleton().new_write_batch()
+
+
 def add_comment(task_id: str, comment_body: str) -> str:
     """
     Adds a html-formatted comment to the specified task. The comment will be posted on behalf of the SGTM
@@ -212,7 +505,21 @@ def create_attachment_on_task(
     attachment_content: str,
     attachment_name: str,
     attachment_type: Optional[str] = None,
+    timeout: Optional[float] = None,
 ) -> None:
     AsanaClient.singleton().create_attachment_on_task(
-        task_id, attachment_content, attachment_name, attachment_type
+        task_id, attachment_content, attachment_name, attachment_type, timeout
+    )
+
+
+def create_attachment_on_task_from_stream(
+    task_id: str,
+    stream: BinaryIO,
+    size: int,
+    attachment_name: str,
+    attachment_type: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> str:
+    return AsanaClient.singleton().create_attachment_on_task_from_stream(
+        task_id, stream, size, attachment_name, attachment_type, timeout
     )
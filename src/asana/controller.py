@@ -1,9 +1,12 @@
-from typing import List, Optional
+import hashlib
+import json
+from typing import Dict, List, Optional
 
 import src.asana.client as asana_client
 import src.asana.helpers as asana_helpers
 import src.asana.logic as asana_logic
 import src.aws.dynamodb_client as dynamodb_client
+import src.metrics as metrics
 from src.config import SGTM_FEATURE__AUTOCOMPLETE_ENABLED
 from src.github.models import Comment, PullRequest, Review
 from src.github.logic import (
@@ -13,6 +16,10 @@ from src.github.logic import (
 from src.logger import logger
 
 
+# The task fields _new_due_on_or_none reads
+_DUE_DATE_TASK_FIELDS: List[asana_client.OptFields] = ["due_on", "assignee"]
+
+
 def create_task(repository_id: str) -> Optional[str]:
     project_id = dynamodb_client.get_asana_id_from_github_node_id(repository_id)
     if project_id is None:
@@ -36,7 +43,7 @@ def update_task(
     update_task_fields = asana_helpers.extract_task_fields_from_pull_request(
         pull_request
     )
-    task = asana_client.get_task(task_id)
+    task = asana_client.get_task(task_id, opt_fields=_DUE_DATE_TASK_FIELDS)
     new_due_on = (
         asana_helpers.today_str()
         if force_update_due_today
@@ -45,57 +52,166 @@ def update_task(
     if new_due_on is not None:
         update_task_fields["due_on"] = new_due_on
 
-    logger.info(f"Updating task {task_id} with fields: {update_task_fields}")
-    asana_client.update_task(task_id, update_task_fields)
+    # Only send the fields that changed since they were last written to the task.
+    field_hashes = _task_field_hashes(update_task_fields)
+    changed_task_fields = _changed_task_fields(
+        update_task_fields,
+        field_hashes,
+        dynamodb_client.get_task_field_hashes(pull_request.id()),
+    )
+    unchanged_field_count = len(field_hashes) - len(
+        _task_field_hashes(changed_task_fields)
+    )
+    if unchanged_field_count > 0:
+        metrics.increment("asana.task_fields_skipped", unchanged_field_count)
+
+    # All of the writes below are submitted together through Asana's batch API, so the
+    # followers and completions no longer wait for the task update to succeed. They don't
+    # depend on it, and they're idempotent: when the task update's error is raised below and
+    # the event is retried, repeating them changes nothing.
+    batch = asana_client.new_write_batch()
+    if changed_task_fields:
+        logger.info(f"Updating task {task_id} with fields: {changed_task_fields}")
+        task_update = batch.update_task(task_id, changed_task_fields)
+    else:
+        logger.info(f"Task {task_id} is up to date, skipping its update")
+        metrics.increment("asana.task_updates_skipped")
+        task_update = None
     # Add followers is optional because Asana should automatically add followers
     # if the body contains well-formatted data-asana-gid fields. Also bots can sometimes create comments,
     # reviews, and PRs which may or may not be included in the github handle to asana id mappings
-    if len(followers) > 0:
-        asana_client.add_followers(task_id, followers)
-    maybe_complete_tasks_on_merge(pull_request)
+    followers_update = (
+        batch.add_followers(task_id, followers) if len(followers) > 0 else None
+    )
+    completions = _queue_tasks_to_complete_on_merge(pull_request, batch)
+    batch.execute()
+
+    _handle_completions_on_merge(pull_request, completions)
+    if task_update is not None:
+        task_update.raise_for_error()
+        dynamodb_client.set_task_field_hashes(pull_request.id(), field_hashes)
+    if followers_update is not None:
+        followers_update.raise_for_error()
+
+
+def _task_field_hashes(task_fields: dict) -> Dict[str, str]:
+    """
+    Hashes each task field, and each custom field separately, by name (custom fields are named
+    "custom_fields.<gid>"). The due date isn't hashed, since it's only set when it needs to change.
+    """
+    field_hashes = {}
+    for name, value in task_fields.items():
+        if name == "due_on":
+            continue
+        elif name == "custom_fields":
+            for custom_field_gid, custom_field_value in value.items():
+                field_hashes[f"custom_fields.{custom_field_gid}"] = _hash_field_value(
+                    custom_field_value
+                )
+        else:
+            field_hashes[name] = _hash_field_value(value)
+    return field_hashes
+
+
+def _hash_field_value(value) -> str:
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True, default=str).encode()
+    ).hexdigest()[:16]
 
 
-def _new_due_on_or_none(task: dict, update_task_fields: dict) -> Optional[str]:
+def _changed_task_fields(
+    task_fields: dict,
+    field_hashes: Dict[str, str],
+    previous_field_hashes: Dict[str, str],
+) -> dict:
+    """
+    Returns the task fields whose hashes differ from the previously written ones, keeping only
+    the changed custom fields.
+    """
+    changed_task_fields = {}
+    for name, value in task_fields.items():
+        if name == "due_on":
+            changed_task_fields[name] = value
+        elif name == "custom_fields":
+            changed_custom_fields = {
+                custom_field_gid: custom_field_value
+                for custom_field_gid, custom_field_value in value.items()
+                if field_hashes[f"custom_fields.{custom_field_gid}"]
+                != previous_field_hashes.get(f"custom_fields.{custom_field_gid}")
+            }
+            if changed_custom_fields:
+                changed_task_fields[name] = changed_custom_fields
+        elif field_hashes[name] != previous_field_hashes.get(name):
+            changed_task_fields[name] = value
+    return changed_task_fields
+
+
+def _new_due_on_or_none(
+    task: asana_client.AsanaTask, update_task_fields: dict
+) -> Optional[str]:
     today = asana_helpers.today_str()
 
-    if task.get("due_on") and task["due_on"] >= today:
+    if task.due_on and task.due_on >= today:
         # don't update due dates that aren't stale
         return None
-    elif (task.get("assignee") or {}).get("gid") != update_task_fields.get("assignee"):
+    elif task.assignee_gid != update_task_fields.get("assignee"):
         # if the task is switching assignees, update the due date to today
         return today
     return None
 
 
 def maybe_complete_tasks_on_merge(pull_request: PullRequest):
+    batch = asana_client.new_write_batch()
+    completions = _queue_tasks_to_complete_on_merge(pull_request, batch)
+    batch.execute()
+    _handle_completions_on_merge(pull_request, completions)
+
+
+def _queue_tasks_to_complete_on_merge(
+    pull_request: PullRequest, batch: asana_client.WriteBatch
+) -> Optional[Dict[str, asana_client.BatchedWrite]]:
+    """
+    Queues the completion of the tasks linked to the pull request, if they should be completed
+    now. Returns the queued completions by task id, or None if tasks shouldn't be completed.
+    """
     if asana_logic.should_autocomplete_tasks_on_merge(pull_request):
         task_ids_to_complete_on_merge = asana_helpers.get_linked_task_ids(pull_request)
         logger.info(f"Task IDs to complete on merge: {task_ids_to_complete_on_merge}")
-        failed_tasks = []
-        for complete_on_merge_task_id in task_ids_to_complete_on_merge:
-            try:
-                asana_client.complete_task(complete_on_merge_task_id)
-                logger.info(
-                    f"Successfully completed Asana task {complete_on_merge_task_id} for merged PR {pull_request.url()}"
-                )
-            except Exception as e:
-                task_url = asana_helpers.task_url_from_task_id(
-                    complete_on_merge_task_id
-                )
-                logger.error(
-                    f"Failed to complete Asana task {complete_on_merge_task_id} "
-                    f"({task_url}) for PR {pull_request.url()}. Error: {str(e)}"
-                )
-                failed_tasks.append((task_url, str(e)))
-        if len(failed_tasks) > 0:
-            maybe_add_autocomplete_failure_comment(pull_request, failed_tasks)
-        else:
-            maybe_remove_autocomplete_failure_comment(pull_request)
+        return {
+            task_id: batch.complete_task(task_id)
+            for task_id in task_ids_to_complete_on_merge
+        }
     else:
         logger.info(
             f"Pull Request did not autocomplete linked tasks. One of the following conditions was not met: "
             f"{SGTM_FEATURE__AUTOCOMPLETE_ENABLED}, {pull_request.merged()}, {pull_request.labels()}"
         )
+        return None
+
+
+def _handle_completions_on_merge(
+    pull_request: PullRequest,
+    completions: Optional[Dict[str, asana_client.BatchedWrite]],
+):
+    if completions is None:
+        return
+    failed_tasks = []
+    for complete_on_merge_task_id, completion in completions.items():
+        if completion.error is None:
+            logger.info(
+                f"Successfully completed Asana task {complete_on_merge_task_id} for merged PR {pull_request.url()}"
+            )
+        else:
+            task_url = asana_helpers.task_url_from_task_id(complete_on_merge_task_id)
+            logger.error(
+                f"Failed to complete Asana task {complete_on_merge_task_id} "
+                f"({task_url}) for PR {pull_request.url()}. Error: {str(completion.error)}"
+            )
+            failed_tasks.append((task_url, str(completion.error)))
+    if len(failed_tasks) > 0:
+        maybe_add_autocomplete_failure_comment(pull_request, failed_tasks)
+    else:
+        maybe_remove_autocomplete_failure_comment(pull_request)
 
 
 def upsert_github_comment_to_task(comment: Comment, task_id: str):
@@ -141,6 +257,12 @@ def upsert_github_review_to_task(review: Review, task_id: str):
         dynamodb_client.insert_github_node_to_asana_id_mapping(
             github_review_id, asana_comment_id
         )
+        # Comment deletion webhooks only identify the review by its databaseId
+        review_database_id = review.database_id()
+        if review_database_id is not None:
+            dynamodb_client.insert_github_review_database_id_mapping(
+                review_database_id, github_review_id
+            )
     else:
         logger.info(
             f"Review {github_review_id} already synced to task {task_id}. Updating."
@@ -1,19 +1,43 @@
 import re
 import collections
+import hashlib
+import json
+import tempfile
+import threading
+import time
 import urllib.request
-from urllib.parse import urlparse
-from bs4 import BeautifulSoup, Tag
+from urllib.parse import urlparse, urlunparse
+from asana.error import RetryableAsanaError  # type: ignore
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from html import escape
-from typing import Callable, Match, Optional, List, Dict, Set, cast, Union
-from dataclasses import dataclass
+from typing import (
+    BinaryIO,
+    Callable,
+    Iterable,
+    Iterator,
+    Match,
+    Optional,
+    List,
+    Dict,
+    Set,
+    Tuple,
+    cast,
+    Union,
+)
+from dataclasses import asdict, dataclass
+from functools import cached_property
 
 import src.asana.client as asana_client
 import src.asana.logic as asana_logic
 import src.github.logic as github_logic
 import src.aws.dynamodb_client as dynamodb_client
 import src.aws.s3_client as s3_client
+import src.aws.sqs_client as sqs_client
 import src.config as config
+import src.metrics as metrics
+from src.cache import Cache
 from src.github.models import (
     Comment,
     PullRequest,
@@ -24,7 +48,10 @@ from src.github.models import (
     AssigneeReason,
 )
 from src.logger import logger
-from src.markdown_parser import convert_github_markdown_to_asana_xml
+from src.markdown_parser import (
+    convert_github_markdown_to_asana_xml,
+    extract_media_tag_attrs,
+)
 
 AttachmentData = collections.namedtuple(
     "AttachmentData", "file_name file_url file_type"
@@ -219,6 +246,148 @@ _custom_fields_to_extract = [
 ]
 
 
+@dataclass(frozen=True)
+class CompiledCustomField:
+    """
+    A project's custom field setting, precompiled for lookups.
+
+    Attributes:
+        gid: The gid of the custom field
+        name: The name of the custom field
+        resource_subtype: The Asana resource subtype, e.g. "enum", "multi_enum", "people", "text"
+        enum_option_gids: The enabled enum options of the field, by name
+    """
+
+    gid: str
+    name: str
+    resource_subtype: str
+    enum_option_gids: Dict[str, str]
+
+    @staticmethod
+    def from_asana(custom_field: dict) -> "CompiledCustomField":
+        return CompiledCustomField(
+            gid=custom_field["gid"],
+            name=custom_field["name"],
+            resource_subtype=custom_field["resource_subtype"],
+            enum_option_gids=_enabled_enum_option_gids(custom_field),
+        )
+
+    def value_for(
+        self, value_name: Union[str, List[str], None]
+    ) -> Optional[Union[str, List[str]]]:
+        """
+        Maps an extracted value to the value Asana expects for this field: enum option gids for
+        enum fields, and the value itself otherwise.
+        """
+        if value_name is None:
+            return None
+        if self.resource_subtype == "enum":
+            return self.enum_option_gids.get(cast(str, value_name))
+        elif self.resource_subtype == "multi_enum":
+            return [
+                self.enum_option_gids[value]
+                for value in value_name
+                if value in self.enum_option_gids
+            ]
+        else:
+            return value_name
+
+    def is_missing_enum_options(self, value_name: Union[str, List[str], None]) -> bool:
+        """
+        True if this is an enum field, and the extracted value isn't one of its enabled options.
+        """
+        if value_name is None:
+            return False
+        if self.resource_subtype == "enum":
+            return value_name not in self.enum_option_gids
+        elif self.resource_subtype == "multi_enum":
+            return any(value not in self.enum_option_gids for value in value_name)
+        return False
+
+
+@dataclass(frozen=True)
+class ProjectCustomFields:
+    """
+    The custom field settings of a project, by field name, as of fetched_at.
+    """
+
+    fields_by_name: Dict[str, CompiledCustomField]
+    fetched_at: float
+
+    @cached_property
+    def extraction_plan(self) -> List[Tuple[CustomField, List[CompiledCustomField]]]:
+        """
+        The project's fields that each entry of _custom_fields_to_extract matches, resolved once
+        per project rather than once per pull request. Entries that match no field are omitted.
+        """
+        plan = []
+        for custom_field_config in _custom_fields_to_extract:
+            matching_fields = [
+                field
+                for name, field in self.fields_by_name.items()
+                if custom_field_config.matcher(name)
+            ]
+            if matching_fields:
+                plan.append((custom_field_config, matching_fields))
+        return plan
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @staticmethod
+    def from_json(serialized: str) -> "ProjectCustomFields":
+        raw = json.loads(serialized)
+        return ProjectCustomFields(
+            fields_by_name={
+                name: CompiledCustomField(**field)
+                for name, field in raw["fields_by_name"].items()
+            },
+            fetched_at=raw["fetched_at"],
+        )
+
+
+# A project that is missing an enum option is refetched at most this often, in
+# case the option was added since the settings were cached.
+_PROJECT_CUSTOM_FIELDS_MIN_REFRESH_SECONDS = 60
+
+_project_custom_fields_cache: Cache[ProjectCustomFields] = Cache(
+    "asana.project_custom_fields",
+    ttl_seconds=config.ASANA_PROJECT_CUSTOM_FIELDS_TTL_SECONDS,
+    shared_cache_key_prefix="asana-project-custom-fields",
+    shared_cache_enabled=config.ASANA_PROJECT_CUSTOM_FIELDS_SHARED_CACHE_ENABLED,
+    serialize=ProjectCustomFields.to_json,
+    deserialize=ProjectCustomFields.from_json,
+)
+
+
+def _get_project_custom_fields(
+    project_id: str,
+    max_age_seconds: float = config.ASANA_PROJECT_CUSTOM_FIELDS_TTL_SECONDS,
+) -> ProjectCustomFields:
+    """
+    Returns the project's custom field settings, if necessary fetching them from the shared
+    DynamoDb cache (when enabled) or from Asana, so that they're at most max_age_seconds old.
+    """
+    cached = _project_custom_fields_cache.get(project_id, max_age_seconds)
+    if cached is not None:
+        return cached
+
+    fetched = ProjectCustomFields(
+        fields_by_name={
+            cf["custom_field"]["name"]: CompiledCustomField.from_asana(
+                cf["custom_field"]
+            )
+            for cf in asana_client.get_project_custom_fields(project_id)
+        },
+        fetched_at=time.time(),
+    )
+    logger.info(
+        f"Fetched {len(fetched.fields_by_name)} custom fields for project {project_id}"
+    )
+    _project_custom_fields_cache.put(project_id, fetched, fetched.fetched_at)
+    return fetched
+
+
 def _custom_fields_from_pull_request(pull_request: PullRequest) -> Dict:
     """
     We currently expect the project to have custom fields with their corresponding enum options:
@@ -235,62 +404,65 @@ def _custom_fields_from_pull_request(pull_request: PullRequest) -> Dict:
     if project_id is None:
         logger.error(f"Project not found for repo {repository_id}.")
         return {}
-    else:
-        custom_field_map = {
-            cf["custom_field"]["name"]: cf["custom_field"]
-            for cf in asana_client.get_project_custom_fields(project_id)
-        }
 
-        data = {}
-        for custom_field_config in _custom_fields_to_extract:
-            # Find all matching fields for this configuration
-            matching_fields = [
-                (name, field)
-                for name, field in custom_field_map.items()
-                if custom_field_config.matches(name)
-            ]
+    project_custom_fields = _get_project_custom_fields(project_id)
+    data, is_missing_enum_options = _custom_field_values_from_pull_request(
+        project_custom_fields, pull_request
+    )
+    if is_missing_enum_options:
+        # The cached settings may predate a newly added enum option.
+        refreshed = _get_project_custom_fields(
+            project_id, max_age_seconds=_PROJECT_CUSTOM_FIELDS_MIN_REFRESH_SECONDS
+        )
+        if refreshed is not project_custom_fields:
+            data, _ = _custom_field_values_from_pull_request(refreshed, pull_request)
+    return data
+
 
-            # Process each matching field
-            for field_name, custom_field in matching_fields:
-                value_name = custom_field_config.extractor(pull_request)
+def _custom_field_values_from_pull_request(
+    project_custom_fields: ProjectCustomFields, pull_request: PullRequest
+) -> Tuple[Dict, bool]:
+    """
+    Returns the custom field values to set for the pull request, and whether any extracted
+    enum value was missing from the project's enum options.
+    """
+    data = {}
+    is_missing_enum_options = False
+    for custom_field_config, matching_fields in project_custom_fields.extraction_plan:
+        if not custom_field_config.is_enabled():
+            continue
 
-                custom_field_id = custom_field["gid"]
-                custom_field_value = _get_custom_field_value(custom_field, value_name)
-                if custom_field_value is not None:
-                    data[custom_field_id] = custom_field_value
+        # Extract once, however many fields this configuration matches
+        value_name = custom_field_config.extractor(pull_request)
+        for custom_field in matching_fields:
+            custom_field_value = custom_field.value_for(value_name)
+            if custom_field_value is not None:
+                data[custom_field.gid] = custom_field_value
+            if custom_field.is_missing_enum_options(value_name):
+                is_missing_enum_options = True
 
-        return data
+    return data, is_missing_enum_options
 
 
 def _get_custom_field_value(
     custom_field: dict, value_name: Union[str, List[str], None]
 ) -> Optional[Union[str, List[str]]]:
-    if value_name is None:
-        return None
+    return CompiledCustomField(
+        gid="",
+        name=custom_field["name"],
+        resource_subtype=custom_field["resource_subtype"],
+        enum_option_gids=_enabled_enum_option_gids(custom_field),
+    ).value_for(value_name)
 
-    if custom_field["resource_subtype"] == "enum":
-        enum_options = custom_field["enum_options"]
-        filtered_gids = [
-            enum_option["gid"]
-            for enum_option in enum_options
-            if enum_option["name"] == value_name and enum_option["enabled"]
-        ]
-        return filtered_gids[0] if filtered_gids else None
-
-    elif custom_field["resource_subtype"] == "multi_enum":
-        enum_options = custom_field["enum_options"]
-        filtered_gids = []
-        for value in value_name:
-            matching_options = [
-                enum_option["gid"]
-                for enum_option in enum_options
-                if enum_option["name"] == value and enum_option["enabled"]
-            ]
-            if matching_options:
-                filtered_gids.append(matching_options[0])
-        return filtered_gids
-    else:
-        return value_name
+
+def _enabled_enum_option_gids(custom_field: dict) -> Dict[str, str]:
+    enum_option_gids: Dict[str, str] = {}
+    if custom_field["resource_subtype"] in ("enum", "multi_enum"):
+        for enum_option in custom_field["enum_options"]:
+            # If several enabled options share a name, the first one wins.
+            if enum_option["enabled"]:
+                enum_option_gids.setdefault(enum_option["name"], enum_option["gid"])
+    return enum_option_gids
 
 
 def _task_assignee_from_pull_request(pull_request: PullRequest) -> Optional[str]:
@@ -427,16 +599,10 @@ def _extract_attachments(body_html: str) -> List[AttachmentData]:
     """
     attachments = []
 
-    # Parse the body_html for img and video tags
-    matches = BeautifulSoup(body_html, "html.parser").find_all(["img", "video"])
-
-    for match in matches:
-        # Since we're searching for specific tag names, we can assert these are Tag objects
-        matched_tag = cast(Tag, match)
-
+    for tag_attrs in extract_media_tag_attrs(body_html):
         # data-canonical-src is set for assets hosted outside of github
-        data_canonical_src = matched_tag.get("data-canonical-src")
-        file_url = data_canonical_src or matched_tag.get("src")
+        data_canonical_src = tag_attrs.get("data-canonical-src")
+        file_url = data_canonical_src or tag_attrs.get("src")
 
         if not file_url:
             continue
@@ -454,7 +620,7 @@ def _extract_attachments(body_html: str) -> List[AttachmentData]:
 
         file_type = _file_extension_to_type[file_ext]
 
-        file_title = cast(Optional[str], matched_tag.get("alt"))
+        file_title = tag_attrs.get("alt")
 
         if not file_title or not file_title.strip():
             file_name = _get_file_name_from_signed_url(file_url_str)
@@ -471,19 +637,237 @@ def _extract_attachments(body_html: str) -> List[AttachmentData]:
 
 
 def create_attachments(body_html: str, task_id: str) -> None:
+    """
+    Creates the image/video attachments found in body_html on the task. Attachments that aren't
+    done within ATTACHMENT_TIME_BUDGET_SECONDS are deferred to a follow-up SQS message.
+    """
     attachments = _extract_attachments(body_html)
+    if attachments:
+        _create_attachments_within_budget(task_id, attachments, deferrals=0)
+
+
+def create_deferred_attachments(payload: dict) -> None:
+    """
+    Creates the attachments of a follow-up message queued by create_attachments.
+    """
+    attachments = [
+        AttachmentData(**attachment) for attachment in payload["attachments"]
+    ]
+    _create_attachments_within_budget(
+        payload["task_id"], attachments, deferrals=payload["deferrals"]
+    )
+
+
+# Github serves attachments from these hosts through URLs signed with a short-lived token in
+# the query string, which changes every time the body is rendered
+_SIGNED_ATTACHMENT_URL_HOSTS = ("githubusercontent.com",)
+
+
+def _normalize_attachment_url(url: str) -> str:
+    parsed = urlparse(url)
+    netloc = parsed.netloc.lower()
+    if netloc.endswith(_SIGNED_ATTACHMENT_URL_HOSTS):
+        query = ""
+    else:
+        query = "&".join(sorted(parsed.query.split("&"))) if parsed.query else ""
+    return urlunparse((parsed.scheme.lower(), netloc, parsed.path, "", query, ""))
+
+
+def _attachment_dedup_key(task_id: str, file_url: str) -> str:
+    """
+    The objects table key under which the gid of the Asana attachment created on the task from
+    the file at file_url is recorded
+    """
+    url_hash = hashlib.sha256(_normalize_attachment_url(file_url).encode()).hexdigest()
+    return f"asana-attachment/{task_id}/{url_hash}"
+
+
+def _skip_existing_attachments(
+    task_id: str, attachments: List[AttachmentData]
+) -> List[AttachmentData]:
+    """
+    Drops the attachments that are already on the task, or repeated, without downloading them
+    """
+    attachments_by_key: Dict[str, AttachmentData] = {}
     for attachment in attachments:
-        try:
-            with urllib.request.urlopen(attachment.file_url) as f:
-                attachment_contents = f.read()
-                asana_client.create_attachment_on_task(
-                    task_id,
-                    attachment_contents,
-                    attachment.file_name,
-                    attachment.file_type,
-                )
-        except Exception:
-            logger.warning("Attachment creation failed. Creating task comment anyway.")
+        attachments_by_key.setdefault(
+            _attachment_dedup_key(task_id, attachment.file_url), attachment
+        )
+    existing = dynamodb_client.batch_get_asana_ids(attachments_by_key.keys())
+    new_attachments = [
+        attachment
+        for key, attachment in attachments_by_key.items()
+        if key not in existing
+    ]
+    skipped = len(attachments) - len(new_attachments)
+    if skipped > 0:
+        logger.info(f"Skipping {skipped} attachments already on task {task_id}")
+        metrics.increment("attachments.duplicates_skipped", skipped)
+    return new_attachments
+
+
+def _create_attachments_within_budget(
+    task_id: str, attachments: List[AttachmentData], deferrals: int
+) -> None:
+    attachments = _skip_existing_attachments(task_id, attachments)
+    if not attachments:
+        return
+    deferred = _transfer_attachments(
+        task_id, attachments, config.ATTACHMENT_TIME_BUDGET_SECONDS
+    )
+    if not deferred:
+        return
+    if deferrals >= config.ATTACHMENT_MAX_DEFERRALS:
+        logger.warning(
+            f"Giving up on {len(deferred)} attachments for task {task_id} after"
+            f" {deferrals} deferrals"
+        )
+        return
+    logger.info(f"Deferring {len(deferred)} attachments for task {task_id}")
+    metrics.increment("attachments.deferred", len(deferred))
+    sqs_client.queue_deferred_attachments(
+        task_id,
+        [attachment._asdict() for attachment in deferred],
+        deferrals + 1,
+    )
+
+
+# Attachments without a Content-Length are copied to a temporary file to learn their size,
+# which stays in memory up to this size
+_ATTACHMENT_SPOOL_MAX_MEMORY_BYTES = 1 << 20
+_ATTACHMENT_CHUNK_SIZE = 64 << 10
+
+
+@contextmanager
+def _open_attachment(
+    attachment: AttachmentData,
+) -> Iterator[Optional[Tuple[BinaryIO, int]]]:
+    """
+    Opens the attachment for streaming, yielding a stream of its contents and its size, or None
+    if it's larger than ATTACHMENT_MAX_SIZE_BYTES. The Content-Length, when there is one, is
+    checked before anything is read.
+    """
+    with urllib.request.urlopen(
+        attachment.file_url, timeout=config.ATTACHMENT_REQUEST_TIMEOUT_SECONDS
+    ) as response:
+        content_length = response.headers.get("Content-Length")
+        if content_length is not None and content_length.isdigit():
+            size = int(content_length)
+            if size > config.ATTACHMENT_MAX_SIZE_BYTES:
+                _log_oversized_attachment(attachment, size)
+                yield None
+            else:
+                yield response, size
+            return
+
+        with tempfile.SpooledTemporaryFile(
+            max_size=_ATTACHMENT_SPOOL_MAX_MEMORY_BYTES
+        ) as spool:
+            size = 0
+            for chunk in iter(lambda: response.read(_ATTACHMENT_CHUNK_SIZE), b""):
+                size += len(chunk)
+                if size > config.ATTACHMENT_MAX_SIZE_BYTES:
+                    _log_oversized_attachment(attachment, size)
+                    yield None
+                    return
+                spool.write(chunk)
+            spool.seek(0)
+            yield cast(BinaryIO, spool), size
+
+
+def _log_oversized_attachment(attachment: AttachmentData, size: int) -> None:
+    logger.warning(
+        f"Skipping attachment {attachment.file_name} of at least {size} bytes, over the"
+        f" limit of {config.ATTACHMENT_MAX_SIZE_BYTES} bytes"
+    )
+    metrics.increment("attachments.oversized_skipped")
+
+
+class _AttachmentTransfer(object):
+    """
+    Streams attachments from Github to Asana on a thread pool, until the time budget runs out. A
+    transfer that is still queued or opening its download when it does is abandoned, to be retried
+    later; one that has started uploading is left to finish, so it's never uploaded twice.
+    """
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self._lock = threading.Lock()
+        self._uploading: Set[int] = set()
+        self._closed = False
+
+    def transfer(self, index: int, attachment: AttachmentData) -> None:
+        with _open_attachment(attachment) as opened:
+            if opened is None:
+                return
+            stream, size = opened
+            with self._lock:
+                if self._closed:
+                    return
+                self._uploading.add(index)
+            attachment_id = asana_client.create_attachment_on_task_from_stream(
+                self.task_id,
+                stream,
+                size,
+                attachment.file_name,
+                attachment.file_type,
+                timeout=config.ATTACHMENT_REQUEST_TIMEOUT_SECONDS,
+            )
+        dynamodb_client.insert_github_node_to_asana_id_mapping(
+            _attachment_dedup_key(self.task_id, attachment.file_url), attachment_id
+        )
+
+    def close(self, indexes: Iterable[int]) -> List[int]:
+        """
+        Stops uploads from starting, and returns which of indexes haven't started uploading
+        """
+        with self._lock:
+            self._closed = True
+            return [index for index in indexes if index not in self._uploading]
+
+
+def _transfer_attachments(
+    task_id: str, attachments: List[AttachmentData], budget_seconds: float
+) -> List[AttachmentData]:
+    """
+    Creates the attachments on the task, concurrently. Returns the attachments that were abandoned
+    because they weren't done within budget_seconds, or whose upload failed with an error worth
+    retrying, since a streamed upload can't be retried in place; other failures are only logged.
+
+    Uploads that already started when the budget ran out are waited for, for as long as one
+    request may take, since they'd be lost if Lambda froze the process once the handler returned.
+    Those that still aren't done are returned too: if one finishes after all, the follow-up may
+    attach the file twice, which beats losing it.
+    """
+    attachment_transfer = _AttachmentTransfer(task_id)
+    executor = ThreadPoolExecutor(
+        max_workers=min(config.ATTACHMENT_MAX_CONCURRENCY, len(attachments))
+    )
+    futures = {
+        executor.submit(attachment_transfer.transfer, index, attachment): index
+        for index, attachment in enumerate(attachments)
+    }
+    done, not_done = wait(futures, timeout=budget_seconds)
+    abandoned = attachment_transfer.close(futures[future] for future in not_done)
+    uploading = [future for future in not_done if futures[future] not in abandoned]
+    if uploading:
+        uploaded, still_uploading = wait(
+            uploading, timeout=config.ATTACHMENT_REQUEST_TIMEOUT_SECONDS
+        )
+        done |= uploaded
+        abandoned.extend(futures[future] for future in still_uploading)
+    # Don't wait for abandoned downloads, which time out on their own
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    for future in done:
+        error = future.exception()
+        if isinstance(error, RetryableAsanaError):
+            abandoned.append(futures[future])
+        elif error is not None:
+            logger.warning(
+                f"Attachment creation failed: {error}. Creating task comment anyway."
+            )
+    return [attachments[index] for index in sorted(abandoned)]
 
 
 _review_action_to_text_map: Dict[ReviewState, str] = {
@@ -1,7 +1,17 @@
 import boto3  # type: ignore
-from typing import TypedDict, List, Optional, Tuple
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, TypedDict, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
-from src.config import OBJECTS_TABLE, AWS_REGION
+import src.metrics as metrics
+from src.cache import Cache
+from src.config import (
+    OBJECTS_TABLE,
+    AWS_REGION,
+    ASANA_ID_CACHE_MAX_SIZE,
+)
 from src.logger import logger
 
 
@@ -29,12 +39,21 @@ class DynamoDbClient(object):
 
     GITHUB_HANDLE_KEY = "github/handle"
     USER_ID_KEY = "asana/domain-user-id"
+    TASK_FIELD_HASHES_KEY = "task-field-hashes"
+    CACHE_BODY_KEY = "cache-body"
+    CACHE_UPDATED_AT_KEY = "cache-updated-at"
+    GITHUB_NODE_ID_KEY = "github-node-id"
 
     # the singleton instance of DynamoDbClient
     _singleton = None
 
     def __init__(self):
         self.client = DynamoDbClient._create_client()
+        # GitHub node-id -> Asana object-id, in least recently used order. Misses aren't
+        # cached: they gate creating the Asana object, and another invocation may create it.
+        self._asana_id_cache: Cache[str] = Cache(
+            "dynamodb.asana_id", max_size=ASANA_ID_CACHE_MAX_SIZE
+        )
 
     # getter for the singleton
     @classmethod
@@ -46,26 +65,97 @@ class DynamoDbClient(object):
             cls._singleton = DynamoDbClient()
         return cls._singleton
 
-    def bulk_insert_items_in_batches(self, table_name: str, items: List[dict]):
+    # BatchWriteItem writes at most 25 items per request
+    # https://docs.aws.amazon.com/amazondynamodb/latest/APIReference/API_BatchWriteItem.html
+    BATCH_WRITE_SIZE = 25
+    BATCH_WRITE_MAX_ATTEMPTS = 8
+    BATCH_WRITE_RETRY_BASE_DELAY_SECONDS = 0.05
+    BATCH_WRITE_MAX_WORKERS = 4
+
+    def bulk_insert_items_in_batches(
+        self, table_name: str, items: List[dict], key_attributes: Sequence[str]
+    ) -> List[dict]:
         """Insert multiple items to a Dynamodb table.
 
-        We need to split large requests into batches of 25, since Dynamodb only accepts 25 items at a time.
+        We need to split large requests into batches of 25, since Dynamodb only accepts 25 items at a time,
+        and rejects batches that contain the same key twice, so items are deduplicated on key_attributes (the
+        last one wins, as it would with sequential puts). Batches are written concurrently, and items that
+        Dynamodb leaves unprocessed (e.g. when throttled) are retried with jittered exponential backoff.
         https://docs.aws.amazon.com/amazondynamodb/latest/APIReference/API_BatchWriteItem.html
+
+        Returns the items that were still unprocessed after the last attempt.
         """
-        BATCH_SIZE = 25
-        for batch_start in range(0, len(items), BATCH_SIZE):
-            response = self.client.batch_write_item(
-                RequestItems={
-                    table_name: [
-                        {"PutRequest": {"Item": item}}
-                        for item in items[batch_start : batch_start + BATCH_SIZE]
-                    ]
-                }
-            )
-            if response.get("UnprocessedItems"):
-                logger.warning(
-                    "Failed to insert items: {}".format(response["UnprocessedItems"])
+        deduplicated = list(
+            {
+                tuple(
+                    json.dumps(item[key], sort_keys=True) for key in key_attributes
+                ): item
+                for item in items
+            }.values()
+        )
+        batches = [
+            deduplicated[batch_start : batch_start + self.BATCH_WRITE_SIZE]
+            for batch_start in range(0, len(deduplicated), self.BATCH_WRITE_SIZE)
+        ]
+        if not batches:
+            return []
+
+        start = time.monotonic()
+        if len(batches) == 1:
+            results = [self._batch_write_items(table_name, batches[0])]
+        else:
+            with ThreadPoolExecutor(
+                max_workers=min(self.BATCH_WRITE_MAX_WORKERS, len(batches))
+            ) as executor:
+                results = list(
+                    executor.map(
+                        lambda batch: self._batch_write_items(table_name, batch),
+                        batches,
+                    )
                 )
+        elapsed = time.monotonic() - start
+
+        retries = sum(batch_retries for batch_retries, _ in results)
+        unprocessed = [
+            item for _, batch_unprocessed in results for item in batch_unprocessed
+        ]
+        written = len(deduplicated) - len(unprocessed)
+        metrics.increment("dynamodb.batch_write_items", written)
+        metrics.increment("dynamodb.batch_write_retries", retries)
+        logger.info(
+            f"Wrote {written} items to {table_name} in {len(batches)} batches and"
+            f" {elapsed:.3f}s ({written / max(elapsed, 1e-6):.0f} items/s, {retries} retries)"
+        )
+        if unprocessed:
+            metrics.increment(
+                "dynamodb.batch_write_unprocessed_items", len(unprocessed)
+            )
+            logger.error(
+                f"Failed to insert {len(unprocessed)} items into {table_name} after"
+                f" {self.BATCH_WRITE_MAX_ATTEMPTS} attempts: {unprocessed}"
+            )
+        return unprocessed
+
+    def _batch_write_items(
+        self, table_name: str, items: List[dict]
+    ) -> Tuple[int, List[dict]]:
+        """
+        Writes one BatchWriteItem's worth of items, retrying unprocessed items with jittered
+        exponential backoff. Returns the number of retries, and the items that are still unprocessed.
+        """
+        request_items = {table_name: [{"PutRequest": {"Item": item}} for item in items]}
+        delay = self.BATCH_WRITE_RETRY_BASE_DELAY_SECONDS
+        for attempt in range(self.BATCH_WRITE_MAX_ATTEMPTS):
+            if attempt > 0:
+                time.sleep(delay / 2 + random.uniform(0, delay / 2))
+                delay *= 2
+            response = self.client.batch_write_item(RequestItems=request_items)
+            request_items = response.get("UnprocessedItems") or {}
+            if not request_items:
+                return attempt, []
+        return self.BATCH_WRITE_MAX_ATTEMPTS - 1, [
+            request["PutRequest"]["Item"] for request in request_items[table_name]
+        ]
 
     # OBJECTS TABLE
 
@@ -74,18 +164,109 @@ class DynamoDbClient(object):
         Retrieves the Asana object-id associated with the specified GitHub node-id,
         or None, if no such association exists. Object-table associations are created
         by SGTM via the insert_github_node_to_asana_id_mapping method, below.
+
+        Associations are cached, since they never change once created. Misses are always
+        read again, so that a caller holding the pull request's lock sees an association
+        created by another invocation before it, and doesn't create the Asana object twice.
         """
+        cached = self._asana_id_cache.get(gh_node_id)
+        if cached is not None:
+            return cached
+
         response = self.client.get_item(
             TableName=OBJECTS_TABLE, Key={"github-node": {"S": gh_node_id}}
         )
         if "Item" in response:
-            return response["Item"]["asana-id"]["S"]
+            asana_id = response["Item"]["asana-id"]["S"]
+            self._asana_id_cache.put(gh_node_id, asana_id)
+            return asana_id
         else:
             logger.warning(
                 f"Asana id not found in dynamodb for github node id {gh_node_id}"
             )
             return None
 
+    # BatchGetItem reads at most 100 keys per request
+    # https://docs.aws.amazon.com/amazondynamodb/latest/APIReference/API_BatchGetItem.html
+    BATCH_GET_SIZE = 100
+    BATCH_GET_MAX_ATTEMPTS = 5
+    BATCH_GET_RETRY_BASE_DELAY_SECONDS = 0.05
+
+    def batch_get_asana_ids(self, gh_node_ids: Iterable[str]) -> Dict[str, str]:
+        """
+        Retrieves the Asana object-ids associated with the specified GitHub node-ids, in as few
+        requests as possible. Returns a dict from GitHub node-id to Asana object-id, without the
+        node-ids that have no association. Results are cached like those of
+        get_asana_id_from_github_node_id.
+        """
+        gh_node_ids = list(dict.fromkeys(gh_node_ids))
+        asana_ids = self._asana_id_cache.get_many(gh_node_ids)
+        to_fetch = [
+            gh_node_id for gh_node_id in gh_node_ids if gh_node_id not in asana_ids
+        ]
+        if not to_fetch:
+            return asana_ids
+
+        fetched: Dict[str, str] = {}
+        unprocessed: Set[str] = set()
+        for batch_start in range(0, len(to_fetch), self.BATCH_GET_SIZE):
+            batch = to_fetch[batch_start : batch_start + self.BATCH_GET_SIZE]
+            unprocessed.update(self._batch_get_asana_ids(batch, fetched))
+
+        for gh_node_id in to_fetch:
+            if gh_node_id in unprocessed:
+                # Don't mistake keys DynamoDb didn't get to for missing ones
+                asana_id = self.get_asana_id_from_github_node_id(gh_node_id)
+                if asana_id is not None:
+                    asana_ids[gh_node_id] = asana_id
+            elif gh_node_id in fetched:
+                self._asana_id_cache.put(gh_node_id, fetched[gh_node_id])
+                asana_ids[gh_node_id] = fetched[gh_node_id]
+        return asana_ids
+
+    def _batch_get_asana_ids(
+        self, gh_node_ids: List[str], fetched: Dict[str, str]
+    ) -> List[str]:
+        """
+        Reads one BatchGetItem's worth of keys into fetched, retrying unprocessed keys with
+        jittered exponential backoff. Returns the keys that are still unprocessed.
+        """
+        request_items: Dict[str, Dict[str, Any]] = {
+            OBJECTS_TABLE: {
+                "Keys": [
+                    {"github-node": {"S": gh_node_id}} for gh_node_id in gh_node_ids
+                ],
+                "ProjectionExpression": "#node, #asana_id",
+                "ExpressionAttributeNames": {
+                    "#node": "github-node",
+                    "#asana_id": "asana-id",
+                },
+            }
+        }
+        delay = self.BATCH_GET_RETRY_BASE_DELAY_SECONDS
+        for attempt in range(self.BATCH_GET_MAX_ATTEMPTS):
+            if attempt > 0:
+                time.sleep(delay / 2 + random.uniform(0, delay / 2))
+                delay *= 2
+            response = self.client.batch_get_item(RequestItems=request_items)
+            for item in response.get("Responses", {}).get(OBJECTS_TABLE, []):
+                fetched[item["github-node"]["S"]] = item["asana-id"]["S"]
+            request_items = response.get("UnprocessedKeys") or {}
+            if not request_items:
+                return []
+        unprocessed_keys = request_items[OBJECTS_TABLE]["Keys"]
+        logger.warning(
+            f"{len(unprocessed_keys)} keys still unprocessed after"
+            f" {self.BATCH_GET_MAX_ATTEMPTS} BatchGetItem attempts"
+        )
+        return [key["github-node"]["S"] for key in unprocessed_keys]
+
+    def clear_asana_id_cache(self):
+        """
+        Forgets all cached associations
+        """
+        self._asana_id_cache.clear()
+
     def insert_github_node_to_asana_id_mapping(self, gh_node_id: str, asana_id: str):
         """
         Creates an association between a GitHub node-id and an Asana object-id
@@ -96,6 +277,7 @@ class DynamoDbClient(object):
         )
         if response["ResponseMetadata"]["HTTPStatusCode"] == 200:
             logger.info(f"Inserted into dynamodb {gh_node_id} -> {asana_id}")
+            self._asana_id_cache.put(gh_node_id, asana_id)
         else:
             logger.warning(
                 f"Error inserting into dynamodb {gh_node_id} -> {asana_id}, response {response}"
@@ -112,7 +294,114 @@ class DynamoDbClient(object):
             {"github-node": {"S": gh_node_id}, "asana-id": {"S": asana_id}}
             for gh_node_id, asana_id in gh_and_asana_ids
         ]
-        return self.bulk_insert_items_in_batches(OBJECTS_TABLE, items)
+        unprocessed = {
+            item["github-node"]["S"]
+            for item in self.bulk_insert_items_in_batches(
+                OBJECTS_TABLE, items, ["github-node"]
+            )
+        }
+        for gh_node_id, asana_id in gh_and_asana_ids:
+            if gh_node_id not in unprocessed:
+                self._asana_id_cache.put(gh_node_id, asana_id)
+
+    def get_task_field_hashes(self, gh_node_id: str) -> Dict[str, str]:
+        """
+        Retrieves the hashes of the task fields last written to Asana for the specified GitHub
+        node-id, by field name, or an empty dict, if none have been recorded.
+        """
+        response = self.client.get_item(
+            TableName=OBJECTS_TABLE,
+            Key={"github-node": {"S": gh_node_id}},
+            ProjectionExpression="#field_hashes",
+            ExpressionAttributeNames={"#field_hashes": self.TASK_FIELD_HASHES_KEY},
+        )
+        field_hashes = response.get("Item", {}).get(self.TASK_FIELD_HASHES_KEY, {})
+        return {name: value["S"] for name, value in field_hashes.get("M", {}).items()}
+
+    def set_task_field_hashes(self, gh_node_id: str, field_hashes: Dict[str, str]):
+        """
+        Records the hashes of the task fields last written to Asana for the specified GitHub
+        node-id, replacing any previously recorded hashes.
+        """
+        self.client.update_item(
+            TableName=OBJECTS_TABLE,
+            Key={"github-node": {"S": gh_node_id}},
+            UpdateExpression="SET #field_hashes = :field_hashes",
+            ExpressionAttributeNames={"#field_hashes": self.TASK_FIELD_HASHES_KEY},
+            ExpressionAttributeValues={
+                ":field_hashes": {
+                    "M": {name: {"S": value} for name, value in field_hashes.items()}
+                }
+            },
+        )
+
+    @staticmethod
+    def _github_review_database_id_key(review_database_id: int) -> str:
+        return f"github-review-database-id/{review_database_id}"
+
+    def get_github_review_node_id(self, review_database_id: int) -> Optional[str]:
+        """
+        Retrieves the GitHub node-id recorded for the review with the specified (numeric)
+        databaseId, or None, if none has been recorded.
+        """
+        response = self.client.get_item(
+            TableName=OBJECTS_TABLE,
+            Key={
+                "github-node": {
+                    "S": self._github_review_database_id_key(review_database_id)
+                }
+            },
+        )
+        item = response.get("Item", {})
+        if self.GITHUB_NODE_ID_KEY not in item:
+            return None
+        return item[self.GITHUB_NODE_ID_KEY]["S"]
+
+    def insert_github_review_database_id_mapping(
+        self, review_database_id: int, review_node_id: str
+    ):
+        """
+        Records the GitHub node-id of the review with the specified (numeric) databaseId, which
+        is all that some webhooks identify the review by
+        """
+        self.client.put_item(
+            TableName=OBJECTS_TABLE,
+            Item={
+                "github-node": {
+                    "S": self._github_review_database_id_key(review_database_id)
+                },
+                self.GITHUB_NODE_ID_KEY: {"S": review_node_id},
+            },
+        )
+
+    def get_cache_entry(self, cache_key: str) -> Optional[Tuple[float, str]]:
+        """
+        Retrieves the (timestamp, body) of a shared cache entry, or None, if no such entry
+        exists. Cache entries let warm and cold Lambdas share data that is expensive to fetch.
+        """
+        response = self.client.get_item(
+            TableName=OBJECTS_TABLE, Key={"github-node": {"S": cache_key}}
+        )
+        item = response.get("Item", {})
+        if self.CACHE_BODY_KEY not in item or self.CACHE_UPDATED_AT_KEY not in item:
+            return None
+        return (
+            float(item[self.CACHE_UPDATED_AT_KEY]["N"]),
+            item[self.CACHE_BODY_KEY]["S"],
+        )
+
+    def put_cache_entry(self, cache_key: str, updated_at: float, body: str):
+        """
+        Creates or replaces a shared cache entry
+        """
+        self.client.put_item(
+            TableName=OBJECTS_TABLE,
+            Item={
+                "github-node": {"S": cache_key},
+                self.CACHE_UPDATED_AT_KEY: {"N": str(updated_at)},
+                self.CACHE_BODY_KEY: {"S": body},
+            },
+        )
 
     @staticmethod
     def _create_client():
@@ -130,6 +419,16 @@ def get_asana_id_from_github_node_id(gh_node_id: str) -> Optional[str]:
     return DynamoDbClient.singleton().get_asana_id_from_github_node_id(gh_node_id)
 
 
+def batch_get_asana_ids(gh_node_ids: Iterable[str]) -> Dict[str, str]:
+    """
+    Using the singleton instance of DynamoDbClient, creating it if necessary:
+
+    Retrieves the Asana object-ids associated with the specified GitHub node-ids, in as few
+    requests as possible. Node-ids without an association are left out of the returned dict.
+    """
+    return DynamoDbClient.singleton().batch_get_asana_ids(gh_node_ids)
+
+
 def insert_github_node_to_asana_id_mapping(gh_node_id: str, asana_id: str):
     """
     Using the singleton instance of DynamoDbClient, creating it if necessary:
@@ -152,3 +451,63 @@ def bulk_insert_github_node_to_asana_id_mapping(
     DynamoDbClient.singleton().bulk_insert_github_node_to_asana_id_mapping(
         gh_and_asana_ids
     )
+
+
+def get_task_field_hashes(gh_node_id: str) -> Dict[str, str]:
+    """
+    Using the singleton instance of DynamoDbClient, creating it if necessary:
+
+    Retrieves the hashes of the task fields last written to Asana for the specified GitHub
+    node-id, by field name.
+    """
+    return DynamoDbClient.singleton().get_task_field_hashes(gh_node_id)
+
+
+def set_task_field_hashes(gh_node_id: str, field_hashes: Dict[str, str]):
+    """
+    Using the singleton instance of DynamoDbClient, creating it if necessary:
+
+    Records the hashes of the task fields last written to Asana for the specified GitHub node-id.
+    """
+    DynamoDbClient.singleton().set_task_field_hashes(gh_node_id, field_hashes)
+
+
+def get_github_review_node_id(review_database_id: int) -> Optional[str]:
+    """
+    Using the singleton instance of DynamoDbClient, creating it if necessary:
+
+    Retrieves the GitHub node-id recorded for the review with the specified (numeric)
+    databaseId, or None, if none has been recorded.
+    """
+    return DynamoDbClient.singleton().get_github_review_node_id(review_database_id)
+
+
+def insert_github_review_database_id_mapping(
+    review_database_id: int, review_node_id: str
+):
+    """
+    Using the singleton instance of DynamoDbClient, creating it if necessary:
+
+    Records the GitHub node-id of the review with the specified (numeric) databaseId
+    """
+    DynamoDbClient.singleton().insert_github_review_database_id_mapping(
+        review_database_id, review_node_id
+    )
+
+
+def get_cache_entry(cache_key: str) -> Optional[Tuple[float, str]]:
+    """
+    Using the singleton instance of DynamoDbClient, creating it if necessary:
+
+    Retrieves the (timestamp, body) of a shared cache entry, or None, if no such entry exists.
+    """
+    return DynamoDbClient.singleton().get_cache_entry(cache_key)
+
+
+def put_cache_entry(cache_key: str, updated_at: float, body: str):
+    """
+    Using the singleton instance of DynamoDbClient, creating it if necessary:
+
+    Creates or replaces a shared cache entry
+    """
+    DynamoDbClient.singleton().put_cache_entry(cache_key, updated_at, body)
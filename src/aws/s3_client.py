@@ -1,10 +1,16 @@
 import boto3  # type: ignore
 import json
+import threading
+import time
+from botocore.exceptions import ClientError  # type: ignore
 from contextlib import closing
-from typing import Optional, List
+from typing import Dict, Optional, List
 
-from src.config import GITHUB_USERNAMES_TO_ASANA_GIDS_S3_PATH, AWS_REGION
-from src.utils import memoize
+from src.config import (
+    GITHUB_USERNAMES_TO_ASANA_GIDS_S3_PATH,
+    GITHUB_USERNAMES_TO_ASANA_GIDS_TTL_SECONDS,
+    AWS_REGION,
+)
 from src.logger import logger
 
 
@@ -35,6 +41,12 @@ class S3Client(object):
             raise ConfigurationError(
                 "Configuration error: GITHUB_USERNAMES_TO_ASANA_GIDS_S3_PATH is not set to a valid S3 path"
             )
+        # The whole mapping document is cached in memory for the lifetime of the
+        # process, and revalidated with a conditional GET once the TTL expires.
+        self._github_user_mapping: Optional[Dict[str, str]] = None
+        self._github_user_mapping_etag: Optional[str] = None
+        self._github_user_mapping_fetched_at = 0.0
+        self._github_user_mapping_lock = threading.Lock()
 
     # getter for the singleton
     @classmethod
@@ -50,7 +62,6 @@ class S3Client(object):
     def _create_s3_client():
         return boto3.client("s3", region_name=AWS_REGION)
 
-    @memoize
     def get_asana_domain_user_id_from_github_username(
         self, github_username: str
     ) -> Optional[str]:
@@ -58,6 +69,28 @@ class S3Client(object):
         Retrieves the Asana domain user-id associated with a specific GitHub user login, or None,
         if no such association exists.
         """
+        github_identities_to_asana_gids = self._get_github_user_mapping()
+        if github_username in github_identities_to_asana_gids:
+            return github_identities_to_asana_gids[github_username]
+        else:
+            return None
+
+    def _get_github_user_mapping(self) -> Dict[str, str]:
+        """
+        Returns the GitHub username -> Asana domain user-id mapping, loading it from S3 on first
+        use and revalidating it (If-None-Match on the cached ETag) whenever the TTL has expired.
+        """
+        with self._github_user_mapping_lock:
+            if (
+                self._github_user_mapping is None
+                or time.monotonic() - self._github_user_mapping_fetched_at
+                >= GITHUB_USERNAMES_TO_ASANA_GIDS_TTL_SECONDS
+            ):
+                self._refresh_github_user_mapping()
+            assert self._github_user_mapping is not None
+            return self._github_user_mapping
+
+    def _refresh_github_user_mapping(self) -> None:
         if (
             not self.github_user_mapping_bucket_name
             or not self.github_user_mapping_key_name
@@ -65,22 +98,34 @@ class S3Client(object):
             raise ConfigurationError(
                 "Configuration error: GITHUB_USERNAMES_TO_ASANA_GIDS_S3_PATH is not set"
             )
-        with closing(
-            self.s3_client.get_object(
-                Bucket=self.github_user_mapping_bucket_name,
-                Key=self.github_user_mapping_key_name,
-            )["Body"]
-        ) as stream:
+        get_object_params = {
+            "Bucket": self.github_user_mapping_bucket_name,
+            "Key": self.github_user_mapping_key_name,
+        }
+        if self._github_user_mapping is not None and self._github_user_mapping_etag:
+            get_object_params["IfNoneMatch"] = self._github_user_mapping_etag
+
+        try:
+            response = self.s3_client.get_object(**get_object_params)
+        except ClientError as error:
+            if error.response.get("Error", {}).get("Code") not in (
+                "304",
+                "NotModified",
+            ):
+                raise
+            logger.info("Github username to Asana id mapping unchanged in S3")
+            self._github_user_mapping_fetched_at = time.monotonic()
+            return
+
+        with closing(response["Body"]) as stream:
             github_identities_to_asana_gids = json.load(stream)
-
-        if github_username in github_identities_to_asana_gids:
-            logger.info(
-                "Successfully retrieved Asana domain user id from S3 for %s",
-                github_username,
-            )
-            return github_identities_to_asana_gids[github_username]
-        else:
-            return None
+        self._github_user_mapping = github_identities_to_asana_gids
+        self._github_user_mapping_etag = response.get("ETag")
+        self._github_user_mapping_fetched_at = time.monotonic()
+        logger.info(
+            "Loaded %d Github username to Asana id mappings from S3",
+            len(github_identities_to_asana_gids),
+        )
 
 
 def get_asana_domain_user_id_from_github_handle(github_handle: str) -> Optional[str]:
@@ -1,6 +1,7 @@
 import boto3  # type: ignore
+import hashlib
 import json
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from src.config import SQS_URL, AWS_REGION
 from src.logger import logger
@@ -38,15 +39,21 @@ class SQSClient(object):
         message_body: str,
         message_group_id: str,
         message_attributes: Optional[dict] = None,
+        message_deduplication_id: Optional[str] = None,
     ):
         """
-        Sends a message to the specified SQS queue
+        Sends a message to the specified SQS queue. Without a message_deduplication_id, the
+        queue's content-based deduplication applies.
         """
+        optional_params = {}
+        if message_deduplication_id is not None:
+            optional_params["MessageDeduplicationId"] = message_deduplication_id
         response = self.sqs_client.send_message(
             QueueUrl=queue_url,
             MessageBody=message_body,
             MessageGroupId=message_group_id,
             MessageAttributes=message_attributes,
+            **optional_params,
         )
         if response["ResponseMetadata"]["HTTPStatusCode"] == 200:
             logger.info(f"Sent message to SQS queue {queue_url}")
@@ -75,26 +82,103 @@ class SQSClient(object):
             return []
 
 
-def queue_new_event(event_type: str, body: str):
+# Fallback group for payloads we can't attribute to a single Github object.
+DEFAULT_MESSAGE_GROUP_ID = "fifo_group_id"
+
+
+def message_group_id_for_event(event_type: str, body: str) -> str:
+    """
+    Derives the FIFO message group id for a webhook event from the Github object it targets,
+    so that events for the same pull request stay ordered while events for different pull
+    requests can be processed in parallel.
+
+    Status and check_suite payloads don't include the pull request, and resolving it requires
+    a GraphQL query, so those are grouped by head commit instead.
+    """
+    try:
+        payload = json.loads(body)
+        if "pull_request" in payload:
+            # pull_request, pull_request_review, pull_request_review_comment
+            return payload["pull_request"]["node_id"]
+        if event_type == "issue_comment":
+            # the issue of an issue_comment on a pull request is the pull request
+            return payload["issue"]["node_id"]
+        if event_type == "status":
+            return f"commit-{payload['sha']}"
+        if event_type == "check_suite":
+            return f"commit-{payload['check_suite']['head_sha']}"
+    except (ValueError, KeyError, TypeError):
+        logger.warning(f"Could not derive message group id for {event_type} event")
+    return DEFAULT_MESSAGE_GROUP_ID
+
+
+def queue_new_event(
+    event_type: str,
+    body: str,
+    message_group_id: Optional[str] = None,
+    message_deduplication_id: Optional[str] = None,
+):
     """
     Using the singleton instance of SQSClient, creating it if necessary:
 
-    Sends a message to the specified SQS queue
+    Sends a message to the specified SQS queue. If message_group_id is not provided, it's
+    derived from the Github object the event targets.
     """
-    logger.info(f"Queueing event {event_type} to SQS queue {SQS_URL}")
+    if message_group_id is None:
+        message_group_id = message_group_id_for_event(event_type, body)
+    logger.info(
+        f"Queueing event {event_type} to SQS queue {SQS_URL} in group {message_group_id}"
+    )
     SQSClient.singleton().send_message(
         queue_url=SQS_URL,
         message_body=body,
-        message_group_id="fifo_group_id",  # single group id for all messages
+        message_group_id=message_group_id,
         message_attributes={
             "X-GitHub-Event": {"DataType": "String", "StringValue": event_type},
         },
+        message_deduplication_id=message_deduplication_id,
     )
 
 
-def queue_full_sync(pull_request_id: str, org_name: str):
+def queue_full_sync(pull_request_id: str, org_name: str, requested_by: str):
+    """
+    Queues a full sync of the pull request, on behalf of requested_by, which identifies the
+    request (e.g. the node id and body of the comment that asked for the sync).
+    """
     body = {
         "pull_request": {"node_id": pull_request_id},
         "organization": {"login": org_name},
     }
-    queue_new_event("pull_request", json.dumps(body))
+    # SQS drops a message whose deduplication id it has seen in the last 5 minutes,
+    # so only a redelivery of the same request is dropped. Every body is the same,
+    # so content-based deduplication would also drop a later request, along with
+    # the change it was queued for.
+    request_hash = hashlib.sha256(
+        f"{pull_request_id}\n{requested_by}".encode()
+    ).hexdigest()
+    queue_new_event(
+        "pull_request",
+        json.dumps(body),
+        message_group_id=pull_request_id,
+        message_deduplication_id=f"full-sync-{request_hash}",
+    )
+
+
+# Event type of the follow-up messages SGTM queues for itself, for attachments that
+# didn't fit in the time budget of the event that found them.
+DEFERRED_ATTACHMENTS_EVENT = "sgtm_deferred_attachments"
+
+
+def queue_deferred_attachments(
+    task_id: str, attachments: List[Dict[str, str]], deferrals: int
+):
+    """
+    Queues the attachments to be created on the task by a later invocation. They're grouped
+    by task, rather than by pull request, so that they don't hold up the pull request's events.
+    """
+    body = {"task_id": task_id, "attachments": attachments, "deferrals": deferrals}
+    queue_new_event(
+        DEFERRED_ATTACHMENTS_EVENT,
+        json.dumps(body, sort_keys=True),
+        message_group_id=f"attachments-{task_id}",
+    )
@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Iterable, Iterator, Optional, Tuple, TypeVar
+
+import src.metrics as metrics
+
+V = TypeVar("V")
+
+
+class Cache(Generic[V]):
+    """
+    A process-level cache of up to max_size values by key, evicted in least recently used order.
+    Lambda keeps the process warm across invocations, so values outlive the event that fetched
+    them: when ttl_seconds is set, values older than that are treated as missing.
+
+    When shared_cache_key_prefix is set and shared_cache_enabled, values are also stored in the
+    DynamoDb objects table (serialized with serialize), so that cold Lambdas don't have to refetch
+    them. Lookups of the in-memory tier are counted as the <name>_cache_hits and
+    <name>_cache_misses metrics.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_size: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        shared_cache_key_prefix: Optional[str] = None,
+        shared_cache_enabled: bool = False,
+        serialize: Callable[[V], str] = json.dumps,
+        deserialize: Callable[[str], V] = json.loads,
+    ):
+        self.name = name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.shared_cache_key_prefix = shared_cache_key_prefix
+        self.shared_cache_enabled = shared_cache_enabled
+        self.serialize = serialize
+        self.deserialize = deserialize
+        # key -> (value, when it was fetched), in least recently used order
+        self._entries: "OrderedDict[str, Tuple[V, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, max_age_seconds: Optional[float] = None) -> Optional[V]:
+        """
+        Returns the value cached for key, or None if there is none at most max_age_seconds old
+        (ttl_seconds by default) in memory or, when enabled, in the shared cache.
+        """
+        if max_age_seconds is None:
+            max_age_seconds = self.ttl_seconds
+        now = time.time()
+        with self._lock:
+            value = self._get_fresh(key, now, max_age_seconds)
+        if value is not None:
+            metrics.increment(f"{self.name}_cache_hits")
+            return value
+        metrics.increment(f"{self.name}_cache_misses")
+
+        if not self._is_shared():
+            return None
+        shared = self._get_shared(key)
+        if shared is None or not _is_fresh(shared[0], now, max_age_seconds):
+            return None
+        fetched_at, value = shared
+        self._put_in_memory(key, value, fetched_at)
+        return value
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, V]:
+        """
+        Returns the values cached in memory for those of the keys that have one, by key. The shared
+        cache isn't read.
+        """
+        now = time.time()
+        values: Dict[str, V] = {}
+        misses = 0
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                value = self._get_fresh(key, now, self.ttl_seconds)
+                if value is not None:
+                    values[key] = value
+                else:
+                    misses += 1
+        if values:
+            metrics.increment(f"{self.name}_cache_hits", len(values))
+        if misses > 0:
+            metrics.increment(f"{self.name}_cache_misses", misses)
+        return values
+
+    def put(self, key: str, value: V, fetched_at: Optional[float] = None):
+        """
+        Caches value for key, as fetched at fetched_at (now by default).
+        """
+        if fetched_at is None:
+            fetched_at = time.time()
+        self._put_in_memory(key, value, fetched_at)
+        if self._is_shared():
+            self._put_shared(key, value, fetched_at)
+
+    def delete(self, key: str):
+        """
+        Forgets the value cached in memory for key, if any
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """
+        Forgets all values cached in memory
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._entries))
+
+    def _get_fresh(
+        self, key: str, now: float, max_age_seconds: Optional[float]
+    ) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None or not _is_fresh(entry[1], now, max_age_seconds):
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _put_in_memory(self, key: str, value: V, fetched_at: float):
+        with self._lock:
+            self._entries[key] = (value, fetched_at)
+            self._entries.move_to_end(key)
+            while self.max_size is not None and len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _is_shared(self) -> bool:
+        return self.shared_cache_key_prefix is not None and self.shared_cache_enabled
+
+    def _get_shared(self, key: str) -> Optional[Tuple[float, V]]:
+        # Imported here, since the DynamoDb client caches its own lookups with this class
+        import src.aws.dynamodb_client as dynamodb_client
+
+        cache_entry = dynamodb_client.get_cache_entry(
+            f"{self.shared_cache_key_prefix}/{key}"
+        )
+        if cache_entry is None:
+            return None
+        return cache_entry[0], self.deserialize(cache_entry[1])
+
+    def _put_shared(self, key: str, value: V, fetched_at: float):
+        import src.aws.dynamodb_client as dynamodb_client
+
+        dynamodb_client.put_cache_entry(
+            f"{self.shared_cache_key_prefix}/{key}", fetched_at, self.serialize(value)
+        )
+
+
+def _is_fresh(fetched_at: float, now: float, max_age_seconds: Optional[float]) -> bool:
+    return max_age_seconds is None or now - fetched_at < max_age_seconds
@@ -12,14 +12,76 @@ ENV = os.getenv("ENV", "dev")
 AWS_REGION = os.getenv("AWS_REGION")
 LOCK_TABLE = os.getenv("LOCK_TABLE", "sgtm-lock")
 OBJECTS_TABLE = os.getenv("OBJECTS_TABLE", "sgtm-objects")
+# GitHub node-id -> Asana object-id mappings never change once written, so they
+# are cached in memory, up to this many. Misses aren't cached, since the mapping
+# may be written by a concurrent invocation.
+ASANA_ID_CACHE_MAX_SIZE = int(os.getenv("ASANA_ID_CACHE_MAX_SIZE", "10000"))
 GITHUB_USERNAMES_TO_ASANA_GIDS_S3_PATH = os.getenv(
     "GITHUB_USERNAMES_TO_ASANA_GIDS_S3_PATH",
 )
+# How long the in-memory copy of the mapping file is trusted before it is
+# revalidated against S3.
+GITHUB_USERNAMES_TO_ASANA_GIDS_TTL_SECONDS = float(
+    os.getenv("GITHUB_USERNAMES_TO_ASANA_GIDS_TTL_SECONDS", "300")
+)
 SQS_URL = os.getenv("SQS_URL")
+# Github team members, used to expand @org/team mentions and to check
+# SGTM_FEATURE__SKIP_TEAM_SLUG, are cached in memory for this long, for up to
+# this many teams. When the shared cache is enabled, they're also cached in the
+# objects table so that cold Lambdas don't have to refetch them.
+GITHUB_TEAM_MEMBERS_TTL_SECONDS = float(
+    os.getenv("GITHUB_TEAM_MEMBERS_TTL_SECONDS", "300")
+)
+GITHUB_TEAM_MEMBERS_CACHE_MAX_SIZE = int(
+    os.getenv("GITHUB_TEAM_MEMBERS_CACHE_MAX_SIZE", "256")
+)
+GITHUB_TEAM_MEMBERS_SHARED_CACHE_ENABLED = (
+    os.getenv("GITHUB_TEAM_MEMBERS_SHARED_CACHE_ENABLED") == "true"
+)
+# The pull requests of a check suite are synced by up to this many threads, each
+# holding its pull request's lock.
+CHECK_SUITE_MAX_CONCURRENCY = int(os.getenv("CHECK_SUITE_MAX_CONCURRENCY", "4"))
 GITHUB_APP_NAME = os.getenv("GITHUB_APP_NAME", None)
 GITHUB_APP_INSTALLATION_ACCESS_TOKEN_RETRIEVAL_URL = os.getenv(
     "GITHUB_APP_INSTALLATION_ACCESS_TOKEN_RETRIEVAL_URL", None
 )
+# Up to this many commit id -> pull request id mappings, resolved when handling
+# status webhooks, are cached in memory.
+GITHUB_COMMIT_PULL_REQUEST_CACHE_MAX_SIZE = int(
+    os.getenv("GITHUB_COMMIT_PULL_REQUEST_CACHE_MAX_SIZE", "10000")
+)
+# Total time we're willing to spend retrying a GraphQL query that fails with
+# "Could not resolve to a node", which Github returns when we query a node_id
+# from a webhook before it is readable (no read-after-write consistency).
+GITHUB_GRAPHQL_NODE_RESOLUTION_RETRY_BUDGET_SECONDS = float(
+    os.getenv("GITHUB_GRAPHQL_NODE_RESOLUTION_RETRY_BUDGET_SECONDS", "8")
+)
+# Project custom field settings are schema data that rarely changes, so they're
+# cached in memory for this long. When the shared cache is enabled, they're also
+# cached in the objects table so that cold Lambdas don't have to refetch them.
+ASANA_PROJECT_CUSTOM_FIELDS_TTL_SECONDS = float(
+    os.getenv("ASANA_PROJECT_CUSTOM_FIELDS_TTL_SECONDS", "3600")
+)
+ASANA_PROJECT_CUSTOM_FIELDS_SHARED_CACHE_ENABLED = (
+    os.getenv("ASANA_PROJECT_CUSTOM_FIELDS_SHARED_CACHE_ENABLED") == "true"
+)
+# Attachments in a pull request description or comment are downloaded from
+# Github and uploaded to Asana concurrently, by up to this many threads, each
+# request timing out after ATTACHMENT_REQUEST_TIMEOUT_SECONDS. Attachments that
+# aren't done within ATTACHMENT_TIME_BUDGET_SECONDS are deferred to a follow-up
+# SQS message, at most ATTACHMENT_MAX_DEFERRALS times, so that they don't hold
+# the pull request's lock.
+ATTACHMENT_MAX_CONCURRENCY = int(os.getenv("ATTACHMENT_MAX_CONCURRENCY", "4"))
+ATTACHMENT_REQUEST_TIMEOUT_SECONDS = float(
+    os.getenv("ATTACHMENT_REQUEST_TIMEOUT_SECONDS", "10")
+)
+ATTACHMENT_TIME_BUDGET_SECONDS = float(os.getenv("ATTACHMENT_TIME_BUDGET_SECONDS", "8"))
+ATTACHMENT_MAX_DEFERRALS = int(os.getenv("ATTACHMENT_MAX_DEFERRALS", "3"))
+# Attachments are streamed rather than read into memory, and larger ones than
+# this are skipped. Asana doesn't accept attachments over 100MB.
+ATTACHMENT_MAX_SIZE_BYTES = int(
+    os.getenv("ATTACHMENT_MAX_SIZE_BYTES", str(100 * 1024 * 1024))
+)
 
 
 # Feature flags
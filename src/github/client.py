@@ -1,35 +1,80 @@
+from dataclasses import dataclass
+from functools import lru_cache
 import requests
 from requests.auth import HTTPBasicAuth
 from typing import Optional
 
-from github import PullRequest  # type: ignore
+from github.Repository import Repository  # type: ignore
 from src.github.get_app_token import sgtm_github_auth
 from src.logger import logger
 
+_GITHUB_API_URL = "https://api.github.com"
 
-def _get_repo(owner: str, repository: str):  # type: ignore
-    return sgtm_github_auth(owner).get_rest_client().get_repo(f"{owner}/{repository}")
+# Repository and pull request handles are cached, up to this many. The repository handle is a lazy
+# PyGithub object, and the pull request handle only holds REST paths, so neither makes a request
+# until it's used, and neither holds any state that can go stale.
+_HANDLE_CACHE_SIZE = 256
 
 
-def _get_pull_request(owner: str, repository: str, number: int) -> PullRequest:  # type: ignore
-    repo = _get_repo(owner, repository)
-    pr = repo.get_pull(number)
-    return pr  # type: ignore
+@dataclass(frozen=True)
+class _PullRequestHandle:
+    url: str
+    issue_url: str
+    issue_comments_url: str
+
+
+@lru_cache(maxsize=_HANDLE_CACHE_SIZE)
+def _get_repo(owner: str, repository: str) -> Repository:  # type: ignore
+    return (
+        sgtm_github_auth(owner)
+        .get_rest_client()
+        .get_repo(f"{owner}/{repository}", lazy=True)
+    )
+
+
+@lru_cache(maxsize=_HANDLE_CACHE_SIZE)
+def _get_pull_request_handle(
+    owner: str, repository: str, number: int
+) -> _PullRequestHandle:
+    repository_url = f"{_GITHUB_API_URL}/repos/{owner}/{repository}"
+    return _PullRequestHandle(
+        url=f"{repository_url}/pulls/{number}",
+        issue_url=f"{repository_url}/issues/{number}",
+        issue_comments_url=f"{repository_url}/issues/comments",
+    )
+
+
+def _rest_request(
+    owner: str, method: str, url: str, body: Optional[dict] = None
+) -> requests.Response:
+    """
+    Sends a single REST request with the org's token, raising an HTTPError unless it succeeds.
+    Edits go through here rather than through PyGithub, which would fetch the object first.
+    """
+    github_auth = sgtm_github_auth(owner)
+    auth = HTTPBasicAuth(github_auth.get_token().token, "")
+    response = github_auth.get_http_session().request(method, url, auth=auth, json=body)
+    if not 200 <= response.status_code < 300:
+        raise requests.HTTPError(
+            f"{method} {url} failed with status {response.status_code}: {response.text}",
+            response=response,
+        )
+    return response
 
 
 def edit_pr_description(owner: str, repository: str, number: int, description: str):
-    pr = _get_pull_request(owner, repository, number)
-    pr.edit(body=description)  # type: ignore
+    pr = _get_pull_request_handle(owner, repository, number)
+    _rest_request(owner, "PATCH", pr.url, {"body": description})
 
 
 def edit_pr_title(owner: str, repository: str, number: int, title: str):
-    pr = _get_pull_request(owner, repository, number)
-    pr.edit(title=title)  # type: ignore
+    pr = _get_pull_request_handle(owner, repository, number)
+    _rest_request(owner, "PATCH", pr.url, {"title": title})
 
 
 def add_pr_comment(owner: str, repository: str, number: int, comment: str):
-    pr = _get_pull_request(owner, repository, number)
-    pr.create_issue_comment(comment)  # type: ignore
+    pr = _get_pull_request_handle(owner, repository, number)
+    _rest_request(owner, "POST", f"{pr.issue_url}/comments", {"body": comment})
 
 
 def edit_comment(
@@ -37,29 +82,29 @@ def edit_comment(
 ):
     if comment_id is None:
         raise ValueError("Comment ID is required")
-    pr = _get_pull_request(owner, repository, number)
-    comment = pr.get_issue_comment(comment_id)  # type: ignore
-    comment.edit(body=new_body)  # type: ignore
+    pr = _get_pull_request_handle(owner, repository, number)
+    _rest_request(
+        owner, "PATCH", f"{pr.issue_comments_url}/{comment_id}", {"body": new_body}
+    )
 
 
 def delete_comment(owner: str, repository: str, number: int, comment_id: Optional[int]):
     if comment_id is None:
         raise ValueError("Comment ID is required")
-    pr = _get_pull_request(owner, repository, number)
-    comment = pr.get_issue_comment(comment_id)  # type: ignore
-    comment.delete()  # type: ignore
+    pr = _get_pull_request_handle(owner, repository, number)
+    _rest_request(owner, "DELETE", f"{pr.issue_comments_url}/{comment_id}")
 
 
 def set_pull_request_assignee(owner: str, repository: str, number: int, assignee: str):
-    repo = _get_repo(owner, repository)
-    # Using get_issue here because get_pull returns a pull request which only
-    # allows you to *add* an assignee, not set the assignee.
-    pr = repo.get_issue(number)
-    pr.edit(assignee=assignee)  # type: ignore
+    pr = _get_pull_request_handle(owner, repository, number)
+    # Using the issue here because the pull request endpoints only allow you to
+    # *add* an assignee, not set the assignee.
+    _rest_request(owner, "PATCH", pr.issue_url, {"assignees": [assignee]})
 
 
 def merge_pull_request(owner: str, repository: str, number: int, title: str, body: str):
-    pr = _get_pull_request(owner, repository, number)
+    # Enabling automerge needs the pull request's node id, so it's fetched in full here.
+    pr = _get_repo(owner, repository).get_pull(number)
 
     # we add the PR number to match Github's default squash and merge title style
     # which we rely on for code review tests.
@@ -75,9 +120,10 @@ def merge_pull_request(owner: str, repository: str, number: int, title: str, bod
 
 
 def rerequest_check_run(owner: str, repository: str, check_run_id: int):
-    auth = HTTPBasicAuth(sgtm_github_auth(owner).get_token().token, "")
+    github_auth = sgtm_github_auth(owner)
+    auth = HTTPBasicAuth(github_auth.get_token().token, "")
     url = "https://api.github.com/repos/{owner}/{repository}/check-runs/{check_run_id}/rerequest".format(
         owner=owner, repository=repository, check_run_id=check_run_id
     )
     # Some check runs cannot be rerequested. See https://docs.github.com/en/rest/checks/runs?apiVersion=2022-11-28#rerequest-a-check-run--status-codes
-    return requests.post(url, auth=auth).status_code == 201
+    return github_auth.get_http_session().post(url, auth=auth).status_code == 201
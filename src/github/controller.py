@@ -1,11 +1,9 @@
-import time
-from typing import Dict, Any, List
+from typing import Union
 
 import src.asana.controller as asana_controller
 import src.asana.helpers as asana_helpers
 import src.github.logic as github_logic
 import src.github.client as github_client
-import src.github.graphql.client as github_graphql_client
 import src.aws.dynamodb_client as dynamodb_client
 import src.aws.sqs_client as sqs_client
 from src.config import (
@@ -15,24 +13,6 @@ from src.config import (
 from src.github.models import Comment, PullRequest, Review
 from src.logger import logger
 
-_TEAM_CACHE_TTL_SECONDS = 300
-
-_team_members_cache: Dict[str, Any] = {}
-
-
-def _get_skip_team_members(org: str, team_slug: str) -> List[str]:
-    cache_key = f"{org}/{team_slug}"
-    now = time.monotonic()
-    cached = _team_members_cache.get(cache_key)
-    if cached and (now - cached["ts"]) < _TEAM_CACHE_TTL_SECONDS:
-        logger.info(f"Using cached team members for {cache_key}")
-        return cached["members"]
-
-    members = github_graphql_client.get_team_members(org, team_slug)
-    _team_members_cache[cache_key] = {"members": members, "ts": now}
-    logger.info(f"Fetched and cached {len(members)} members for {cache_key}")
-    return members
-
 
 def _should_skip_task_creation(pull_request: PullRequest) -> bool:
     """Check if task creation should be skipped for this PR author.
@@ -44,7 +24,7 @@ def _should_skip_task_creation(pull_request: PullRequest) -> bool:
         return False
     try:
         org = pull_request.repository_owner_handle()
-        team_members = _get_skip_team_members(org, SGTM_FEATURE__SKIP_TEAM_SLUG)
+        team_members = github_logic.get_team_members(org, SGTM_FEATURE__SKIP_TEAM_SLUG)
         return pull_request.author_handle() in team_members
     except Exception as e:
         logger.warning(
@@ -63,7 +43,12 @@ def upsert_pull_request(pull_request: PullRequest):
         )
         return
 
-    task_id = dynamodb_client.get_asana_id_from_github_node_id(pull_request_id)
+    # Resolve all of the event's mappings at once. Later lookups of the
+    # repository's project are served from the dynamodb_client cache.
+    asana_ids = dynamodb_client.batch_get_asana_ids(
+        [pull_request_id, pull_request.repository_id()]
+    )
+    task_id = asana_ids.get(pull_request_id)
     if task_id is None:
         task_id = asana_controller.create_task(pull_request.repository_id())
         if task_id is None:
@@ -85,6 +70,11 @@ def upsert_pull_request(pull_request: PullRequest):
     )
 
 
+def _full_sync_request(requested_by: Union[Comment, Review]) -> str:
+    # An edit of the comment or review is a new request
+    return f"{requested_by.id()}\n{requested_by.body()}"
+
+
 def _add_asana_task_to_pull_request(pull_request: PullRequest, task_id: str):
     owner = pull_request.repository_owner_handle()
     task_url = asana_helpers.task_url_from_task_id(task_id)
@@ -102,22 +92,32 @@ def _add_asana_task_to_pull_request(pull_request: PullRequest, task_id: str):
 
 def upsert_comment(pull_request: PullRequest, comment: Comment, org_name: str):
     pull_request_id = pull_request.id()
-    task_id = dynamodb_client.get_asana_id_from_github_node_id(pull_request_id)
+    asana_ids = dynamodb_client.batch_get_asana_ids(
+        [pull_request_id, comment.id(), pull_request.repository_id()]
+    )
+    task_id = asana_ids.get(pull_request_id)
     if task_id:
         asana_controller.upsert_github_comment_to_task(comment, task_id)
         # Comments can sometimes post-merge approve a PR, so we requeue a full sync via the "pull_request" event
         if github_logic.is_approval_comment_body(comment.body()):
-            sqs_client.queue_full_sync(pull_request_id, org_name)
+            sqs_client.queue_full_sync(
+                pull_request_id, org_name, _full_sync_request(comment)
+            )
     else:
         logger.warning(
             f"Task not found for pull request {pull_request_id}. Queueing a new event..."
         )
-        sqs_client.queue_full_sync(pull_request_id, org_name)
+        sqs_client.queue_full_sync(
+            pull_request_id, org_name, _full_sync_request(comment)
+        )
 
 
 def upsert_review(pull_request: PullRequest, review: Review, org_name: str):
     pull_request_id = pull_request.id()
-    task_id = dynamodb_client.get_asana_id_from_github_node_id(pull_request_id)
+    asana_ids = dynamodb_client.batch_get_asana_ids(
+        [pull_request_id, review.id(), pull_request.repository_id()]
+    )
+    task_id = asana_ids.get(pull_request_id)
     if task_id:
         logger.info(
             f"Found task id {task_id} for pull_request {pull_request_id}. Adding review"
@@ -146,7 +146,9 @@ def upsert_review(pull_request: PullRequest, review: Review, org_name: str):
         logger.warning(
             f"Task not found for pull request {pull_request_id}. Queueing a new event..."
         )
-        sqs_client.queue_full_sync(pull_request_id, org_name)
+        sqs_client.queue_full_sync(
+            pull_request_id, org_name, _full_sync_request(review)
+        )
 
 
 def assign_pull_request_to_author(pull_request: PullRequest):
@@ -1,9 +1,13 @@
 # pyright: strict
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from functools import cached_property
+import io
 import json
 import os
 import sys
+import urllib.error
+import urllib.request
 import boto3
 from botocore.auth import SigV4Auth
 from botocore.awsrequest import AWSRequest
@@ -11,6 +15,7 @@ from github import Github
 from github.Auth import TOKEN_REFRESH_THRESHOLD_TIMEDELTA, Auth as GithubAuthABC
 from github.NamedUser import NamedUser
 import requests
+from requests.adapters import HTTPAdapter
 from typing_extensions import TypedDict, override
 from typing import (
     Hashable,
@@ -32,6 +37,56 @@ from src.config import (
 
 Key: TypeAlias = Hashable
 
+GITHUB_GRAPHQL_URL = "https://api.github.com/graphql"
+
+# Connections kept alive per host, per org. Lambda handles one event at a time,
+# but a handful lets bounded parallel work share the pool without blocking.
+_HTTP_POOL_MAXSIZE = 10
+
+
+def new_http_session() -> requests.Session:
+    """
+    Create a requests session with a keep-alive connection pool. Sessions are meant to be kept
+    for the lifetime of the process, so that warm Lambda invocations skip the TCP and TLS
+    handshakes to api.github.com.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_HTTP_POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class SessionURLOpener:
+    """
+    A urlopen replacement for sgqlc's HTTPEndpoint that sends requests through a pooled requests
+    session instead of opening a new connection per request. Responses and errors are surfaced the
+    way urllib.request.urlopen surfaces them, which is what HTTPEndpoint expects.
+    """
+
+    def __init__(self, session: requests.Session):
+        self.session = session
+
+    def __call__(
+        self, request: urllib.request.Request, timeout: Optional[float] = None
+    ) -> io.BytesIO:
+        response = self.session.request(
+            method=request.get_method(),
+            url=request.full_url,
+            headers={name: str(value) for name, value in request.header_items()},
+            data=cast(Optional[bytes], request.data),
+            timeout=timeout,
+        )
+        if response.status_code >= 400:
+            raise urllib.error.HTTPError(
+                request.full_url,
+                response.status_code,
+                response.reason,
+                response.headers,  # type: ignore
+                io.BytesIO(response.content),
+            )
+        return io.BytesIO(response.content)
+
 
 class TokenContainer(Protocol):
     """
@@ -167,6 +222,9 @@ class SGTMGithubAuth(Protocol):
     def get_graphql_endpoint(self) -> HTTPEndpoint:
         ...
 
+    def get_http_session(self) -> requests.Session:
+        ...
+
 
 @dataclass(frozen=True)
 class SGTMGithubLocalAuth(SGTMGithubAuth):
@@ -181,12 +239,32 @@ class SGTMGithubLocalAuth(SGTMGithubAuth):
 
     @override
     def get_rest_client(self) -> Github:
+        return self._rest_client
+
+    @cached_property
+    def _rest_client(self) -> Github:
         return Github(self.get_token().token)
 
     @override
     def get_graphql_endpoint(self) -> HTTPEndpoint:
+        return self._graphql_endpoint
+
+    @cached_property
+    def _graphql_endpoint(self) -> HTTPEndpoint:
         headers = {"Authorization": f"bearer {self.get_token().token}"}
-        return HTTPEndpoint("https://api.github.com/graphql", headers)
+        return HTTPEndpoint(
+            GITHUB_GRAPHQL_URL,
+            headers,
+            urlopen=SessionURLOpener(self.get_http_session()),
+        )
+
+    @override
+    def get_http_session(self) -> requests.Session:
+        return self._http_session
+
+    @cached_property
+    def _http_session(self) -> requests.Session:
+        return new_http_session()
 
 
 class GithubAutoRefreshedGraphQLEndpoint(HTTPEndpoint):
@@ -199,10 +277,18 @@ class GithubAutoRefreshedGraphQLEndpoint(HTTPEndpoint):
     __current_token: Optional[TokenContainer] = None
     __auth_refresher: GithubAutoRefreshedAppTokenAuth
 
-    def __init__(self, auth_refresher: GithubAutoRefreshedAppTokenAuth) -> None:
+    def __init__(
+        self,
+        auth_refresher: GithubAutoRefreshedAppTokenAuth,
+        session: Optional[requests.Session] = None,
+    ) -> None:
         self.__auth_refresher = auth_refresher
         auth_header = self.__get_new_auth_headers()
-        super().__init__("https://api.github.com/graphql", auth_header)
+        super().__init__(
+            GITHUB_GRAPHQL_URL,
+            auth_header,
+            urlopen=SessionURLOpener(session) if session is not None else None,
+        )
 
     @override
     def __call__(self, *args, **kwargs) -> dict:
@@ -260,6 +346,9 @@ class SGTMGithubAppTokenAuth(SGTMGithubAuth):
         self.github_org_name = github_org_name
         self.session = session or boto3.Session()
         self.__auto_refreshed_auth_obj = GithubAutoRefreshedAppTokenAuth(self)
+        self.__rest_client: Optional[Github] = None
+        self.__http_session = new_http_session()
+        self.__graphql_endpoint: Optional[GithubAutoRefreshedGraphQLEndpoint] = None
 
     class TokenDict(TypedDict):
         """
@@ -323,7 +412,7 @@ class SGTMGithubAppTokenAuth(SGTMGithubAuth):
         )
         sigV4Auth.add_auth(aws_request)
 
-        response = requests.request(
+        response = self.__http_session.request(
             method="POST",
             url=GITHUB_APP_INSTALLATION_ACCESS_TOKEN_RETRIEVAL_URL,
             headers=dict(aws_request.headers),
@@ -348,11 +437,25 @@ class SGTMGithubAppTokenAuth(SGTMGithubAuth):
 
     @override
     def get_rest_client(self) -> Github:
-        return Github(auth=self.__auto_refreshed_auth_obj)
+        # The client refreshes its token through the auth object, so it can be reused for the
+        # lifetime of the process.
+        if self.__rest_client is None:
+            self.__rest_client = Github(auth=self.__auto_refreshed_auth_obj)
+        return self.__rest_client
 
     @override
     def get_graphql_endpoint(self) -> HTTPEndpoint:
-        return GithubAutoRefreshedGraphQLEndpoint(self.__auto_refreshed_auth_obj)
+        # The endpoint refreshes its auth headers itself when the token expires, so it can be
+        # reused for the lifetime of the process, along with its pooled connections.
+        if self.__graphql_endpoint is None:
+            self.__graphql_endpoint = GithubAutoRefreshedGraphQLEndpoint(
+                self.__auto_refreshed_auth_obj, self.__http_session
+            )
+        return self.__graphql_endpoint
+
+    @override
+    def get_http_session(self) -> requests.Session:
+        return self.__http_session
 
 
 sgtm_github_local_auth: SGTMGithubAuth = SGTMGithubLocalAuth()
@@ -1,15 +1,27 @@
+import random
+import time
 from typing import Tuple, FrozenSet, Optional, List
 from sgqlc.endpoint.http import HTTPEndpoint  # type: ignore
+import src.metrics as metrics
+from src.cache import Cache
+from src.config import (
+    GITHUB_COMMIT_PULL_REQUEST_CACHE_MAX_SIZE,
+    GITHUB_GRAPHQL_NODE_RESOLUTION_RETRY_BUDGET_SECONDS,
+)
 from src.github.get_app_token import sgtm_github_auth
 from src.github.models import comment_factory, PullRequest, Review, Comment
+from src.logger import logger
 from .queries import (
     GetPullRequest,
-    GetPullRequestByRepositoryAndNumber,
+    GetPullRequestsByRepositoryAndNumbers,
+    MAX_PULL_REQUESTS_PER_QUERY,
     GetPullRequestAndComment,
     GetPullRequestAndReview,
-    IteratePullRequestIdsForCommitId,
+    GetReview,
+    IteratePullRequestsForCommitId,
     IterateReviewsForPullRequestId,
     GetTeamMembers,
+    get_query_document,
 )
 
 ####################################################################################################
@@ -17,14 +29,89 @@ from .queries import (
 ####################################################################################################
 
 
+_NODE_RESOLUTION_ERROR_MESSAGE = "Could not resolve to a node"
+_NODE_RESOLUTION_RETRY_BASE_DELAY_SECONDS = 0.25
+_NODE_RESOLUTION_RETRY_MAX_DELAY_SECONDS = 2.0
+
+
+def _is_node_resolution_error(response: dict) -> bool:
+    """Github webhooks can reference node ids before they are readable through the
+    GraphQL API (there is no read-after-write consistency), which surfaces as a
+    "Could not resolve to a node with the global id of '<node_id>'" error.
+    """
+    return any(
+        _NODE_RESOLUTION_ERROR_MESSAGE in (error.get("message") or "")
+        for error in response.get("errors") or []
+    )
+
+
+def _is_missing_field_error(error: dict) -> bool:
+    """Github reports a field nested under a queried node whose arguments match nothing, e.g.
+    repository.pullRequest(number:) of a pull request that doesn't exist, as a NOT_FOUND error at
+    the field's path, and returns the field as null.
+    """
+    return error.get("type") == "NOT_FOUND" and len(error.get("path") or []) > 1
+
+
+def _is_allowed_error(
+    error: dict, allow_unresolved_nodes: bool, allow_missing_fields: bool
+) -> bool:
+    return (
+        allow_unresolved_nodes
+        and _NODE_RESOLUTION_ERROR_MESSAGE in (error.get("message") or "")
+    ) or (allow_missing_fields and _is_missing_field_error(error))
+
+
 def _execute_graphql_query(
-    org_name: str, query: FrozenSet[str], variables: dict
+    org_name: str,
+    query: FrozenSet[str],
+    variables: dict,
+    allow_unresolved_nodes: bool = False,
+    allow_missing_fields: bool = False,
 ) -> dict:
-    query_str = "\n".join(query)
-
-    response = sgtm_github_auth(org_name).get_graphql_endpoint()(query_str, variables)
-    if "errors" in response:
-        raise ValueError(f"Error in graphql query:\n{response }")
+    """
+    Executes the query, raising a ValueError if it fails. Unless allow_unresolved_nodes is set,
+    nodes that can't be resolved yet are retried; when it's set, they're returned as null, for
+    queries of nodes that are known to have existed and may have been deleted since. When
+    allow_missing_fields is set, fields of the queried nodes that aren't found are returned as null.
+    """
+    document = get_query_document(query)
+    logger.debug(f"Executing graphql query {document.name} ({document.id})")
+
+    endpoint = sgtm_github_auth(org_name).get_graphql_endpoint()
+    response = endpoint(document.text, variables)
+
+    # The common case goes straight through. Only when Github can't resolve a
+    # node yet do we retry, with jittered exponential backoff, until the retry
+    # budget is spent.
+    retries = 0
+    delay = _NODE_RESOLUTION_RETRY_BASE_DELAY_SECONDS
+    deadline = time.monotonic() + GITHUB_GRAPHQL_NODE_RESOLUTION_RETRY_BUDGET_SECONDS
+    while not allow_unresolved_nodes and _is_node_resolution_error(response):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(remaining, delay / 2 + random.uniform(0, delay / 2)))
+        delay = min(delay * 2, _NODE_RESOLUTION_RETRY_MAX_DELAY_SECONDS)
+        retries += 1
+        response = endpoint(document.text, variables)
+
+    if retries > 0:
+        logger.info(
+            f"Retried graphql query {document.name} {retries} time(s) waiting for node"
+            " resolution"
+        )
+        metrics.increment("graphql.node_resolution_retried_queries")
+        metrics.increment("graphql.node_resolution_retries", retries)
+
+    if "errors" in response and not (
+        (allow_unresolved_nodes or allow_missing_fields)
+        and all(
+            _is_allowed_error(error, allow_unresolved_nodes, allow_missing_fields)
+            for error in response["errors"] or []
+        )
+    ):
+        raise ValueError(f"Error in graphql query {document.name}:\n{response }")
     data = response["data"]
     # if len(data.keys()) == 1:
     #     return data[list(data.keys())[0]]
@@ -43,15 +130,36 @@ def get_pull_request(org_name: str, pull_request_id: str) -> PullRequest:
     return PullRequest(data["pullRequest"])
 
 
-def get_pull_request_by_repository_and_number(
-    org_name: str, repository_node_id: str, pull_request_number: int
-) -> PullRequest:
-    data = _execute_graphql_query(
-        org_name,
-        GetPullRequestByRepositoryAndNumber,
-        {"repositoryId": repository_node_id, "pullRequestNumber": pull_request_number},
-    )
-    return PullRequest(data["repository"]["pullRequest"])
+def get_pull_requests_by_repository_and_numbers(
+    org_name: str, repository_node_id: str, pull_request_numbers: List[int]
+) -> List[PullRequest]:
+    """Get the pull requests of the repository with the given numbers, up to
+    MAX_PULL_REQUESTS_PER_QUERY of them per query, in order. Pull requests that aren't found are
+    left out.
+    """
+    pull_requests = []
+    for start in range(0, len(pull_request_numbers), MAX_PULL_REQUESTS_PER_QUERY):
+        numbers = pull_request_numbers[start : start + MAX_PULL_REQUESTS_PER_QUERY]
+        variables: dict = {"repositoryId": repository_node_id}
+        for i in range(MAX_PULL_REQUESTS_PER_QUERY):
+            # Unused slots repeat a number, but aren't included in the response
+            variables[f"number{i}"] = numbers[min(i, len(numbers) - 1)]
+            variables[f"include{i}"] = i < len(numbers)
+        repository = _execute_graphql_query(
+            org_name,
+            GetPullRequestsByRepositoryAndNumbers,
+            variables,
+            allow_missing_fields=True,
+        )["repository"]
+        for i, number in enumerate(numbers):
+            raw_pull_request = repository[f"pullRequest{i}"]
+            if raw_pull_request is None:
+                logger.warning(
+                    f"Pull request {number} not found in repository {repository_node_id}"
+                )
+            else:
+                pull_requests.append(PullRequest(raw_pull_request))
+    return pull_requests
 
 
 def get_pull_request_and_comment(
@@ -76,6 +184,19 @@ def get_pull_request_and_review(
     return PullRequest(data["pullRequest"]), Review(data["review"])
 
 
+# Commit id -> the id of the pull request it was the head commit of. Repeated statuses for the same
+# commit skip the search, as long as the commit is still the pull request's head.
+_pull_request_ids_by_commit_id: Cache[str] = Cache(
+    "graphql.commit_pull_request",
+    max_size=GITHUB_COMMIT_PULL_REQUEST_CACHE_MAX_SIZE,
+)
+
+
+def _is_head_commit(pull_request: PullRequest, commit_id: str) -> bool:
+    commits = pull_request.commits()
+    return len(commits) > 0 and commits[0].node_id() == commit_id
+
+
 def get_pull_request_for_commit_id(
     org_name: str, commit_id: str
 ) -> Optional[PullRequest]:
@@ -85,38 +206,51 @@ def get_pull_request_for_commit_id(
     We're only interested in the first pull request where the head commit (latest commit) matches the given commit id.
     We could match commit shas but commit ids are more stable.
 
+    The associated pull requests are fetched in full along with their head commits, so that the
+    common case takes a single query. Once found, the pull request's id is cached for the commit,
+    so that later statuses of the same commit fetch the pull request directly. A cached pull request
+    whose head has since moved on, e.g. after a force push, is forgotten and searched for again.
+
     TODO: handle multiple pull requests for a commit id.
     """
-
-    def is_last_commit(pull_request_edge):
-        last_commit_id = pull_request_edge["node"]["commits"]["nodes"][0]["commit"][
-            "id"
-        ]
-        return last_commit_id == commit_id
-
-    pull_request_edges = _execute_graphql_query(
-        org_name, IteratePullRequestIdsForCommitId, {"commitId": commit_id}
-    )["commit"]["associatedPullRequests"]["edges"]
-    while pull_request_edges:
-        try:
-            match = next(
-                (e["node"]["id"] for e in pull_request_edges if is_last_commit(e))
-            )
-            return get_pull_request(org_name, match)
-        except StopIteration:
-            pull_request_edges = _execute_graphql_query(
-                org_name,
-                IteratePullRequestIdsForCommitId,
-                {
-                    "commitId": commit_id,
-                    "cursor": pull_request_edges[-1]["cursor"],
-                },
-            )["commit"]["associatedPullRequests"]["edges"]
-    return None
+    pull_request_id = _pull_request_ids_by_commit_id.get(commit_id)
+    if pull_request_id is not None:
+        pull_request = get_pull_request(org_name, pull_request_id)
+        if _is_head_commit(pull_request, commit_id):
+            return pull_request
+        _pull_request_ids_by_commit_id.delete(commit_id)
+
+    variables = {"commitId": commit_id}
+    while True:
+        pull_request_edges = _execute_graphql_query(
+            org_name, IteratePullRequestsForCommitId, variables
+        )["commit"]["associatedPullRequests"]["edges"]
+        if not pull_request_edges:
+            return None
+        for edge in pull_request_edges:
+            pull_request = PullRequest(edge["node"])
+            if _is_head_commit(pull_request, commit_id):
+                _pull_request_ids_by_commit_id.put(commit_id, pull_request.id())
+                return pull_request
+        variables = {"commitId": commit_id, "cursor": pull_request_edges[-1]["cursor"]}
+
+
+def get_review(org_name: str, review_id: str) -> Optional[Review]:
+    """Get the PullRequestReview given its node id, or None if it has been deleted.
+
+    Only for reviews that SGTM has read before: a review that can't be resolved is assumed to be
+    deleted, rather than not yet readable.
+    """
+    data = _execute_graphql_query(
+        org_name, GetReview, {"reviewId": review_id}, allow_unresolved_nodes=True
+    )
+    if data["review"] is None:
+        return None
+    return Review(data["review"])
 
 
 def get_review_for_database_id(
-    org_name: str, pull_request_id: str, review_db_id: str
+    org_name: str, pull_request_id: str, review_db_id: int
 ) -> Optional[Review]:
     """Get the PullRequestReview given a pull request and the NUMERIC id id of the review.
 
@@ -130,7 +264,8 @@ def get_review_for_database_id(
         @pull_request_id is the `id` for the pull request.
         @review_db_id is the `databaseId` for the review.
 
-    Unfortunately, this requires iterating through all reviews on the given pull request.
+    Unfortunately, this requires iterating through all reviews on the given pull request. Prefer
+    get_review with the node id that SGTM recorded for the review when it synced it, if any.
 
     See https://developer.github.com/v4/object/repository/#fields
     """
@@ -159,7 +294,7 @@ def get_review_for_database_id(
 
 
 def get_team_members(org: str, team_slug: str) -> List[str]:
-    """Get all members of a GitHub team.
+    """Get all members of a GitHub team, paging through them 100 at a time.
 
     Args:
         org: The organization name
@@ -168,12 +303,15 @@ def get_team_members(org: str, team_slug: str) -> List[str]:
     Returns:
         List of GitHub usernames of team members
     """
-    data = _execute_graphql_query(
-        org,
-        GetTeamMembers.GetTeamMembers,
-        {"org": org, "teamSlug": team_slug},
-    )
-    team = data["organization"]["team"]
-    if not team:
-        return []
-    return [node["login"] for node in team["members"]["nodes"]]
+    variables = {"org": org, "teamSlug": team_slug}
+    logins: List[str] = []
+    while True:
+        data = _execute_graphql_query(org, GetTeamMembers.GetTeamMembers, variables)
+        team = data["organization"]["team"]
+        if not team:
+            return logins
+        members = team["members"]
+        logins.extend(node["login"] for node in members["nodes"])
+        if not members["pageInfo"]["hasNextPage"]:
+            return logins
+        variables = {**variables, "cursor": members["pageInfo"]["endCursor"]}
@@ -8,7 +8,8 @@
   One issue: graphql will reject any query that contains duplicate fragments (i.e. the same name).
   This is a problem because if A imports B and C; and B and C both import D, then A will be a syntax error.
   So, we store the queries / fragments as sets, formed as a union of itself with all of its dependencies.
-  At query time, we convert each set to a single string, with elements separated by new lines.
+  Each query's set is compiled once into a single document, with its definitions in a
+  deterministic order (see get_query_document in queries/__init__.py).
 """
 
 from typing import FrozenSet
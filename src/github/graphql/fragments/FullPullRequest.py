@@ -77,6 +77,7 @@ fragment FullPullRequest on PullRequest {
   commits(last: 1) {
     nodes {
       commit {
+        id
         statusCheckRollup {
           state
         }
@@ -5,6 +5,7 @@ from .FullComment import FullComment
 _full_review = """
 fragment FullReview on PullRequestReview {
   id
+  databaseId
   author {
     login
     ... on User {
@@ -0,0 +1,35 @@
+from typing import FrozenSet
+from ..fragments import FullPullRequest, FullReview
+
+# The most pull requests fetched by one query. Every slot is always in the
+# query, and unused ones are skipped with @include, so that the query text is
+# the same whatever the number of pull requests.
+MAX_PULL_REQUESTS_PER_QUERY = 5
+
+# @GraphqlInPython
+_get_pull_requests_by_repository_and_numbers = """
+query GetPullRequestsByRepositoryAndNumbers($repositoryId: ID!, %s) {
+  repository: node(id: $repositoryId) {
+    ... on Repository {
+%s
+    }
+  }
+}
+""" % (
+    ", ".join(
+        f"$number{i}: Int!, $include{i}: Boolean!"
+        for i in range(MAX_PULL_REQUESTS_PER_QUERY)
+    ),
+    "\n".join(
+        f"""      pullRequest{i}: pullRequest(number: $number{i}) @include(if: $include{i}) {{
+        ...FullPullRequest
+      }}"""
+        for i in range(MAX_PULL_REQUESTS_PER_QUERY)
+    ),
+)
+
+GetPullRequestsByRepositoryAndNumbers: FrozenSet[str] = (
+    frozenset([_get_pull_requests_by_repository_and_numbers])
+    | FullPullRequest
+    | FullReview
+)
@@ -0,0 +1,16 @@
+from typing import FrozenSet
+from ..fragments import FullReview
+
+# @GraphqlInPython
+_get_review = """
+query GetReview($reviewId: ID!) {
+  review: node(id: $reviewId) {
+    __typename
+    ... on PullRequestReview {
+      ...FullReview
+    }
+  }
+}
+"""
+
+GetReview: FrozenSet[str] = frozenset([_get_review]) | FullReview
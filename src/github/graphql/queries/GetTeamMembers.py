@@ -2,10 +2,14 @@ from typing import FrozenSet
 
 # @GraphqlInPython
 _get_team_members = """
-query GetTeamMembers($org: String!, $teamSlug: String!) {
+query GetTeamMembers($org: String!, $teamSlug: String!, $cursor: String) {
   organization(login: $org) {
     team(slug: $teamSlug) {
-      members(first: 100) {
+      members(first: 100, after: $cursor) {
+        pageInfo {
+          hasNextPage
+          endCursor
+        }
         nodes {
           login
         }
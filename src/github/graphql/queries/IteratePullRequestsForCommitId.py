@@ -0,0 +1,28 @@
+from typing import FrozenSet
+from ..fragments import FullPullRequest, FullReview
+
+# Pages are kept small, since each pull request is fetched in full. Commits are
+# rarely associated with more than a couple of pull requests.
+# @GraphqlInPython
+_iterate_pull_requests_for_commit_id = """
+query IteratePullRequestsForCommitId($commitId: ID!, $cursor: String) {
+  commit: node(id: $commitId) {
+    ... on Commit {
+      associatedPullRequests(first: 5, after: $cursor) {
+        edges {
+          cursor
+          node {
+            ... on PullRequest {
+              ...FullPullRequest
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+IteratePullRequestsForCommitId: FrozenSet[str] = (
+    frozenset([_iterate_pull_requests_for_commit_id]) | FullPullRequest | FullReview
+)
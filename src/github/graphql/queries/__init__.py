@@ -1,6 +1,81 @@
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Dict, FrozenSet
+
+from . import GetTeamMembers
 from .GetPullRequest import GetPullRequest
-from .GetPullRequestByRepositoryAndNumber import GetPullRequestByRepositoryAndNumber
+from .GetPullRequestsByRepositoryAndNumbers import (
+    GetPullRequestsByRepositoryAndNumbers,
+    MAX_PULL_REQUESTS_PER_QUERY,
+)
 from .GetPullRequestAndComment import GetPullRequestAndComment
 from .GetPullRequestAndReview import GetPullRequestAndReview
-from .IteratePullRequestIdsForCommitId import IteratePullRequestIdsForCommitId
+from .GetReview import GetReview
+from .IteratePullRequestsForCommitId import IteratePullRequestsForCommitId
 from .IterateReviewsForPullRequestId import IterateReviewsForPullRequestId
+
+
+@dataclass(frozen=True)
+class QueryDocument:
+    """
+    A query together with the fragments it uses, as the single document sent to Github. The
+    text, and so the id (a hash of the text), is the same in every process, so that responses can
+    be cached, and requests logged, by query id.
+    """
+
+    name: str
+    text: str
+    id: str
+
+
+_DEFINITION_REGEX = re.compile(r"^\s*(query|mutation|fragment)\s+(\w+)")
+
+
+def compile_query(query: FrozenSet[str]) -> QueryDocument:
+    """
+    Joins the query's definitions into one document: the operation first, then its fragments in
+    order of name. The set's own order depends on the process's string hashing.
+    """
+    operations = []
+    fragments = []
+    for definition in query:
+        match = _DEFINITION_REGEX.match(definition)
+        if match is not None and match.group(1) == "fragment":
+            fragments.append((match.group(2), definition))
+        else:
+            operations.append((match.group(2) if match else "anonymous", definition))
+    operations.sort()
+    fragments.sort()
+    text = "\n".join(definition for _, definition in operations + fragments)
+    return QueryDocument(
+        name="+".join(name for name, _ in operations),
+        text=text,
+        id=hashlib.sha256(text.encode()).hexdigest(),
+    )
+
+
+# Every query that SGTM sends, compiled once
+QUERY_DOCUMENTS: Dict[FrozenSet[str], QueryDocument] = {
+    query: compile_query(query)
+    for query in [
+        GetPullRequest,
+        GetPullRequestsByRepositoryAndNumbers,
+        GetPullRequestAndComment,
+        GetPullRequestAndReview,
+        GetReview,
+        GetTeamMembers.GetTeamMembers,
+        IteratePullRequestsForCommitId,
+        IterateReviewsForPullRequestId,
+    ]
+}
+
+
+def get_query_document(query: FrozenSet[str]) -> QueryDocument:
+    """
+    Returns the compiled document of a query in QUERY_DOCUMENTS, compiling any other query
+    """
+    document = QUERY_DOCUMENTS.get(query)
+    if document is None:
+        document = compile_query(query)
+    return document
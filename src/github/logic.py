@@ -1,5 +1,6 @@
 import re
 from typing import List, Set, Optional, Tuple
+from src.cache import Cache
 from src.logger import logger
 
 from . import client as github_client
@@ -17,6 +18,9 @@ from src.config import (
     SGTM_FEATURE__DISABLE_GITHUB_TEAM_SUBSCRIPTION,
     SGTM_FEATURE__FOLLOWUP_REVIEW_GITHUB_USERS,
     SGTM_FEATURE__AUTOMERGE_DISABLED_REPOSITORIES,
+    GITHUB_TEAM_MEMBERS_CACHE_MAX_SIZE,
+    GITHUB_TEAM_MEMBERS_SHARED_CACHE_ENABLED,
+    GITHUB_TEAM_MEMBERS_TTL_SECONDS,
 )
 
 GITHUB_USERNAME_MENTION_REGEX = r"\B@([A-Za-z0-9_\-]+)(?![A-Za-z0-9_\-]*/)"
@@ -84,6 +88,32 @@ def _extract_team_mentions(text: str) -> List[str]:
     return re.findall(GITHUB_TEAM_MENTION_REGEX, text)
 
 
+# "org/team-slug" -> the team's member logins
+_team_members_cache: Cache[List[str]] = Cache(
+    "github.team_members",
+    max_size=GITHUB_TEAM_MEMBERS_CACHE_MAX_SIZE,
+    ttl_seconds=GITHUB_TEAM_MEMBERS_TTL_SECONDS,
+    shared_cache_key_prefix="github-team-members",
+    shared_cache_enabled=GITHUB_TEAM_MEMBERS_SHARED_CACHE_ENABLED,
+)
+
+
+def get_team_members(org: str, team_slug: str) -> List[str]:
+    """
+    Returns the logins of the members of the team, if necessary fetching them from the shared
+    DynamoDb cache (when enabled) or from Github, so that they're at most
+    GITHUB_TEAM_MEMBERS_TTL_SECONDS old. Large teams then cost one set of queries per TTL,
+    rather than one per mention per webhook.
+    """
+    team = f"{org}/{team_slug}"
+    members = _team_members_cache.get(team)
+    if members is None:
+        members = github_graphql_client.get_team_members(org, team_slug)
+        logger.info(f"Fetched {len(members)} members of team {team}")
+        _team_members_cache.put(team, members)
+    return members
+
+
 def _expand_team_mentions(mentions: List[str]) -> Set[str]:
     """Expand team mentions to their member usernames, supporting @org/team-slug.
 
@@ -96,7 +126,7 @@ def _expand_team_mentions(mentions: List[str]) -> Set[str]:
         if "/" in mention:
             org, team_slug = mention.split("/", 1)
             try:
-                team_members = github_graphql_client.get_team_members(org, team_slug)
+                team_members = get_team_members(org, team_slug)
                 if team_members:
                     expanded_mentions.update(team_members)
                 else:
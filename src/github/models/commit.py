@@ -28,7 +28,7 @@ class Commit(object):
         ]
 
     def node_id(self) -> str:
-        return self._raw["commit"]["node_id"]
+        return self._raw["commit"]["id"]
 
     def to_raw(self) -> Dict[str, Any]:
         return copy.deepcopy(self._raw)
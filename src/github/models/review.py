@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 from enum import Enum, unique
 
@@ -32,6 +32,12 @@ class Review(object):
     def id(self) -> str:
         return self._raw["id"]
 
+    def database_id(self) -> Optional[int]:
+        if "databaseId" in self._raw:
+            return self._raw["databaseId"]
+        else:
+            return None
+
     def submitted_at(self) -> datetime:
         return parse_date_string(self._raw["submittedAt"])
 
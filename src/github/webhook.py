@@ -1,12 +1,16 @@
-import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from operator import itemgetter
 
+import src.asana.helpers as asana_helpers
+import src.aws.dynamodb_client as dynamodb_client
 import src.github.controller as github_controller
 import src.github.graphql.client as graphql_client
 import src.github.logic as github_logic
 from src.aws.lock import dynamodb_lock_client
-from src.github.models import PullRequestReviewComment, Review
+from src.aws.sqs_client import DEFERRED_ATTACHMENTS_EVENT
+from src.config import CHECK_SUITE_MAX_CONCURRENCY
+from src.github.models import PullRequest, PullRequestReviewComment, Review
 from src.http import HttpResponse
 from src.logger import logger
 
@@ -66,6 +70,27 @@ def _handle_pull_request_review_webhook(payload: dict) -> HttpResponse:
     return HttpResponse("200")
 
 
+def _get_review_for_database_id(
+    org_name: str, pull_request_id: str, review_database_id: int
+) -> Optional[Review]:
+    review_node_id = dynamodb_client.get_github_review_node_id(review_database_id)
+    if review_node_id is not None:
+        return graphql_client.get_review(org_name, review_node_id)
+
+    logger.info(
+        f"No node id recorded for review {review_database_id}, searching pull request"
+        f" {pull_request_id}"
+    )
+    review = graphql_client.get_review_for_database_id(
+        org_name, pull_request_id, review_database_id
+    )
+    if review is not None:
+        dynamodb_client.insert_github_review_database_id_mapping(
+            review_database_id, review.id()
+        )
+    return review
+
+
 # https://docs.github.com/en/developers/webhooks-and-events/webhooks/webhook-events-and-payloads#pull_request_review_comment
 def _handle_pull_request_review_comment(payload: dict):
     """Handle when a pull request review comment is edited or removed.
@@ -81,10 +106,13 @@ def _handle_pull_request_review_comment(payload: dict):
 
     To get the review, we either:
         (1) query for the comment, and use the `review` edge in GraphQL.
-        (2) Iterate through all reviews on the pull request, and find the one whose databaseId matches.
+        (2) look up the node id that SGTM recorded for the review's databaseId when it synced the
+            review, and query for the review.
+        (3) Iterate through all reviews on the pull request, and find the one whose databaseId matches.
             See get_review_for_database_id()
 
-    We do (1) for comments that were added or edited, but if a comment was just deleted, we have to do (2).
+    We do (1) for comments that were added or edited, but if a comment was just deleted, we have to
+    do (2), or (3) for reviews synced before SGTM recorded their databaseIds.
 
     See https://developer.github.com/v4/object/repository/#fields.
     """
@@ -116,7 +144,7 @@ def _handle_pull_request_review_comment(payload: dict):
         ):
             # This is NOT the node_id, but is a numeric string (the databaseId field).
             review_database_id = payload["comment"]["pull_request_review_id"]
-            maybe_review = graphql_client.get_review_for_database_id(
+            maybe_review = _get_review_for_database_id(
                 org_name, pull_request_id, review_database_id
             )
             if maybe_review is None:
@@ -154,25 +182,52 @@ def _handle_status_webhook(payload: dict) -> HttpResponse:
 
 # https://docs.github.com/en/developers/webhooks-and-events/webhooks/webhook-events-and-payloads#check_suite
 def _handle_check_suite_webhook(payload: dict) -> HttpResponse:
+    """A check suite can belong to several pull requests, when they share its commit. They're
+    fetched together, and synced concurrently, each under its own lock.
+    """
     pull_requests = payload["check_suite"]["pull_requests"]
     org_name = payload["organization"]["login"]
     if len(pull_requests) == 0:
         return HttpResponse("400", "No Pull Request Found")
 
-    # TODO: How to handle multiple PRs?
-    pull_request_number = pull_requests[0]["number"]
+    pull_request_numbers = list(dict.fromkeys(pr["number"] for pr in pull_requests))
     repository_node_id = payload["repository"]["node_id"]
 
-    pull_request = graphql_client.get_pull_request_by_repository_and_number(
-        org_name, repository_node_id, pull_request_number
+    fetched_pull_requests = graphql_client.get_pull_requests_by_repository_and_numbers(
+        org_name, repository_node_id, pull_request_numbers
     )
 
+    if len(fetched_pull_requests) <= 1:
+        for pull_request in fetched_pull_requests:
+            _sync_check_suite_pull_request(pull_request)
+        return HttpResponse("200")
+
+    with ThreadPoolExecutor(
+        max_workers=min(CHECK_SUITE_MAX_CONCURRENCY, len(fetched_pull_requests))
+    ) as executor:
+        futures = [
+            executor.submit(_sync_check_suite_pull_request, pull_request)
+            for pull_request in fetched_pull_requests
+        ]
+    # Every pull request has been synced, or failed to. Raise the first failure (e.g. to acquire a
+    # lock), if any, as when the check suite has a single pull request.
+    for future in futures:
+        future.result()
+    return HttpResponse("200")
+
+
+def _sync_check_suite_pull_request(pull_request: PullRequest):
     with dynamodb_lock_client.acquire_lock(
         pull_request.id(), sort_key=pull_request.id()
     ):
         github_logic.maybe_automerge_pull_request(pull_request)
         github_controller.upsert_pull_request(pull_request)
-        return HttpResponse("200")
+
+
+# Follow-up that SGTM queues for itself, see asana_helpers.create_attachments
+def _handle_deferred_attachments(payload: dict) -> HttpResponse:
+    asana_helpers.create_deferred_attachments(payload)
+    return HttpResponse("200")
 
 
 _events_map = {
@@ -182,6 +237,7 @@ _events_map = {
     "status": _handle_status_webhook,
     "pull_request_review_comment": _handle_pull_request_review_comment,
     "check_suite": _handle_check_suite_webhook,
+    DEFERRED_ATTACHMENTS_EVENT: _handle_deferred_attachments,
 }
 
 
@@ -191,12 +247,7 @@ def handle_github_webhook(event_type, payload) -> HttpResponse:
         return HttpResponse("501", f"No handler for event type {event_type}")
 
     logger.info(f"Received event type {event_type}!")
-    # TEMPORARY: sleep for 2 seconds before handling any webhook. We're running
-    # into an issue where the Github Webhook sends us a node_id, but when we
-    # immediately query that id using the GraphQL API, we get back an error
-    # "Could not resolve to a node with the global id of '<node_id>'". This is
-    # an attempt to mitigate this issue temporarily by waiting a second to see
-    # if Github's data consistency needs a bit of time (does not have
-    # read-after-write consistency)
-    time.sleep(2)
+    # Github's GraphQL API does not have read-after-write consistency, so a
+    # node_id from a webhook may not be resolvable yet. That case is retried
+    # with backoff inside graphql_client._execute_graphql_query.
     return _events_map[event_type](payload)
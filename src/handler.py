@@ -2,6 +2,8 @@ import hashlib
 import hmac
 import json
 import traceback
+from typing import Dict, List, Tuple, Union
+from typing_extensions import TypedDict
 from python_dynamodb_lock.python_dynamodb_lock import DynamoDBLockError  # type: ignore
 
 import src.aws.sqs_client as sqs_client
@@ -35,16 +37,110 @@ def handle_github_webhook(event_type: str, webhook_body: str) -> HttpResponseDic
         return http_response.to_dict()
 
 
-def handler(event: dict, context: dict) -> HttpResponseDict:
+class BatchItemFailureDict(TypedDict):
+    itemIdentifier: str
+
+
+# https://docs.aws.amazon.com/lambda/latest/dg/services-sqs-errorhandling.html#services-sqs-batchfailurereporting
+class SQSBatchResponseDict(TypedDict):
+    batchItemFailures: List[BatchItemFailureDict]
+
+
+# Events whose handlers re-fetch the full, current state of the pull request
+# from Github, rather than acting on the contents of the payload. Several of
+# these for the same object in one batch are redundant, so only the first one is
+# handled: it already sees the changes the later ones were sent for, and keeps
+# its place ahead of the other events for the pull request.
+_FULL_SYNC_EVENT_KEY_PATHS = {
+    "pull_request": ("pull_request", "node_id"),
+    "status": ("commit", "node_id"),
+    "check_suite": ("check_suite", "node_id"),
+}
+
+
+def _coalescing_key(event_type: str, body: str) -> Tuple[str, str]:
+    """
+    Returns a key such that SQS records with the same key in a batch are redundant with one
+    another. Full-sync events are keyed on the object they sync; all other events are only
+    redundant with exact duplicates.
+    """
+    if event_type in _FULL_SYNC_EVENT_KEY_PATHS:
+        try:
+            payload = json.loads(body)
+            outer_key, inner_key = _FULL_SYNC_EVENT_KEY_PATHS[event_type]
+            return event_type, payload[outer_key][inner_key]
+        except (ValueError, KeyError, TypeError):
+            pass
+    return event_type, body
+
+
+def _handle_sqs_records(records: List[dict]) -> SQSBatchResponseDict:
+    """
+    Handles a batch of SQS records, reporting the records that should be retried as
+    batchItemFailures so that a single failure doesn't redrive the whole batch.
+
+    Records are handled in order. Since the queue is FIFO, once a record fails, every later
+    record in the same message group is reported as failed without being handled, to keep
+    per-group ordering. Records that are redundant with an earlier one in the batch aren't
+    handled, and succeed or fail with it.
+    """
+    event_types: List[str] = [
+        ((record.get("messageAttributes") or {}).get("X-GitHub-Event") or {}).get(
+            "stringValue"
+        )
+        or ""
+        for record in records
+    ]
+    keys = [
+        _coalescing_key(event_type, record["body"])
+        for event_type, record in zip(event_types, records)
+    ]
+    first_index_for_key: Dict[Tuple[str, str], int] = {}
+    for index, key in enumerate(keys):
+        first_index_for_key.setdefault(key, index)
+
+    failed_indexes = set()
+    failed_message_groups = set()
+    for index, record in enumerate(records):
+        message_group_id = (record.get("attributes") or {}).get("MessageGroupId")
+        if message_group_id is not None and message_group_id in failed_message_groups:
+            failed_indexes.add(index)
+            continue
+        if first_index_for_key[keys[index]] != index:
+            # An earlier record in this batch already handled this one.
+            continue
+        response = handle_github_webhook(event_types[index], record["body"])
+        if response["statusCode"] == "500":
+            failed_indexes.add(index)
+            if message_group_id is not None:
+                failed_message_groups.add(message_group_id)
+
+    # Coalesced records succeed or fail with the record that was handled for them.
+    failed_indexes.update(
+        index
+        for index, key in enumerate(keys)
+        if first_index_for_key[key] in failed_indexes
+    )
+
+    coalesced = len(records) - len(first_index_for_key)
+    if coalesced > 0:
+        logger.info(f"Coalesced {coalesced} redundant records out of {len(records)}")
+
+    return {
+        "batchItemFailures": [
+            {"itemIdentifier": records[index].get("messageId", "")}
+            for index in sorted(failed_indexes)
+        ]
+    }
+
+
+def handler(
+    event: dict, context: dict
+) -> Union[HttpResponseDict, SQSBatchResponseDict]:
     if "Records" in event:
         logger.info(f"{len(event['Records'])} Records: {event['Records']}")
         # SQS event
-        assert len(event["Records"]) == 1
-        record = event["Records"][0]
-        event_type = (
-            record.get("messageAttributes").get("X-GitHub-Event").get("stringValue")
-        )
-        return handle_github_webhook(event_type, record["body"])
+        return _handle_sqs_records(event["Records"])
 
     if "headers" in event:
         # API Gateway event
@@ -1,13 +1,22 @@
 import re
+import threading
 from html import escape, unescape
 from html.parser import HTMLParser
-from typing import Match
+from typing import Dict, Iterator, List, Optional, Tuple
 from urllib.parse import urlparse
 
 import mistune  # type: ignore
 
-# https://gist.github.com/gruber/8891611
-URL_REGEX = r"""(?i)([^"\>\<\/\.]|^)\b((?:https?:(/{1,3}))(?:[^\s()<>{}\[\]]+|\([^\s()]*?\([^\s()]+\)[^\s()]*?\)|\([^\s]+?\))+(?:\([^\s()]*?\([^\s()]+\)[^\s()]*?\)|\([^\s]+?\)|[^\s`!()\[\]{};:'".,<>?«»“”‘’]))"""
+# Bare URLs are auto-linked from where their scheme starts, unless it directly
+# follows one of these characters (e.g. the URL is an attribute value, or part
+# of a path or domain name).
+_URL_START_REGEX = re.compile(r"(?i)\bhttps?:/{1,3}")
+_URL_FORBIDDEN_PRECEDING_CHARS = frozenset('"<>/.')
+# Characters that end a bare URL
+_URL_TERMINATING_CHARS = frozenset("<>{}[]")
+# Characters a bare URL can't end with, so that e.g. the period ending a
+# sentence isn't part of the link. A closing paren is fine if it's balanced.
+_URL_TRAILING_PUNCTUATION = frozenset("`!([]{};:'\".,<>?«»“”‘’")
 
 
 # Tags that Asana's rich text API supports.
@@ -38,6 +47,9 @@ _ASANA_ALLOWED_ATTRS = {
 # URL schemes considered safe for href/src attributes.
 _SAFE_URL_SCHEMES = frozenset({"http", "https", "mailto"})
 
+# Tags whose source SGTM uploads to Asana as an attachment.
+_MEDIA_TAGS = frozenset({"img", "video"})
+
 # Table cell/row tags get special treatment: " | " between cells, "\n" at row
 # boundaries, so stripped table text doesn't run together.
 _TABLE_CELL_TAGS = frozenset({"td", "th"})
@@ -68,11 +80,107 @@ _BLOCK_LEVEL_TAGS = frozenset(
     }
 )
 
-def _urlreplace(matchobj: Match[str]) -> str:
-    """Replace a bare URL match with an <a> tag. Used by both the markdown
-    renderer's text() method and the HTML sanitizer's handle_data()."""
-    url = unescape(matchobj.group(2))
-    return matchobj.group(1) + f'<a href="{escape(url, quote=False)}">{url}</a>'
+
+class _BareUrlRun:
+    """The text from where a bare URL starts up to the next whitespace or
+    terminating character, with its parens matched up once, so that where
+    each URL starting in the run ends is looked up rather than rescanned
+    (e.g. for every "http://" in "http://a(http://a(http://a(...").
+    """
+
+    def __init__(self, text: str, start: int) -> None:
+        end = start
+        while end < len(text) and not (
+            text[end].isspace() or text[end] in _URL_TERMINATING_CHARS
+        ):
+            end += 1
+        self.start = start
+        self.end = end
+
+        chars = text[start:end]
+        length = len(chars)
+        closing_parens: Dict[int, int] = {}  # by the offset of the opening one
+        open_parens: List[int] = []
+        for offset, char in enumerate(chars):
+            if char == "(":
+                open_parens.append(offset)
+            elif char == ")" and open_parens:
+                closing_parens[open_parens.pop()] = offset
+        # By offset, where a URL continuing from there stops: at the first
+        # closing paren that doesn't close one opened in the URL, or the end
+        # of the run; and the first paren from there that is never closed.
+        self._stops = [length] * (length + 1)
+        self._unclosed_parens = [length] * (length + 1)
+        for offset in range(length - 1, -1, -1):
+            char = chars[offset]
+            if char == ")":
+                self._stops[offset] = offset
+            elif char == "(" and offset in closing_parens:
+                self._stops[offset] = self._stops[closing_parens[offset] + 1]
+            elif char != "(":
+                self._stops[offset] = self._stops[offset + 1]
+            if char == "(" and offset not in closing_parens:
+                self._unclosed_parens[offset] = offset
+            else:
+                self._unclosed_parens[offset] = self._unclosed_parens[offset + 1]
+
+    def url_end(self, position: int) -> int:
+        """Where a URL continuing from position ends, before an unclosed
+        paren and whatever follows it."""
+        offset = position - self.start
+        return self.start + min(self._stops[offset], self._unclosed_parens[offset])
+
+
+def _find_bare_urls(text: str) -> Iterator[Tuple[int, int]]:
+    """Yields the start and end of each bare URL in text, in time linear in
+    its length (unlike a regex with nested quantifiers, which can backtrack
+    exponentially on inputs like "http://a!!!!!!!!!!!!!!!!!!!!!!!(").
+
+    A URL runs from its scheme up to whitespace, a terminating character, or a
+    closing paren that doesn't close one opened in the URL; an unclosed paren
+    and whatever follows it, and trailing punctuation, are left out.
+    """
+    run: Optional[_BareUrlRun] = None
+    position = 0
+    while True:
+        match = _URL_START_REGEX.search(text, position)
+        if match is None:
+            return
+        start = match.start()
+        if start > 0 and text[start - 1] in _URL_FORBIDDEN_PRECEDING_CHARS:
+            position = start + 1
+            continue
+
+        if run is None or start >= run.end:
+            run = _BareUrlRun(text, start)
+        end = run.url_end(match.end())
+        # Only punctuation is stripped, so no later URL starts in what is
+        # stripped, and no character is stripped twice.
+        while end > match.end() and text[end - 1] in _URL_TRAILING_PUNCTUATION:
+            end -= 1
+
+        if end > match.end():
+            yield start, end
+            position = end
+        else:
+            position = start + 1
+
+
+def _link_bare_urls(text: str) -> str:
+    """Replace the bare URLs in (HTML-escaped) text with <a> tags. Used by both
+    the markdown renderer's text() method and the HTML sanitizer's
+    handle_data()."""
+    parts = []
+    last_end = 0
+    for start, end in _find_bare_urls(text):
+        url = unescape(text[start:end])
+        parts.append(text[last_end:start])
+        parts.append(f'<a href="{escape(url, quote=False)}">{url}</a>')
+        last_end = end
+    if not parts:
+        return text
+    parts.append(text[last_end:])
+    return "".join(parts)
 
 
 def _is_safe_url(url: str) -> bool:
@@ -84,7 +192,20 @@ def _is_safe_url(url: str) -> bool:
         return False
 
 
-class _AsanaHTMLSanitizer(HTMLParser):
+class _MediaTagCollector(HTMLParser):
+    """Records the attributes of each <img> and <video> tag, in one streaming
+    pass over the HTML, without building a document tree."""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=False)
+        self.media_tag_attrs: List[Dict[str, Optional[str]]] = []
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag in _MEDIA_TAGS:  # HTMLParser lowercases tag and attribute names
+            self.media_tag_attrs.append(dict(attrs))
+
+
+class _AsanaHTMLSanitizer(_MediaTagCollector):
     """Sanitizes raw HTML for Asana's rich text API.
 
     - Passes through Asana-supported tags with sanitized attributes
@@ -93,6 +214,8 @@ class _AsanaHTMLSanitizer(HTMLParser):
     - Converts <br> to newlines
     - Passes through <hr />
     - Removes HTML comments entirely
+    - Records the attributes of <img> and <video> tags as it goes (see
+      _MediaTagCollector), so callers get them without another parse
     - Validates URL schemes (only http/https/mailto allowed)
     - Flattens nested <a> tags — keeping only the outermost — because
       Asana's rich text parser rejects invalid nested anchors.  The
@@ -101,12 +224,13 @@ class _AsanaHTMLSanitizer(HTMLParser):
     """
 
     def __init__(self, anchor_depth: int = 0) -> None:
-        super().__init__(convert_charrefs=False)
+        super().__init__()
         self._parts: list = []
         self._cell_count_in_row = 0  # tracks cell position within a <tr>
         self.anchor_depth = anchor_depth  # nested <a> depth; public for cross-call carry
 
     def handle_starttag(self, tag: str, attrs: list) -> None:
+        super().handle_starttag(tag, attrs)
         tag_lower = tag.lower()
         # Table structure: insert separators so cell text doesn't run together.
         if tag_lower in _TABLE_CELL_TAGS:
@@ -136,7 +260,7 @@ class _AsanaHTMLSanitizer(HTMLParser):
             attr_str = (" " + " ".join(safe_attrs)) if safe_attrs else ""
             self._parts.append(f"<{tag_lower}{attr_str}>")
         elif tag_lower == "img":
-            attrs_dict = dict(attrs)
+            attrs_dict = self.media_tag_attrs[-1]
             src = attrs_dict.get("src", "")
             alt = attrs_dict.get("alt", "")
             if self.anchor_depth > 0:
@@ -184,7 +308,7 @@ class _AsanaHTMLSanitizer(HTMLParser):
         # <a> element, otherwise we'd wrap a URL inside another anchor and
         # produce invalid nested <a><a>...</a></a>.
         if self.anchor_depth == 0:
-            text = re.sub(URL_REGEX, _urlreplace, text)
+            text = _link_bare_urls(text)
         self._parts.append(text)
 
     def handle_entityref(self, name: str) -> None:
@@ -200,6 +324,16 @@ class _AsanaHTMLSanitizer(HTMLParser):
         return "".join(self._parts)
 
 
+def extract_media_tag_attrs(html: str) -> List[Dict[str, Optional[str]]]:
+    """Returns the attributes of each <img> and <video> tag in the HTML, in
+    document order. Attribute values have their character references
+    resolved; valueless attributes are None."""
+    collector = _MediaTagCollector()
+    collector.feed(html)
+    collector.close()
+    return collector.media_tag_attrs
+
+
 def sanitize_html_for_asana(html: str) -> str:
     """Sanitize raw HTML for Asana's rich text API.
 
@@ -223,6 +357,12 @@ class GithubToAsanaRenderer(mistune.HTMLRenderer):
         # we carry anchor depth across sanitize invocations on this renderer.
         self._inline_anchor_depth = 0
 
+    def reset(self) -> None:
+        """Clears the state carried across the calls for one document, so that
+        the renderer can be reused for the next one, even if the last
+        conversion was interrupted (e.g. an unclosed <a> in a document)."""
+        self._inline_anchor_depth = 0
+
     def paragraph(self, text) -> str:
         return text + "\n"
 
@@ -269,7 +409,7 @@ class GithubToAsanaRenderer(mistune.HTMLRenderer):
         # previous inline_html() call — otherwise the URL would be wrapped
         # in a second <a>, producing invalid nested anchors.
         if self._inline_anchor_depth == 0:
-            text = re.sub(URL_REGEX, _urlreplace, text)
+            text = _link_bare_urls(text)
         return text
 
     def link(self, link, text=None, title=None):
@@ -291,10 +431,23 @@ class GithubToAsanaRenderer(mistune.HTMLRenderer):
         return self.link(src, text=alt, title=title)
 
 
-def convert_github_markdown_to_asana_xml(text: str) -> str:
-    markdown = mistune.create_markdown(
-        renderer=GithubToAsanaRenderer(escape=False),
-        plugins=["strikethrough"],
-    )
+# Building the Markdown instance compiles mistune's grammar, so each thread
+# keeps one (the renderer carries per-document state, so it isn't shared).
+_converters = threading.local()
+
 
+def _get_markdown() -> mistune.Markdown:
+    markdown = getattr(_converters, "markdown", None)
+    if markdown is None:
+        markdown = mistune.create_markdown(
+            renderer=GithubToAsanaRenderer(escape=False),
+            plugins=["strikethrough"],
+        )
+        _converters.markdown = markdown
+    return markdown
+
+
+def convert_github_markdown_to_asana_xml(text: str) -> str:
+    markdown = _get_markdown()
+    markdown.renderer.reset()
     return markdown(text)
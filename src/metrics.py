@@ -0,0 +1,31 @@
+from collections import Counter
+
+from src.logger import logger
+
+# Process-level counters. Lambda keeps the process warm across invocations, so
+# these accumulate until the container is recycled. Every increment is also
+# logged with a stable "SGTM metric" prefix, so CloudWatch metric filters can
+# pick the values up without an extra API call per event.
+_counters: Counter = Counter()
+
+
+def increment(name: str, value: int = 1) -> None:
+    """
+    Increments the named counter by value, and logs the increment.
+    """
+    _counters[name] += value
+    logger.info(f"SGTM metric {name}={value} (process total {_counters[name]})")
+
+
+def get_count(name: str) -> int:
+    """
+    Returns the current process-level value of the named counter.
+    """
+    return _counters[name]
+
+
+def reset() -> None:
+    """
+    Resets all counters. Intended for tests.
+    """
+    _counters.clear()
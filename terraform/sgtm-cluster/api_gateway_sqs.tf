@@ -57,12 +57,41 @@ resource "aws_sqs_queue" "sgtm-webhooks-queue-fifo" {
   content_based_deduplication = true
   visibility_timeout_seconds  = 240  # 4 minutes
   message_retention_seconds   = 1800 # 30 minutes
+
+  # A message that keeps failing holds up the rest of its message group, so
+  # after maxReceiveCount attempts it is moved to the dead-letter queue, rather
+  # than blocking the group until it expires. maxReceiveCount visibility
+  # timeouts (20 minutes) must stay within the retention period. The messages
+  # held back behind it were received as often, so they are moved along with
+  # it, in order, and can be redriven together once it's fixed.
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.sgtm-webhooks-dead-letter-queue-fifo.arn
+    maxReceiveCount     = 5
+  })
+}
+
+resource "aws_sqs_queue" "sgtm-webhooks-dead-letter-queue-fifo" {
+  name                      = "sgtm-webhooks-dead-letter-queue${local.cluster}.fifo"
+  fifo_queue                = true
+  message_retention_seconds = 1209600 # 14 days
+}
+
+resource "aws_sqs_queue_redrive_allow_policy" "sgtm-webhooks-dead-letter-queue-fifo" {
+  queue_url            = aws_sqs_queue.sgtm-webhooks-dead-letter-queue-fifo.id
+  redrive_allow_policy = jsonencode({
+    redrivePermission = "byQueue"
+    sourceQueueArns   = [aws_sqs_queue.sgtm-webhooks-queue-fifo.arn]
+  })
 }
 
 resource "aws_lambda_event_source_mapping" "sgtm-sqs-source" {
   event_source_arn = aws_sqs_queue.sgtm-webhooks-queue-fifo.arn
   function_name    = aws_lambda_function.sgtm.function_name
-  batch_size       = 1
+  batch_size       = 10
+
+  # The handler reports failed records individually, so that one bad message
+  # doesn't cause the whole batch to be redriven.
+  function_response_types = ["ReportBatchItemFailures"]
 }
 
 resource "aws_lambda_permission" "lambda_permission_for_sgtm_rest_api" {
@@ -0,0 +1,218 @@
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from src.asana import client as asana_client
+from src.asana import helpers as asana_helpers
+from test.impl.base_test_case_class import BaseClass
+
+_CHUNK = b"sgtm" * (16 << 10)
+
+
+class _SourceHandler(BaseHTTPRequestHandler):
+    """
+    Serves a file of the size in the path, e.g. /300000/video.mp4, generated as it's sent. Under
+    /no-length/, the response has no Content-Length, and ends when the connection closes.
+    """
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        with_content_length = parts[0] != "no-length"
+        size = int(parts[-2])
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        if with_content_length:
+            self.send_header("Content-Length", str(size))
+        self.end_headers()
+        remaining = size
+        while remaining > 0:
+            chunk = _CHUNK[: min(remaining, len(_CHUNK))]
+            self.wfile.write(chunk)
+            remaining -= len(chunk)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _AsanaStubHandler(BaseHTTPRequestHandler):
+    """
+    Accepts attachment uploads, keeping only their first and last bytes
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        remaining = int(self.headers["Content-Length"])
+        received = 0
+        head = b""
+        tail = b""
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 64 << 10))
+            if not head:
+                head = chunk[:512]
+            tail = (tail + chunk)[-512:]
+            received += len(chunk)
+            remaining -= len(chunk)
+        self.server.uploads.append(  # type: ignore
+            {
+                "path": self.path,
+                "content_type": self.headers["Content-Type"],
+                "received_bytes": received,
+                "head": head.decode(errors="replace"),
+                "tail": tail.decode(errors="replace"),
+            }
+        )
+        response = json.dumps({"data": {"gid": "attachment"}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _StubServers(object):
+    def __init__(self):
+        self.source = ThreadingHTTPServer(("127.0.0.1", 0), _SourceHandler)
+        self.asana = ThreadingHTTPServer(("127.0.0.1", 0), _AsanaStubHandler)
+        self.asana.uploads = []  # type: ignore
+        for server in [self.source, self.asana]:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.source_url = f"http://127.0.0.1:{self.source.server_address[1]}"
+        self.asana_url = f"http://127.0.0.1:{self.asana.server_address[1]}"
+
+    def close(self):
+        for server in [self.source, self.asana]:
+            server.shutdown()
+            server.server_close()
+
+
+def _transfer(servers: _StubServers, size: int, with_content_length: bool) -> None:
+    prefix = "" if with_content_length else "/no-length"
+    attachment = asana_helpers.AttachmentData(
+        file_name="video.mp4",
+        file_url=f"{servers.source_url}{prefix}/{size}/video.mp4",
+        file_type="video/mp4",
+    )
+    with patch.dict(
+        asana_client.AsanaClient.singleton().asana_api_client.options,
+        {"base_url": servers.asana_url},
+    ), patch.dict(
+        # The stub is plain HTTP, which the OAuth session refuses otherwise
+        os.environ,
+        {"OAUTHLIB_INSECURE_TRANSPORT": "1"},
+    ), patch(
+        "src.aws.dynamodb_client.insert_github_node_to_asana_id_mapping"
+    ):
+        asana_helpers._AttachmentTransfer("12345").transfer(0, attachment)
+
+
+def measure_streamed_transfer(size: int, with_content_length: bool) -> dict:
+    """
+    Transfers a file of the given size from the local source to the local Asana stub, and reports
+    how much the peak RSS of the process grew while doing so. Run in a fresh process (see
+    TestAttachmentStreamingMemory) so that the peak isn't that of earlier tests.
+    """
+    servers = _StubServers()
+    try:
+        # Warm up imports and connections, so that only the transfer itself is measured
+        _transfer(servers, 1 << 10, with_content_length)
+        baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        with patch.object(asana_helpers.config, "ATTACHMENT_MAX_SIZE_BYTES", size):
+            _transfer(servers, size, with_content_length)
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        upload = servers.asana.uploads[-1]  # type: ignore
+    finally:
+        servers.close()
+    return {
+        "peak_rss_increase_bytes": (peak_kb - baseline_kb) * 1024,
+        "received_bytes": upload["received_bytes"],
+    }
+
+
+class TestAttachmentStreaming(BaseClass):
+    def setUp(self):
+        self.servers = _StubServers()
+        self.addCleanup(self.servers.close)
+
+    def test_upload_is_a_multipart_form_with_the_file(self):
+        _transfer(self.servers, 1000, with_content_length=True)
+
+        [upload] = self.servers.asana.uploads  # type: ignore
+        self.assertEqual("/tasks/12345/attachments", upload["path"])
+        boundary = upload["content_type"].split("boundary=")[1]
+        self.assertTrue(upload["content_type"].startswith("multipart/form-data;"))
+        self.assertTrue(
+            upload["head"].startswith(
+                f"--{boundary}\r\n"
+                'Content-Disposition: form-data; name="file"; filename="video.mp4"\r\n'
+                "Content-Type: video/mp4\r\n\r\nsgtmsgtm"
+            )
+        )
+        self.assertTrue(upload["tail"].endswith(f"sgtm\r\n--{boundary}--\r\n"))
+
+    def test_upload_without_a_content_length(self):
+        _transfer(self.servers, 1000, with_content_length=False)
+
+        [upload] = self.servers.asana.uploads  # type: ignore
+        boundary = upload["content_type"].split("boundary=")[1]
+        head_length = upload["head"].index("sgtm")
+        tail_length = len(f"\r\n--{boundary}--\r\n")
+        self.assertEqual(1000, upload["received_bytes"] - head_length - tail_length)
+
+
+class TestAttachmentStreamingMemory(BaseClass):
+    SIZE = 300 << 20
+    MAX_PEAK_RSS_INCREASE = 32 << 20
+
+    def _measure_in_fresh_process(self, with_content_length: bool) -> dict:
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import json, sys;"
+                " from test.asana.helpers.test_attachment_streaming import"
+                " measure_streamed_transfer;"
+                " print(json.dumps(measure_streamed_transfer(int(sys.argv[1]),"
+                " sys.argv[2] == 'true')))",
+                str(self.SIZE),
+                "true" if with_content_length else "false",
+            ],
+            cwd=os.path.join(os.path.dirname(__file__), "..", "..", ".."),
+            env=dict(os.environ, ENV="test"),
+            capture_output=True,
+            text=True,
+            timeout=120,
+        )
+        self.assertEqual(0, result.returncode, result.stderr)
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def test_large_attachments_are_streamed_with_bounded_memory(self):
+        measurement = self._measure_in_fresh_process(with_content_length=True)
+
+        self.assertGreater(measurement["received_bytes"], self.SIZE)
+        self.assertLess(
+            measurement["peak_rss_increase_bytes"], self.MAX_PEAK_RSS_INCREASE
+        )
+
+    def test_large_attachments_without_a_content_length_are_spooled_to_disk(self):
+        measurement = self._measure_in_fresh_process(with_content_length=False)
+
+        self.assertGreater(measurement["received_bytes"], self.SIZE)
+        self.assertLess(
+            measurement["peak_rss_increase_bytes"], self.MAX_PEAK_RSS_INCREASE
+        )
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
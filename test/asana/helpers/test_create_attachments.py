@@ -0,0 +1,359 @@
+import io
+import threading
+from unittest.mock import ANY, patch
+
+from asana.error import RateLimitEnforcedError  # type: ignore
+
+import src.github.webhook as github_webhook
+from src.asana import helpers as asana_helpers
+from test.impl.base_test_case_class import BaseClass
+
+
+def _body_html(*file_names: str) -> str:
+    return " ".join(
+        f'<img src="https://example.com/{file_name}" />' for file_name in file_names
+    )
+
+
+class _Response(io.BytesIO):
+    def __init__(self, body: bytes, with_content_length: bool = True):
+        super().__init__(body)
+        self.headers = {"Content-Length": str(len(body))} if with_content_length else {}
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+def _response_for_url(url, timeout):
+    return _Response(url.encode())
+
+
+class TestCreateAttachments(BaseClass):
+    def setUp(self):
+        self.uploads = {}
+        self.create_attachment_on_task_from_stream = self._patch(
+            patch("src.asana.client.create_attachment_on_task_from_stream")
+        )
+        self.create_attachment_on_task_from_stream.side_effect = self._upload
+        self.queue_deferred_attachments = self._patch(
+            patch("src.aws.sqs_client.queue_deferred_attachments")
+        )
+        self.urlopen = self._patch(patch("urllib.request.urlopen"))
+        self.urlopen.side_effect = _response_for_url
+        self.attachment_ids = {}
+        self._patch(
+            patch(
+                "src.aws.dynamodb_client.batch_get_asana_ids",
+                side_effect=lambda keys: {
+                    key: self.attachment_ids[key]
+                    for key in keys
+                    if key in self.attachment_ids
+                },
+            )
+        )
+        self._patch(
+            patch(
+                "src.aws.dynamodb_client.insert_github_node_to_asana_id_mapping",
+                side_effect=self.attachment_ids.__setitem__,
+            )
+        )
+
+    def _patch(self, patcher):
+        mock = patcher.start()
+        self.addCleanup(patcher.stop)
+        return mock
+
+    def _upload(self, task_id, stream, size, file_name, file_type, timeout):
+        self.uploads[file_name] = stream.read(size)
+        return f"attachment-{file_name}"
+
+    def _uploaded_file_names(self):
+        return sorted(self.uploads)
+
+    def test_attachments_are_transferred_concurrently(self):
+        # Only passes if both downloads are in flight at the same time
+        barrier = threading.Barrier(2, timeout=5)
+
+        def urlopen(url, timeout):
+            barrier.wait()
+            return _Response(url.encode())
+
+        self.urlopen.side_effect = urlopen
+
+        asana_helpers.create_attachments(_body_html("a.png", "b.png"), "task")
+
+        self.assertEqual(
+            {
+                "a.png": b"https://example.com/a.png",
+                "b.png": b"https://example.com/b.png",
+            },
+            self.uploads,
+        )
+        self.create_attachment_on_task_from_stream.assert_any_call(
+            "task",
+            ANY,
+            len(b"https://example.com/a.png"),
+            "a.png",
+            "image/png",
+            timeout=asana_helpers.config.ATTACHMENT_REQUEST_TIMEOUT_SECONDS,
+        )
+        self.queue_deferred_attachments.assert_not_called()
+
+    def test_attachments_already_on_the_task_are_not_downloaded_again(self):
+        signed_url = (
+            "https://private-user-images.githubusercontent.com/1/2-abc.png?jwt={}"
+        )
+        asana_helpers.create_attachments(
+            f'<img src="{signed_url.format("first")}" />', "task"
+        )
+        self.assertEqual(1, self.urlopen.call_count)
+
+        # Re-rendering the body signs the same asset with a new token
+        asana_helpers.create_attachments(
+            f'<img src="{signed_url.format("second")}" />'
+            ' <img src="https://example.com/new.png" />',
+            "task",
+        )
+
+        self.assertEqual(["2-abc.png", "new.png"], self._uploaded_file_names())
+        self.assertEqual(2, self.urlopen.call_count)
+        self.assertIn("attachment-2-abc.png", self.attachment_ids.values())
+
+    def test_attachments_are_deduplicated_per_task(self):
+        asana_helpers.create_attachments(_body_html("a.png"), "task")
+        asana_helpers.create_attachments(_body_html("a.png"), "other-task")
+
+        self.assertEqual(2, self.urlopen.call_count)
+
+    def test_repeated_attachments_are_uploaded_once(self):
+        asana_helpers.create_attachments(_body_html("a.png", "a.png"), "task")
+
+        self.assertEqual(1, self.create_attachment_on_task_from_stream.call_count)
+
+    def test_normalize_attachment_url(self):
+        self.assertEqual(
+            "https://private-user-images.githubusercontent.com/1/2-abc.png",
+            asana_helpers._normalize_attachment_url(
+                "HTTPS://Private-User-Images.githubusercontent.com/1/2-abc.png?jwt=a#x"
+            ),
+        )
+        self.assertEqual(
+            "https://example.com/a.png?a=1&b=2",
+            asana_helpers._normalize_attachment_url(
+                "https://example.com/a.png?b=2&a=1"
+            ),
+        )
+
+    def test_failed_attachments_are_not_deferred(self):
+        def urlopen(url, timeout):
+            if url.endswith("broken.png"):
+                raise OSError("connection reset")
+            return _Response(url.encode())
+
+        self.urlopen.side_effect = urlopen
+
+        asana_helpers.create_attachments(_body_html("broken.png", "ok.png"), "task")
+
+        self.assertEqual(["ok.png"], self._uploaded_file_names())
+        self.queue_deferred_attachments.assert_not_called()
+
+    @patch.object(asana_helpers.config, "ATTACHMENT_MAX_SIZE_BYTES", 10)
+    def test_attachments_over_the_size_limit_are_skipped_unread(self):
+        responses = []
+
+        def urlopen(url, timeout):
+            response = _Response(b"x" * 11)
+            responses.append(response)
+            return response
+
+        self.urlopen.side_effect = urlopen
+
+        asana_helpers.create_attachments(_body_html("large.mov"), "task")
+
+        self.assertEqual({}, self.uploads)
+        self.assertEqual(0, responses[0].bytes_read)
+        self.queue_deferred_attachments.assert_not_called()
+
+    @patch.object(asana_helpers, "_ATTACHMENT_SPOOL_MAX_MEMORY_BYTES", 4)
+    @patch.object(asana_helpers, "_ATTACHMENT_CHUNK_SIZE", 3)
+    def test_attachments_without_a_content_length_are_spooled(self):
+        self.urlopen.side_effect = lambda url, timeout: _Response(
+            b"0123456789", with_content_length=False
+        )
+
+        asana_helpers.create_attachments(_body_html("video.mp4"), "task")
+
+        self.assertEqual({"video.mp4": b"0123456789"}, self.uploads)
+
+    @patch.object(asana_helpers.config, "ATTACHMENT_MAX_SIZE_BYTES", 10)
+    @patch.object(asana_helpers, "_ATTACHMENT_CHUNK_SIZE", 4)
+    def test_attachments_without_a_content_length_are_capped(self):
+        self.urlopen.side_effect = lambda url, timeout: _Response(
+            b"x" * 11, with_content_length=False
+        )
+
+        asana_helpers.create_attachments(_body_html("video.mp4"), "task")
+
+        self.assertEqual({}, self.uploads)
+
+    def test_throttled_uploads_are_deferred(self):
+        self.create_attachment_on_task_from_stream.side_effect = (
+            RateLimitEnforcedError()
+        )
+
+        asana_helpers.create_attachments(_body_html("a.png"), "task")
+
+        self.queue_deferred_attachments.assert_called_once_with(
+            "task",
+            [
+                {
+                    "file_name": "a.png",
+                    "file_url": "https://example.com/a.png",
+                    "file_type": "image/png",
+                }
+            ],
+            1,
+        )
+
+    @patch.object(asana_helpers.config, "ATTACHMENT_TIME_BUDGET_SECONDS", 0.2)
+    def test_attachments_over_budget_are_deferred(self):
+        release = threading.Event()
+        slow_transfer_done = threading.Event()
+        transfer = asana_helpers._AttachmentTransfer.transfer
+
+        def urlopen(url, timeout):
+            if url.endswith("slow.png"):
+                release.wait(5)
+            return _Response(url.encode())
+
+        def tracked_transfer(attachment_transfer, index, attachment):
+            try:
+                transfer(attachment_transfer, index, attachment)
+            finally:
+                if attachment.file_name == "slow.png":
+                    slow_transfer_done.set()
+
+        self.urlopen.side_effect = urlopen
+        with patch.object(
+            asana_helpers._AttachmentTransfer, "transfer", tracked_transfer
+        ):
+            asana_helpers.create_attachments(_body_html("fast.png", "slow.png"), "task")
+            release.set()
+            self.assertTrue(slow_transfer_done.wait(5))
+
+        # The abandoned download finished after the budget, but wasn't uploaded
+        self.assertEqual(["fast.png"], self._uploaded_file_names())
+        self.queue_deferred_attachments.assert_called_once_with(
+            "task",
+            [
+                {
+                    "file_name": "slow.png",
+                    "file_url": "https://example.com/slow.png",
+                    "file_type": "image/png",
+                }
+            ],
+            1,
+        )
+
+    @patch.object(asana_helpers.config, "ATTACHMENT_TIME_BUDGET_SECONDS", 0.1)
+    @patch.object(asana_helpers.config, "ATTACHMENT_REQUEST_TIMEOUT_SECONDS", 5)
+    def test_uploads_under_way_when_the_budget_runs_out_are_waited_for(self):
+        upload_started = threading.Event()
+
+        def slow_upload(*args, **kwargs):
+            upload_started.set()
+            threading.Event().wait(0.3)
+            return self._upload(*args, **kwargs)
+
+        self.create_attachment_on_task_from_stream.side_effect = slow_upload
+
+        asana_helpers.create_attachments(_body_html("slow.png"), "task")
+
+        self.assertTrue(upload_started.is_set())
+        self.assertEqual(["slow.png"], self._uploaded_file_names())
+        self.assertEqual(
+            {
+                asana_helpers._attachment_dedup_key(
+                    "task", "https://example.com/slow.png"
+                )
+            },
+            set(self.attachment_ids),
+        )
+        self.queue_deferred_attachments.assert_not_called()
+
+    @patch.object(asana_helpers.config, "ATTACHMENT_TIME_BUDGET_SECONDS", 0.1)
+    @patch.object(asana_helpers.config, "ATTACHMENT_REQUEST_TIMEOUT_SECONDS", 0.1)
+    def test_uploads_still_under_way_after_a_request_timeout_are_deferred(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def hanging_upload(*args, **kwargs):
+            release.wait(5)
+            return self._upload(*args, **kwargs)
+
+        self.create_attachment_on_task_from_stream.side_effect = hanging_upload
+
+        asana_helpers.create_attachments(_body_html("slow.png"), "task")
+
+        self.queue_deferred_attachments.assert_called_once_with(
+            "task",
+            [
+                {
+                    "file_name": "slow.png",
+                    "file_url": "https://example.com/slow.png",
+                    "file_type": "image/png",
+                }
+            ],
+            1,
+        )
+
+    def test_deferred_attachments_are_created_by_the_follow_up(self):
+        payload = {
+            "task_id": "task",
+            "attachments": [
+                {
+                    "file_name": "slow.png",
+                    "file_url": "https://example.com/slow.png",
+                    "file_type": "image/png",
+                }
+            ],
+            "deferrals": 1,
+        }
+
+        response = github_webhook.handle_github_webhook(
+            "sgtm_deferred_attachments", payload
+        )
+
+        self.assertEqual("200", response.status_code)
+        self.assertEqual(["slow.png"], self._uploaded_file_names())
+
+    @patch.object(asana_helpers.config, "ATTACHMENT_TIME_BUDGET_SECONDS", 0)
+    def test_attachments_are_given_up_on_after_max_deferrals(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self.urlopen.side_effect = lambda url, timeout: release.wait(5)
+
+        asana_helpers.create_deferred_attachments(
+            {
+                "task_id": "task",
+                "attachments": [
+                    {
+                        "file_name": "slow.png",
+                        "file_url": "https://example.com/slow.png",
+                        "file_type": "image/png",
+                    }
+                ],
+                "deferrals": asana_helpers.config.ATTACHMENT_MAX_DEFERRALS,
+            }
+        )
+
+        self.queue_deferred_attachments.assert_not_called()
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
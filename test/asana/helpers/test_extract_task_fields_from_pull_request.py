@@ -110,6 +110,7 @@ class BaseClass(MockDynamoDbTestCase):
 
     def setUp(self) -> None:
         super(BaseClass, self).setUp()
+        src.asana.helpers._project_custom_fields_cache.clear()
         patch_get_asana_domain_user_id_from_github_handle = patch(
             "src.aws.s3_client.get_asana_domain_user_id_from_github_handle",
             magic_mock_with_return_type_value(
@@ -1154,6 +1155,140 @@ class TestExtractsCustomFieldsFromPullRequest(BaseClass):
         self.assertIn("labels_sgtm", task_fields["custom_fields"])
         self.assertEqual([], task_fields["custom_fields"]["labels_sgtm"])
 
+    @patch("src.config.SGTM_FEATURE__SYNC_GITHUB_LABELS_ENABLED", True)
+    @patch("src.asana.client.get_project_custom_fields")
+    def test_labels_are_extracted_once_for_several_labels_sgtm_fields(
+        self, get_project_custom_fields, get_asana_id_from_github_node_id
+    ):
+        custom_fields = get_custom_fields([])
+        custom_fields.append(
+            {
+                "custom_field": CustomFieldSettingForTests(
+                    name="Labels (SGTM) World",
+                    gid="other_labels_sgtm",
+                    resource_subtype="multi_enum",
+                    enum_options=[
+                        EnumOptionSettingsForTests(
+                            name="bug", gid="other_bug_label", enabled=True
+                        )
+                    ],
+                )
+            }
+        )
+        get_project_custom_fields.return_value = custom_fields
+        pull_request = build(
+            builder.pull_request().labels(
+                [builder.label().name("bug"), builder.label().name("enhancement")]
+            )
+        )
+
+        with patch.object(pull_request, "labels", wraps=pull_request.labels) as labels:
+            task_fields = src.asana.helpers.extract_task_fields_from_pull_request(
+                pull_request
+            )
+
+        labels.assert_called_once()
+        self.assertEqual(
+            ["bug_label", "enhancement_label"],
+            task_fields["custom_fields"]["labels_sgtm"],
+        )
+        self.assertEqual(
+            ["other_bug_label"], task_fields["custom_fields"]["other_labels_sgtm"]
+        )
+
+
+@patch("src.aws.dynamodb_client.get_asana_id_from_github_node_id", return_value="0")
+class TestCachesProjectCustomFields(BaseClass):
+    @patch(
+        "src.asana.client.get_project_custom_fields", return_value=get_custom_fields([])
+    )
+    def test_custom_fields_are_fetched_once_per_project(
+        self, get_project_custom_fields, get_asana_id_from_github_node_id
+    ):
+        for _ in range(3):
+            src.asana.helpers.extract_task_fields_from_pull_request(
+                build(builder.pull_request().closed(False).isDraft(False))
+            )
+
+        get_project_custom_fields.assert_called_once_with("0")
+
+    @patch(
+        "src.asana.client.get_project_custom_fields", return_value=get_custom_fields([])
+    )
+    def test_custom_fields_are_refetched_after_ttl(
+        self, get_project_custom_fields, get_asana_id_from_github_node_id
+    ):
+        pull_request = build(builder.pull_request().closed(False).isDraft(False))
+        with patch("src.asana.helpers.time.time", return_value=1000.0):
+            src.asana.helpers.extract_task_fields_from_pull_request(pull_request)
+        with patch(
+            "src.asana.helpers.time.time",
+            return_value=1000.0
+            + src.asana.helpers.config.ASANA_PROJECT_CUSTOM_FIELDS_TTL_SECONDS,
+        ):
+            src.asana.helpers.extract_task_fields_from_pull_request(pull_request)
+
+        self.assertEqual(2, get_project_custom_fields.call_count)
+
+    @patch("src.asana.client.get_project_custom_fields")
+    def test_stale_custom_fields_are_refetched_when_an_enum_option_is_missing(
+        self, get_project_custom_fields, get_asana_id_from_github_node_id
+    ):
+        get_project_custom_fields.side_effect = [
+            get_custom_fields(["Open"]),
+            get_custom_fields([]),
+        ]
+        pull_request = build(builder.pull_request().closed(False).isDraft(False))
+        with patch("src.asana.helpers.time.time", return_value=1000.0):
+            task_fields = src.asana.helpers.extract_task_fields_from_pull_request(
+                pull_request
+            )
+        self.assertNotIn("pr_status", task_fields["custom_fields"])
+
+        with patch(
+            "src.asana.helpers.time.time",
+            return_value=1000.0
+            + src.asana.helpers._PROJECT_CUSTOM_FIELDS_MIN_REFRESH_SECONDS,
+        ):
+            task_fields = src.asana.helpers.extract_task_fields_from_pull_request(
+                pull_request
+            )
+        self.assertEqual("open", task_fields["custom_fields"]["pr_status"])
+        self.assertEqual(2, get_project_custom_fields.call_count)
+
+    @patch("src.asana.client.get_project_custom_fields")
+    def test_missing_enum_option_does_not_refetch_fresh_custom_fields(
+        self, get_project_custom_fields, get_asana_id_from_github_node_id
+    ):
+        get_project_custom_fields.return_value = get_custom_fields(["Open"])
+        pull_request = build(builder.pull_request().closed(False).isDraft(False))
+        for _ in range(3):
+            src.asana.helpers.extract_task_fields_from_pull_request(pull_request)
+
+        get_project_custom_fields.assert_called_once_with("0")
+
+    @patch.object(
+        src.asana.helpers._project_custom_fields_cache, "shared_cache_enabled", True
+    )
+    @patch(
+        "src.asana.client.get_project_custom_fields", return_value=get_custom_fields([])
+    )
+    def test_shared_cache_is_used_by_cold_processes(
+        self, get_project_custom_fields, get_asana_id_from_github_node_id
+    ):
+        pull_request = build(builder.pull_request().closed(False).isDraft(False))
+        task_fields = src.asana.helpers.extract_task_fields_from_pull_request(
+            pull_request
+        )
+
+        # Simulate a cold Lambda process
+        src.asana.helpers._project_custom_fields_cache.clear()
+        self.assertEqual(
+            task_fields,
+            src.asana.helpers.extract_task_fields_from_pull_request(pull_request),
+        )
+        get_project_custom_fields.assert_called_once_with("0")
+
 
 if __name__ == "__main__":
     from unittest import main as run_tests
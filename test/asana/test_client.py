@@ -1,4 +1,5 @@
 from unittest.mock import patch, Mock
+from asana.error import AsanaError  # type: ignore
 import src.asana.client
 from test.impl.base_test_case_class import BaseClass
 
@@ -43,6 +44,42 @@ class TestAsanaClientCreateTask(BaseClass):
             )
 
 
+class TestAsanaClientGetTask(BaseClass):
+    def test_get_task_requires_a_task_id(self):
+        with self.assertRaises(ValueError):
+            src.asana.client.get_task("")
+
+    def test_gets_task_with_opt_fields(self):
+        with patch.object(
+            asana_api_client.tasks,
+            "find_by_id",
+            return_value={
+                "gid": "TASK_ID",
+                "due_on": "2024-01-01",
+                "assignee": {"gid": "ASSIGNEE_ID", "resource_type": "user"},
+            },
+        ) as find_by_id:
+            task = src.asana.client.get_task("TASK_ID", ["due_on", "assignee"])
+
+        find_by_id.assert_called_once_with("TASK_ID", fields=["due_on", "assignee"])
+        self.assertEqual("TASK_ID", task.gid)
+        self.assertEqual("2024-01-01", task.due_on)
+        self.assertEqual("ASSIGNEE_ID", task.assignee_gid)
+        self.assertFalse(hasattr(task, "__dict__"))
+
+    def test_gets_full_task_without_opt_fields(self):
+        with patch.object(
+            asana_api_client.tasks,
+            "find_by_id",
+            return_value={"gid": "TASK_ID", "assignee": None},
+        ) as find_by_id:
+            task = src.asana.client.get_task("TASK_ID")
+
+        find_by_id.assert_called_once_with("TASK_ID")
+        self.assertIsNone(task.due_on)
+        self.assertIsNone(task.assignee_gid)
+
+
 class TestAsanaClientUpdateTask(BaseClass):
     def test_update_task_requires_a_task_id_and_fields(self):
         with self.assertRaises(ValueError):
@@ -96,6 +133,141 @@ class TestAsanaClientAddFollowers(BaseClass):
             )
 
 
+class TestAsanaClientWriteBatch(BaseClass):
+    def test_empty_batch_makes_no_request(self):
+        with patch.object(asana_api_client, "post") as post:
+            src.asana.client.new_write_batch().execute()
+            post.assert_not_called()
+
+    def test_batch_validates_writes(self):
+        batch = src.asana.client.new_write_batch()
+        with self.assertRaises(ValueError):
+            batch.update_task("", {"a": "b"})
+        with self.assertRaises(ValueError):
+            batch.add_followers("1", [""])
+        self.assertEqual(0, len(batch))
+
+    def test_batch_is_submitted_in_chunks_of_ten_actions(self):
+        batch = src.asana.client.new_write_batch()
+        writes = [batch.complete_task(str(task_id)) for task_id in range(1, 24)]
+        with patch.object(
+            asana_api_client,
+            "post",
+            side_effect=lambda path, data: [
+                {"status_code": 200, "headers": {}, "body": {"data": {"gid": "x"}}}
+            ]
+            * len(data["actions"]),
+        ) as post:
+            batch.execute()
+
+        self.assertEqual(
+            [10, 10, 3], [len(args[1]["actions"]) for args, _ in post.call_args_list]
+        )
+        self.assertTrue(all(write.error is None for write in writes))
+        self.assertEqual({"gid": "x"}, writes[0].body)
+
+    def test_each_write_gets_its_own_outcome(self):
+        batch = src.asana.client.new_write_batch()
+        update = batch.update_task("1", {"name": "new name"})
+        followers = batch.add_followers("1", ["FOLLOWER"])
+        with patch.object(
+            asana_api_client,
+            "post",
+            return_value=[
+                {"status_code": 200, "headers": {}, "body": {"data": {"gid": "1"}}},
+                {
+                    "status_code": 403,
+                    "headers": {},
+                    "body": {"errors": [{"message": "Forbidden"}]},
+                },
+            ],
+        ):
+            batch.execute()
+
+        update.raise_for_error()
+        self.assertIsNone(followers.body)
+        with self.assertRaises(AsanaError) as context:
+            followers.raise_for_error()
+        self.assertEqual(403, context.exception.status)
+        self.assertIn("Forbidden", str(context.exception))
+
+    def test_failed_batch_request_fails_all_of_its_writes(self):
+        batch = src.asana.client.new_write_batch()
+        writes = [batch.complete_task("1"), batch.complete_task("2")]
+        error = Exception("connection reset")
+        with patch.object(asana_api_client, "post", side_effect=error):
+            batch.execute()
+
+        self.assertEqual([error, error], [write.error for write in writes])
+
+    @patch.object(src.asana.client.time, "sleep")
+    def test_rate_limited_and_server_failed_writes_are_retried(self, sleep):
+        batch = src.asana.client.new_write_batch()
+        update = batch.update_task("1", {"name": "new name"})
+        followers = batch.add_followers("1", ["FOLLOWER"])
+        completion = batch.complete_task("2")
+        ok = {"status_code": 200, "headers": {}, "body": {"data": {"gid": "1"}}}
+        rate_limited = {
+            "status_code": 429,
+            "headers": {"Retry-After": "7"},
+            "body": {"errors": [{"message": "Rate Limit Enforced"}]},
+        }
+        server_error = {"status_code": 500, "headers": {}, "body": {}}
+        with patch.object(
+            asana_api_client,
+            "post",
+            side_effect=[[ok, rate_limited, server_error], [ok, server_error], [ok]],
+        ) as post:
+            batch.execute()
+
+        self.assertEqual(
+            [3, 2, 1], [len(args[1]["actions"]) for args, _ in post.call_args_list]
+        )
+        self.assertEqual(
+            "/tasks/2",
+            post.call_args_list[2][0][1]["actions"][0]["relative_path"],
+        )
+        # Retry-After is honored, then python-asana's backoff applies
+        self.assertEqual(
+            [7.0, asana_api_client.RETRY_DELAY * asana_api_client.RETRY_BACKOFF],
+            [args[0] for args, _ in sleep.call_args_list],
+        )
+        for write in [update, followers, completion]:
+            write.raise_for_error()
+
+    @patch.object(src.asana.client.time, "sleep")
+    def test_retryable_writes_fail_after_max_retries(self, sleep):
+        batch = src.asana.client.new_write_batch()
+        update = batch.update_task("1", {"name": "new name"})
+        with patch.object(
+            asana_api_client,
+            "post",
+            return_value=[{"status_code": 503, "headers": {}, "body": {}}],
+        ) as post:
+            batch.execute()
+
+        max_retries = asana_api_client.options["max_retries"]
+        self.assertEqual(max_retries + 1, post.call_count)
+        self.assertEqual(max_retries, sleep.call_count)
+        with self.assertRaises(AsanaError) as context:
+            update.raise_for_error()
+        self.assertEqual(503, context.exception.status)
+
+    @patch.object(src.asana.client.time, "sleep")
+    def test_other_failed_writes_are_not_retried(self, sleep):
+        batch = src.asana.client.new_write_batch()
+        batch.update_task("1", {"name": "new name"})
+        with patch.object(
+            asana_api_client,
+            "post",
+            return_value=[{"status_code": 400, "headers": {}, "body": {}}],
+        ) as post:
+            batch.execute()
+
+        post.assert_called_once()
+        sleep.assert_not_called()
+
+
 class TestAsanaClientAddComment(BaseClass):
     def test_add_comment_requires_a_task_id_and_comment_body(self):
         with self.assertRaises(ValueError):
@@ -1,3 +1,4 @@
+import copy
 from unittest.mock import patch, Mock, MagicMock, call
 from test.impl.builders import builder, build
 from datetime import datetime
@@ -5,8 +6,14 @@ from datetime import datetime
 
 from test.impl.base_test_case_class import BaseClass
 
+from asana.error import AsanaError  # type: ignore
+
 from src.github.models import Review, Comment
 from src.asana import controller
+import src.asana.client
+import src.metrics as metrics
+
+asana_api_client = src.asana.client.AsanaClient.singleton().asana_api_client
 
 
 @patch("src.asana.helpers.asana_comment_from_github_review")
@@ -22,11 +29,12 @@ class TestUpsertGithubReviewToTask(BaseClass):
     def _mock_comment(self, id):
         return MagicMock(spec=Comment, id=MagicMock(return_value=id))
 
-    def _mock_review(self, id, comments=[]):
+    def _mock_review(self, id, comments=[], database_id=None):
         return MagicMock(
             spec=Review,
             id=MagicMock(return_value=id),
             comments=MagicMock(return_value=comments),
+            database_id=MagicMock(return_value=database_id),
         )
 
     @patch(
@@ -84,6 +92,28 @@ class TestUpsertGithubReviewToTask(BaseClass):
         get_asana_id_from_github_node_id.assert_called_once_with(self.REVIEW_ID)
         asana_comment_from_github_review.assert_called_once_with(review)
 
+    @patch("src.aws.dynamodb_client.insert_github_review_database_id_mapping")
+    @patch(
+        "src.aws.dynamodb_client.get_asana_id_from_github_node_id", return_value=None
+    )
+    def test_created_review_records_its_database_id(
+        self,
+        get_asana_id_from_github_node_id,
+        insert_github_review_database_id_mapping,
+        bulk_insert_github_node_to_asana_id_mapping,
+        insert_github_node_to_asana_id_mapping,
+        add_comment,
+        asana_comment_from_github_review,
+    ):
+        review = self._mock_review(self.REVIEW_ID, database_id=424242)
+        add_comment.return_value = self.ASANA_COMMENT_ID
+
+        controller.upsert_github_review_to_task(review, self.ASANA_TASK_ID)
+
+        insert_github_review_database_id_mapping.assert_called_once_with(
+            424242, self.REVIEW_ID
+        )
+
     @patch("src.asana.client.update_comment")
     @patch(
         "src.aws.dynamodb_client.get_asana_id_from_github_node_id",
@@ -184,7 +214,9 @@ class TestUpsertGithubCommentToTask(BaseClass):
 
 class TestNewDueOnOrNone(BaseClass):
     def test_new_assignee_due_on_change(self):
-        task = {"assignee": {"gid": "123"}, "due_on": "2010-01-01"}
+        task = src.asana.client.AsanaTask.from_dict(
+            {"assignee": {"gid": "123"}, "due_on": "2010-01-01"}
+        )
         update_task_fields = {"assignee": "321"}
         self.assertEqual(
             controller._new_due_on_or_none(task, update_task_fields),
@@ -193,24 +225,32 @@ class TestNewDueOnOrNone(BaseClass):
 
     def test_new_assignee_due_on_today(self):
         due_on = datetime.now().strftime("%Y-%m-%d")
-        task = {"assignee": {"gid": "123"}, "due_on": due_on}
+        task = src.asana.client.AsanaTask.from_dict(
+            {"assignee": {"gid": "123"}, "due_on": due_on}
+        )
         update_task_fields = {"assignee": "321"}
         self.assertEqual(controller._new_due_on_or_none(task, update_task_fields), None)
 
     def test_new_assignee_due_on_in_the_future(self):
         future_due_on = "3000-01-01"
-        task = {"assignee": {"gid": "123"}, "due_on": future_due_on}
+        task = src.asana.client.AsanaTask.from_dict(
+            {"assignee": {"gid": "123"}, "due_on": future_due_on}
+        )
         update_task_fields = {"assignee": "321"}
         self.assertEqual(controller._new_due_on_or_none(task, update_task_fields), None)
 
     def test_same_assignee(self):
         assignee_gid = "123"
-        task = {"assignee": {"gid": assignee_gid}, "due_on": "2010-01-01"}
+        task = src.asana.client.AsanaTask.from_dict(
+            {"assignee": {"gid": assignee_gid}, "due_on": "2010-01-01"}
+        )
         update_task_fields = {"assignee": assignee_gid}
         self.assertEqual(controller._new_due_on_or_none(task, update_task_fields), None)
 
     def test_no_assignee(self):
-        task = {"assignee": None, "due_on": "2010-01-01"}
+        task = src.asana.client.AsanaTask.from_dict(
+            {"assignee": None, "due_on": "2010-01-01"}
+        )
         update_task_fields = {"assignee": "123"}
         self.assertEqual(
             controller._new_due_on_or_none(task, update_task_fields),
@@ -219,12 +259,29 @@ class TestNewDueOnOrNone(BaseClass):
 
     def test_null_due_on(self):
         assignee_gid = "123"
-        task = {"assignee": {"gid": assignee_gid}, "due_on": None}
+        task = src.asana.client.AsanaTask.from_dict(
+            {"assignee": {"gid": assignee_gid}, "due_on": None}
+        )
         update_task_fields = {"assignee": assignee_gid}
         self.assertEqual(controller._new_due_on_or_none(task, update_task_fields), None)
 
 
-@patch("src.asana.client.complete_task")
+def _batch_results(*status_codes):
+    return [
+        {"status_code": status_code, "headers": {}, "body": {"data": {}}}
+        if status_code < 300
+        else {
+            "status_code": status_code,
+            "headers": {},
+            "body": {"errors": [{"message": "task: Not a recognized ID"}]},
+        }
+        for status_code in status_codes
+    ]
+
+
+@patch("src.asana.controller.maybe_remove_autocomplete_failure_comment")
+@patch("src.asana.controller.maybe_add_autocomplete_failure_comment")
+@patch.object(asana_api_client, "post")
 @patch("src.asana.helpers.get_linked_task_ids")
 @patch("src.asana.logic.should_autocomplete_tasks_on_merge", return_value=True)
 class TestMaybeCompleteTasksOnMerge(BaseClass):
@@ -232,25 +289,189 @@ class TestMaybeCompleteTasksOnMerge(BaseClass):
         self,
         should_autocomplete_tasks_on_merge_mock,
         get_linked_task_ids_mock,
-        complete_task_mock,
+        post_mock,
+        add_failure_comment_mock,
+        remove_failure_comment_mock,
     ):
         get_linked_task_ids_mock.return_value = []
         pull_request = build(builder.pull_request().merged(True))
         controller.maybe_complete_tasks_on_merge(pull_request)
-        complete_task_mock.assert_not_called()
+        post_mock.assert_not_called()
 
     def test_updates_tasks_with_completed_true_if_has_task_id(
         self,
         should_autocomplete_tasks_on_merge_mock,
         get_linked_task_ids_mock,
-        complete_task_mock,
+        post_mock,
+        add_failure_comment_mock,
+        remove_failure_comment_mock,
     ):
         task_ids = ["123", "456"]
         get_linked_task_ids_mock.return_value = task_ids
+        post_mock.return_value = _batch_results(200, 200)
         pull_request = build(builder.pull_request().merged(True))
         controller.maybe_complete_tasks_on_merge(pull_request)
-        complete_task_mock.assert_any_call(task_ids[0])
-        complete_task_mock.assert_any_call(task_ids[1])
+        post_mock.assert_called_once_with(
+            "/batch",
+            {
+                "actions": [
+                    {
+                        "relative_path": f"/tasks/{task_id}",
+                        "method": "put",
+                        "data": {"completed": True},
+                    }
+                    for task_id in task_ids
+                ]
+            },
+        )
+        add_failure_comment_mock.assert_not_called()
+        remove_failure_comment_mock.assert_called_once_with(pull_request)
+
+    def test_failed_completions_are_reported_on_the_pull_request(
+        self,
+        should_autocomplete_tasks_on_merge_mock,
+        get_linked_task_ids_mock,
+        post_mock,
+        add_failure_comment_mock,
+        remove_failure_comment_mock,
+    ):
+        get_linked_task_ids_mock.return_value = ["123", "456"]
+        post_mock.return_value = _batch_results(200, 404)
+        pull_request = build(builder.pull_request().merged(True))
+        controller.maybe_complete_tasks_on_merge(pull_request)
+
+        add_failure_comment_mock.assert_called_once()
+        failed_tasks = add_failure_comment_mock.call_args[0][1]
+        self.assertEqual(1, len(failed_tasks))
+        task_url, error = failed_tasks[0]
+        self.assertIn("456", task_url)
+        self.assertIn("Not a recognized ID", error)
+        remove_failure_comment_mock.assert_not_called()
+
+
+class TestUpdateTask(BaseClass):
+    TASK_FIELDS = {
+        "name": "Task name",
+        "completed": False,
+        "custom_fields": {"pr_status": "open", "build": "success"},
+    }
+
+    def setUp(self):
+        metrics.reset()
+        self.field_hashes = {}
+
+        def set_task_field_hashes(gh_node_id, field_hashes):
+            self.field_hashes[gh_node_id] = field_hashes
+
+        self._patch(
+            "src.aws.dynamodb_client.set_task_field_hashes"
+        ).side_effect = set_task_field_hashes
+        self._patch(
+            "src.aws.dynamodb_client.get_task_field_hashes"
+        ).side_effect = lambda gh_node_id: self.field_hashes.get(gh_node_id, {})
+        self.remove_failure_comment_mock = self._patch(
+            "src.asana.controller.maybe_remove_autocomplete_failure_comment"
+        )
+        self.post_mock = self._patch_object(asana_api_client, "post")
+        self.find_by_id_mock = self._patch_object(
+            asana_api_client.tasks,
+            "find_by_id",
+            return_value={"gid": "123", "due_on": "3000-01-01"},
+        )
+        self.extract_task_fields_mock = self._patch(
+            "src.asana.helpers.extract_task_fields_from_pull_request",
+            side_effect=lambda pull_request: copy.deepcopy(self.TASK_FIELDS),
+        )
+        self.get_linked_task_ids_mock = self._patch(
+            "src.asana.helpers.get_linked_task_ids", return_value=["789"]
+        )
+        self.should_autocomplete_mock = self._patch(
+            "src.asana.logic.should_autocomplete_tasks_on_merge", return_value=True
+        )
+
+    def _patch(self, target, **kwargs):
+        patcher = patch(target, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def _patch_object(self, target, attribute, **kwargs):
+        patcher = patch.object(target, attribute, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def _actions(self, call_index=-1):
+        return self.post_mock.call_args_list[call_index][0][1]["actions"]
+
+    def test_writes_are_submitted_in_one_batch_request(self):
+        self.post_mock.return_value = _batch_results(200, 200, 200)
+        pull_request = build(builder.pull_request().merged(True))
+
+        controller.update_task(pull_request, "123", ["FOLLOWER"])
+
+        self.find_by_id_mock.assert_called_once_with(
+            "123", fields=["due_on", "assignee"]
+        )
+        self.post_mock.assert_called_once()
+        self.assertEqual(
+            ["/tasks/123", "/tasks/123/addFollowers", "/tasks/789"],
+            [action["relative_path"] for action in self._actions()],
+        )
+        self.remove_failure_comment_mock.assert_called_once_with(pull_request)
+
+    def test_failed_task_update_raises_after_handling_completions(self):
+        self.post_mock.return_value = _batch_results(403, 200)
+        pull_request = build(builder.pull_request().merged(True))
+
+        with self.assertRaises(AsanaError):
+            controller.update_task(pull_request, "123", [])
+
+        self.remove_failure_comment_mock.assert_called_once_with(pull_request)
+        # The fields weren't written, so they'll be sent again next time
+        self.assertEqual({}, self.field_hashes)
+
+    def test_unchanged_task_is_not_updated(self):
+        self.should_autocomplete_mock.return_value = False
+        self.post_mock.return_value = _batch_results(200)
+        pull_request = build(builder.pull_request())
+
+        controller.update_task(pull_request, "123", [])
+        controller.update_task(pull_request, "123", [])
+
+        self.post_mock.assert_called_once()
+        self.assertEqual(1, metrics.get_count("asana.task_updates_skipped"))
+        self.assertEqual(4, metrics.get_count("asana.task_fields_skipped"))
+
+    def test_only_changed_fields_are_sent(self):
+        self.should_autocomplete_mock.return_value = False
+        self.post_mock.return_value = _batch_results(200)
+        pull_request = build(builder.pull_request())
+        controller.update_task(pull_request, "123", [])
+
+        self.TASK_FIELDS = copy.deepcopy(self.TASK_FIELDS)
+        self.TASK_FIELDS["custom_fields"]["build"] = "failure"
+        controller.update_task(pull_request, "123", [])
+
+        self.assertEqual(
+            [
+                {
+                    "relative_path": "/tasks/123",
+                    "method": "put",
+                    "data": {"custom_fields": {"build": "failure"}},
+                }
+            ],
+            self._actions(),
+        )
+
+    def test_stale_due_date_is_sent_with_unchanged_fields(self):
+        self.should_autocomplete_mock.return_value = False
+        self.post_mock.return_value = _batch_results(200)
+        pull_request = build(builder.pull_request())
+        controller.update_task(pull_request, "123", [])
+
+        controller.update_task(pull_request, "123", [], force_update_due_today=True)
+
+        self.assertEqual(2, self.post_mock.call_count)
+        self.assertEqual(["due_on"], list(self._actions()[0]["data"].keys()))
 
 
 if __name__ == "__main__":
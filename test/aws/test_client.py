@@ -1,4 +1,14 @@
+import json
+import boto3  # type: ignore
+from moto import mock_s3  # type: ignore
+from unittest.mock import patch, ANY
+
 import src.aws.dynamodb_client as dynamodb_client
+import src.aws.s3_client as s3_client
+import src.aws.sqs_client as sqs_client
+import src.metrics as metrics
+from src.config import AWS_REGION, OBJECTS_TABLE
+from test.impl.base_test_case_class import BaseClass
 from test.impl.mock_dynamodb_test_case import MockDynamoDbTestCase
 
 
@@ -20,6 +30,421 @@ class DynamodbClientTest(MockDynamoDbTestCase):
             dynamodb_client.get_asana_id_from_github_node_id(gh_node_id), asana_id
         )
 
+    def test_asana_ids_are_cached(self):
+        metrics.reset()
+        dynamodb_client.insert_github_node_to_asana_id_mapping("cached-node", "111")
+
+        with patch.object(
+            dynamodb_client.DynamoDbClient.singleton().client, "get_item"
+        ) as get_item:
+            for _ in range(3):
+                self.assertEqual(
+                    "111",
+                    dynamodb_client.get_asana_id_from_github_node_id("cached-node"),
+                )
+            get_item.assert_not_called()
+        self.assertEqual(3, metrics.get_count("dynamodb.asana_id_cache_hits"))
+
+    def test_misses_are_not_cached(self):
+        self.assertIsNone(
+            dynamodb_client.get_asana_id_from_github_node_id("missing-node")
+        )
+        self.assertEqual({}, dynamodb_client.batch_get_asana_ids(["missing-node"]))
+
+        # Written by another process, e.g. one that created the task first
+        self.client.put_item(
+            TableName=OBJECTS_TABLE,
+            Item={"github-node": {"S": "missing-node"}, "asana-id": {"S": "222"}},
+        )
+        self.assertEqual(
+            "222", dynamodb_client.get_asana_id_from_github_node_id("missing-node")
+        )
+
+    def test_inserts_are_written_through_to_the_cache(self):
+        self.assertIsNone(dynamodb_client.get_asana_id_from_github_node_id("new-node"))
+        dynamodb_client.insert_github_node_to_asana_id_mapping("new-node", "333")
+        dynamodb_client.bulk_insert_github_node_to_asana_id_mapping(
+            [("bulk-node", "444")]
+        )
+
+        with patch.object(
+            dynamodb_client.DynamoDbClient.singleton().client, "get_item"
+        ) as get_item:
+            self.assertEqual(
+                "333", dynamodb_client.get_asana_id_from_github_node_id("new-node")
+            )
+            self.assertEqual(
+                "444", dynamodb_client.get_asana_id_from_github_node_id("bulk-node")
+            )
+            get_item.assert_not_called()
+
+    @patch.object(
+        dynamodb_client.DynamoDbClient.singleton()._asana_id_cache, "max_size", 2
+    )
+    def test_cache_evicts_least_recently_used_ids(self):
+        dynamodb_client.DynamoDbClient.singleton().clear_asana_id_cache()
+        for node_id in ["lru-1", "lru-2"]:
+            dynamodb_client.insert_github_node_to_asana_id_mapping(node_id, node_id)
+        dynamodb_client.get_asana_id_from_github_node_id("lru-1")
+        dynamodb_client.insert_github_node_to_asana_id_mapping("lru-3", "lru-3")
+
+        self.assertEqual(
+            ["lru-1", "lru-3"],
+            list(dynamodb_client.DynamoDbClient.singleton()._asana_id_cache),
+        )
+
+    def test_batch_get_asana_ids(self):
+        dynamodb_client.bulk_insert_github_node_to_asana_id_mapping(
+            [(f"batch-node-{i}", f"asana-{i}") for i in range(150)]
+        )
+        dynamodb_client.DynamoDbClient.singleton().clear_asana_id_cache()
+        node_ids = [f"batch-node-{i}" for i in range(150)] + ["batch-node-missing"]
+
+        with patch.object(
+            dynamodb_client.DynamoDbClient.singleton().client,
+            "batch_get_item",
+            wraps=dynamodb_client.DynamoDbClient.singleton().client.batch_get_item,
+        ) as batch_get_item:
+            asana_ids = dynamodb_client.batch_get_asana_ids(node_ids + node_ids[:10])
+
+        self.assertEqual(
+            {f"batch-node-{i}": f"asana-{i}" for i in range(150)}, asana_ids
+        )
+        self.assertEqual(
+            [100, 51],
+            [
+                len(kwargs["RequestItems"][OBJECTS_TABLE]["Keys"])
+                for _, kwargs in batch_get_item.call_args_list
+            ],
+        )
+
+        # Every association is now cached, and only the miss is read again
+        with patch.object(
+            dynamodb_client.DynamoDbClient.singleton().client,
+            "batch_get_item",
+            wraps=dynamodb_client.DynamoDbClient.singleton().client.batch_get_item,
+        ) as batch_get_item:
+            self.assertEqual(asana_ids, dynamodb_client.batch_get_asana_ids(node_ids))
+        self.assertEqual(
+            [[{"github-node": {"S": "batch-node-missing"}}]],
+            [
+                kwargs["RequestItems"][OBJECTS_TABLE]["Keys"]
+                for _, kwargs in batch_get_item.call_args_list
+            ],
+        )
+
+    @patch.object(dynamodb_client.time, "sleep")
+    def test_batch_get_asana_ids_retries_unprocessed_keys(self, sleep):
+        dynamodb_client.bulk_insert_github_node_to_asana_id_mapping(
+            [("unprocessed-1", "1"), ("unprocessed-2", "2")]
+        )
+        dynamodb_client.DynamoDbClient.singleton().clear_asana_id_cache()
+        client = dynamodb_client.DynamoDbClient.singleton().client
+        batch_get_item = client.batch_get_item
+
+        def process_one_key_at_a_time(RequestItems):
+            keys = RequestItems[OBJECTS_TABLE]["Keys"]
+            response = batch_get_item(
+                RequestItems={
+                    OBJECTS_TABLE: dict(RequestItems[OBJECTS_TABLE], Keys=keys[:1])
+                }
+            )
+            if len(keys) > 1:
+                response["UnprocessedKeys"] = {
+                    OBJECTS_TABLE: dict(RequestItems[OBJECTS_TABLE], Keys=keys[1:])
+                }
+            return response
+
+        with patch.object(
+            client, "batch_get_item", side_effect=process_one_key_at_a_time
+        ) as patched:
+            asana_ids = dynamodb_client.batch_get_asana_ids(
+                ["unprocessed-1", "unprocessed-2"]
+            )
+
+        self.assertEqual({"unprocessed-1": "1", "unprocessed-2": "2"}, asana_ids)
+        self.assertEqual(2, patched.call_count)
+        sleep.assert_called_once()
+
+    @patch.object(dynamodb_client.time, "sleep")
+    def test_batch_get_asana_ids_falls_back_to_get_item(self, sleep):
+        dynamodb_client.insert_github_node_to_asana_id_mapping("never-processed", "1")
+        dynamodb_client.DynamoDbClient.singleton().clear_asana_id_cache()
+        client = dynamodb_client.DynamoDbClient.singleton().client
+
+        with patch.object(
+            client,
+            "batch_get_item",
+            side_effect=lambda RequestItems: {
+                "Responses": {},
+                "UnprocessedKeys": RequestItems,
+            },
+        ):
+            asana_ids = dynamodb_client.batch_get_asana_ids(["never-processed"])
+
+        self.assertEqual({"never-processed": "1"}, asana_ids)
+        self.assertEqual(
+            dynamodb_client.DynamoDbClient.BATCH_GET_MAX_ATTEMPTS - 1, sleep.call_count
+        )
+
+    def test_bulk_insert_deduplicates_keys(self):
+        client = dynamodb_client.DynamoDbClient.singleton().client
+        with patch.object(
+            client, "batch_write_item", wraps=client.batch_write_item
+        ) as batch_write_item:
+            dynamodb_client.bulk_insert_github_node_to_asana_id_mapping(
+                [(f"bulk-dup-{i}", "first") for i in range(30)]
+                + [("bulk-dup-0", "second")]
+            )
+
+        self.assertEqual(
+            [25, 5],
+            sorted(
+                (
+                    len(kwargs["RequestItems"][OBJECTS_TABLE])
+                    for _, kwargs in batch_write_item.call_args_list
+                ),
+                reverse=True,
+            ),
+        )
+        dynamodb_client.DynamoDbClient.singleton().clear_asana_id_cache()
+        self.assertEqual(
+            "second", dynamodb_client.get_asana_id_from_github_node_id("bulk-dup-0")
+        )
+        self.assertEqual(
+            "first", dynamodb_client.get_asana_id_from_github_node_id("bulk-dup-29")
+        )
+
+    @patch.object(dynamodb_client.time, "sleep")
+    def test_bulk_insert_retries_unprocessed_items(self, sleep):
+        metrics.reset()
+        client = dynamodb_client.DynamoDbClient.singleton().client
+        batch_write_item = client.batch_write_item
+
+        def process_one_item_at_a_time(RequestItems):
+            requests = RequestItems[OBJECTS_TABLE]
+            response = batch_write_item(RequestItems={OBJECTS_TABLE: requests[:1]})
+            if len(requests) > 1:
+                response["UnprocessedItems"] = {OBJECTS_TABLE: requests[1:]}
+            return response
+
+        with patch.object(
+            client, "batch_write_item", side_effect=process_one_item_at_a_time
+        ):
+            dynamodb_client.bulk_insert_github_node_to_asana_id_mapping(
+                [("bulk-retry-1", "1"), ("bulk-retry-2", "2"), ("bulk-retry-3", "3")]
+            )
+
+        self.assertEqual(2, sleep.call_count)
+        self.assertEqual(2, metrics.get_count("dynamodb.batch_write_retries"))
+        self.assertEqual(3, metrics.get_count("dynamodb.batch_write_items"))
+        dynamodb_client.DynamoDbClient.singleton().clear_asana_id_cache()
+        self.assertEqual(
+            {"bulk-retry-1": "1", "bulk-retry-2": "2", "bulk-retry-3": "3"},
+            dynamodb_client.batch_get_asana_ids(
+                ["bulk-retry-1", "bulk-retry-2", "bulk-retry-3"]
+            ),
+        )
+
+    @patch.object(dynamodb_client.time, "sleep")
+    def test_bulk_insert_does_not_cache_unprocessed_items(self, sleep):
+        metrics.reset()
+        client = dynamodb_client.DynamoDbClient.singleton().client
+
+        with patch.object(
+            client,
+            "batch_write_item",
+            side_effect=lambda RequestItems: {"UnprocessedItems": RequestItems},
+        ):
+            dynamodb_client.bulk_insert_github_node_to_asana_id_mapping(
+                [("bulk-unprocessed", "1")]
+            )
+
+        self.assertEqual(
+            dynamodb_client.DynamoDbClient.BATCH_WRITE_MAX_ATTEMPTS - 1,
+            sleep.call_count,
+        )
+        self.assertEqual(1, metrics.get_count("dynamodb.batch_write_unprocessed_items"))
+        self.assertIsNone(
+            dynamodb_client.get_asana_id_from_github_node_id("bulk-unprocessed")
+        )
+
+    def test_get_task_field_hashes_and_set_task_field_hashes(self):
+        gh_node_id = "opqrstu"
+        dynamodb_client.insert_github_node_to_asana_id_mapping(gh_node_id, "654321")
+
+        self.assertEqual({}, dynamodb_client.get_task_field_hashes(gh_node_id))
+
+        dynamodb_client.set_task_field_hashes(
+            gh_node_id, {"name": "abc", "custom_fields.1": "def"}
+        )
+        dynamodb_client.set_task_field_hashes(gh_node_id, {"name": "ghi"})
+
+        self.assertEqual(
+            {"name": "ghi"}, dynamodb_client.get_task_field_hashes(gh_node_id)
+        )
+        self.assertEqual(
+            "654321", dynamodb_client.get_asana_id_from_github_node_id(gh_node_id)
+        )
+
+    def test_get_cache_entry_and_put_cache_entry(self):
+        cache_key = "some-cache/key"
+
+        self.assertIsNone(dynamodb_client.get_cache_entry(cache_key))
+
+        dynamodb_client.put_cache_entry(cache_key, 1700000000.5, '{"a": 1}')
+        self.assertEqual(
+            (1700000000.5, '{"a": 1}'), dynamodb_client.get_cache_entry(cache_key)
+        )
+
+        dynamodb_client.put_cache_entry(cache_key, 1700000001.0, '{"a": 2}')
+        self.assertEqual(
+            (1700000001.0, '{"a": 2}'), dynamodb_client.get_cache_entry(cache_key)
+        )
+
+
+@mock_s3
+class S3ClientTest(BaseClass):
+    BUCKET = "mapping-bucket"
+    KEY = "github_usernames_to_asana_gids.json"
+
+    def setUp(self):
+        self.s3 = boto3.client("s3", region_name=AWS_REGION)
+        self.s3.create_bucket(Bucket=self.BUCKET)
+        self._put_mapping({"octocat": "111", "hubot": "222"})
+        with patch.object(
+            s3_client,
+            "GITHUB_USERNAMES_TO_ASANA_GIDS_S3_PATH",
+            f"{self.BUCKET}/{self.KEY}",
+        ):
+            self.client = s3_client.S3Client()
+
+    def _put_mapping(self, mapping: dict):
+        self.s3.put_object(Bucket=self.BUCKET, Key=self.KEY, Body=json.dumps(mapping))
+
+    def test_mapping_is_loaded_once_for_many_usernames(self):
+        with patch.object(
+            self.client.s3_client, "get_object", wraps=self.client.s3_client.get_object
+        ) as get_object:
+            self.assertEqual(
+                "111",
+                self.client.get_asana_domain_user_id_from_github_username("octocat"),
+            )
+            self.assertEqual(
+                "222",
+                self.client.get_asana_domain_user_id_from_github_username("hubot"),
+            )
+            self.assertIsNone(
+                self.client.get_asana_domain_user_id_from_github_username("nobody")
+            )
+        get_object.assert_called_once()
+
+    @patch.object(s3_client, "GITHUB_USERNAMES_TO_ASANA_GIDS_TTL_SECONDS", 0)
+    def test_unchanged_mapping_is_revalidated_with_etag(self):
+        self.client.get_asana_domain_user_id_from_github_username("octocat")
+        etag = self.client._github_user_mapping_etag
+        self.assertIsNotNone(etag)
+
+        with patch.object(
+            self.client.s3_client, "get_object", wraps=self.client.s3_client.get_object
+        ) as get_object:
+            self.assertEqual(
+                "222",
+                self.client.get_asana_domain_user_id_from_github_username("hubot"),
+            )
+        get_object.assert_called_once_with(
+            Bucket=self.BUCKET, Key=self.KEY, IfNoneMatch=etag
+        )
+
+    @patch.object(s3_client, "GITHUB_USERNAMES_TO_ASANA_GIDS_TTL_SECONDS", 0)
+    def test_changed_mapping_is_reloaded_after_ttl(self):
+        self.assertIsNone(
+            self.client.get_asana_domain_user_id_from_github_username("newbie")
+        )
+        self._put_mapping({"newbie": "333"})
+        self.assertEqual(
+            "333", self.client.get_asana_domain_user_id_from_github_username("newbie")
+        )
+
+
+class SQSMessageGroupIdTest(BaseClass):
+    def test_pull_request_events_are_grouped_by_pull_request(self):
+        for event_type in [
+            "pull_request",
+            "pull_request_review",
+            "pull_request_review_comment",
+        ]:
+            body = json.dumps({"pull_request": {"node_id": "PR_1"}, "action": "x"})
+            self.assertEqual(
+                "PR_1", sqs_client.message_group_id_for_event(event_type, body)
+            )
+
+    def test_issue_comments_are_grouped_by_issue(self):
+        body = json.dumps({"issue": {"node_id": "PR_1"}, "comment": {"node_id": "C"}})
+        self.assertEqual(
+            "PR_1", sqs_client.message_group_id_for_event("issue_comment", body)
+        )
+
+    def test_status_and_check_suite_are_grouped_by_head_commit(self):
+        status = json.dumps({"sha": "abc123", "commit": {"node_id": "C_1"}})
+        check_suite = json.dumps({"check_suite": {"head_sha": "abc123"}})
+        self.assertEqual(
+            "commit-abc123", sqs_client.message_group_id_for_event("status", status)
+        )
+        self.assertEqual(
+            "commit-abc123",
+            sqs_client.message_group_id_for_event("check_suite", check_suite),
+        )
+
+    def test_unknown_payloads_use_the_default_group(self):
+        self.assertEqual(
+            sqs_client.DEFAULT_MESSAGE_GROUP_ID,
+            sqs_client.message_group_id_for_event("status", "not json"),
+        )
+
+    @patch.object(sqs_client, "queue_new_event")
+    def test_only_the_same_full_sync_request_shares_a_deduplication_id(
+        self, queue_new_event
+    ):
+        sqs_client.queue_full_sync("PR_1", "the-org", "COMMENT_1\nLGTM")
+        sqs_client.queue_full_sync("PR_1", "the-org", "COMMENT_1\nLGTM")
+        sqs_client.queue_full_sync("PR_1", "the-org", "COMMENT_2\nLGTM")
+        sqs_client.queue_full_sync("PR_2", "the-org", "COMMENT_2\nLGTM")
+
+        deduplication_ids = [
+            c.kwargs["message_deduplication_id"] for c in queue_new_event.call_args_list
+        ]
+        self.assertEqual(deduplication_ids[0], deduplication_ids[1])
+        self.assertEqual(3, len(set(deduplication_ids)))
+
+    @patch.object(sqs_client, "queue_new_event")
+    def test_full_sync_is_grouped_by_pull_request(self, queue_new_event):
+        sqs_client.queue_full_sync("PR_1", "the-org", "COMMENT_1\nLGTM")
+        queue_new_event.assert_called_once_with(
+            "pull_request",
+            json.dumps(
+                {
+                    "pull_request": {"node_id": "PR_1"},
+                    "organization": {"login": "the-org"},
+                }
+            ),
+            message_group_id="PR_1",
+            message_deduplication_id=ANY,
+        )
+
+    @patch.object(sqs_client, "queue_new_event")
+    def test_deferred_attachments_are_grouped_by_task(self, queue_new_event):
+        attachments = [{"file_name": "a.png", "file_url": "url", "file_type": "png"}]
+        sqs_client.queue_deferred_attachments("12345", attachments, 1)
+        queue_new_event.assert_called_once_with(
+            sqs_client.DEFERRED_ATTACHMENTS_EVENT,
+            json.dumps(
+                {"attachments": attachments, "deferrals": 1, "task_id": "12345"},
+                sort_keys=True,
+            ),
+            message_group_id="attachments-12345",
+        )
+
 
 if __name__ == "__main__":
     from unittest import main as run_tests
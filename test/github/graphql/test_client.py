@@ -1,17 +1,235 @@
-from unittest.mock import patch, call
+from unittest.mock import patch, call, MagicMock
+import src.metrics as metrics
 from src.github.graphql import client
+from src.github.models import PullRequest
 from src.github.graphql.queries import (
+    GetPullRequestsByRepositoryAndNumbers,
+    GetReview,
+    MAX_PULL_REQUESTS_PER_QUERY,
+    QUERY_DOCUMENTS,
     IterateReviewsForPullRequestId,
-    IteratePullRequestIdsForCommitId,
+    IteratePullRequestsForCommitId,
     GetTeamMembers,
 )
 from test.impl.base_test_case_class import BaseClass
+from test.impl.builders import builder
+
+NODE_RESOLUTION_ERROR_RESPONSE = {
+    "errors": [
+        {
+            "type": "NOT_FOUND",
+            "message": "Could not resolve to a node with the global id of 'PR_123'",
+        }
+    ]
+}
+
+MISSING_PULL_REQUEST_ERROR = {
+    "type": "NOT_FOUND",
+    "path": ["repository", "pullRequest0"],
+    "message": "Could not resolve to a PullRequest with the number of 2.",
+}
+
+
+@patch.object(client.time, "sleep")
+@patch.object(client, "sgtm_github_auth")
+class TestExecuteGraphqlQuery(BaseClass):
+    ORG_NAME = "FooOrganization"
+
+    def setUp(self):
+        metrics.reset()
+
+    def _mock_endpoint(self, sgtm_github_auth, responses):
+        endpoint = MagicMock(side_effect=responses)
+        sgtm_github_auth.return_value.get_graphql_endpoint.return_value = endpoint
+        return endpoint
+
+    def test_success_does_not_wait(self, sgtm_github_auth, sleep):
+        endpoint = self._mock_endpoint(sgtm_github_auth, [{"data": {"foo": "bar"}}])
+
+        actual = client._execute_graphql_query(self.ORG_NAME, frozenset(["q"]), {})
+
+        self.assertEqual({"foo": "bar"}, actual)
+        endpoint.assert_called_once_with("q", {})
+        sleep.assert_not_called()
+        self.assertEqual(
+            0, metrics.get_count("graphql.node_resolution_retried_queries")
+        )
+
+    def test_sends_the_compiled_query_document(self, sgtm_github_auth, sleep):
+        endpoint = self._mock_endpoint(sgtm_github_auth, [{"data": {"foo": "bar"}}])
+
+        client._execute_graphql_query(self.ORG_NAME, GetReview, {"reviewId": "r"})
+
+        endpoint.assert_called_once_with(
+            QUERY_DOCUMENTS[GetReview].text, {"reviewId": "r"}
+        )
+
+    def test_retries_node_resolution_errors_until_success(
+        self, sgtm_github_auth, sleep
+    ):
+        endpoint = self._mock_endpoint(
+            sgtm_github_auth,
+            [
+                NODE_RESOLUTION_ERROR_RESPONSE,
+                NODE_RESOLUTION_ERROR_RESPONSE,
+                {"data": {"foo": "bar"}},
+            ],
+        )
+
+        actual = client._execute_graphql_query(self.ORG_NAME, frozenset(["q"]), {})
+
+        self.assertEqual({"foo": "bar"}, actual)
+        self.assertEqual(3, endpoint.call_count)
+        self.assertEqual(2, sleep.call_count)
+        self.assertEqual(
+            1, metrics.get_count("graphql.node_resolution_retried_queries")
+        )
+        self.assertEqual(2, metrics.get_count("graphql.node_resolution_retries"))
+
+    def test_other_errors_are_not_retried(self, sgtm_github_auth, sleep):
+        endpoint = self._mock_endpoint(
+            sgtm_github_auth, [{"errors": [{"message": "Something else"}]}]
+        )
+
+        with self.assertRaises(ValueError):
+            client._execute_graphql_query(self.ORG_NAME, frozenset(["q"]), {})
+
+        endpoint.assert_called_once()
+        sleep.assert_not_called()
+
+    @patch.object(client, "GITHUB_GRAPHQL_NODE_RESOLUTION_RETRY_BUDGET_SECONDS", 0)
+    def test_gives_up_when_retry_budget_is_spent(self, sgtm_github_auth, sleep):
+        endpoint = self._mock_endpoint(
+            sgtm_github_auth, [NODE_RESOLUTION_ERROR_RESPONSE]
+        )
+
+        with self.assertRaises(ValueError):
+            client._execute_graphql_query(self.ORG_NAME, frozenset(["q"]), {})
+
+        endpoint.assert_called_once()
+        sleep.assert_not_called()
+
+    def test_allowed_unresolved_nodes_are_returned_as_null_without_waiting(
+        self, sgtm_github_auth, sleep
+    ):
+        endpoint = self._mock_endpoint(
+            sgtm_github_auth,
+            [{"data": {"review": None}, **NODE_RESOLUTION_ERROR_RESPONSE}],
+        )
+
+        actual = client._execute_graphql_query(
+            self.ORG_NAME, frozenset(["q"]), {}, allow_unresolved_nodes=True
+        )
+
+        self.assertEqual({"review": None}, actual)
+        endpoint.assert_called_once()
+        sleep.assert_not_called()
+
+    def test_allowed_missing_fields_are_returned_as_null(self, sgtm_github_auth, sleep):
+        self._mock_endpoint(
+            sgtm_github_auth,
+            [
+                {
+                    "data": {"repository": {"pullRequest0": None}},
+                    "errors": [MISSING_PULL_REQUEST_ERROR],
+                }
+            ],
+        )
+
+        actual = client._execute_graphql_query(
+            self.ORG_NAME, frozenset(["q"]), {}, allow_missing_fields=True
+        )
+
+        self.assertEqual({"repository": {"pullRequest0": None}}, actual)
+
+    def test_missing_fields_are_raised_unless_allowed(self, sgtm_github_auth, sleep):
+        self._mock_endpoint(
+            sgtm_github_auth,
+            [
+                {
+                    "data": {"repository": {"pullRequest0": None}},
+                    "errors": [MISSING_PULL_REQUEST_ERROR],
+                }
+            ],
+        )
+
+        with self.assertRaises(ValueError):
+            client._execute_graphql_query(self.ORG_NAME, frozenset(["q"]), {})
+
+    @patch.object(client, "GITHUB_GRAPHQL_NODE_RESOLUTION_RETRY_BUDGET_SECONDS", 0)
+    def test_unresolved_nodes_are_raised_when_missing_fields_are_allowed(
+        self, sgtm_github_auth, sleep
+    ):
+        self._mock_endpoint(
+            sgtm_github_auth,
+            [
+                {
+                    "data": {"repository": None},
+                    "errors": [
+                        {
+                            **NODE_RESOLUTION_ERROR_RESPONSE["errors"][0],
+                            "path": ["repository"],
+                        }
+                    ],
+                }
+            ],
+        )
+
+        with self.assertRaises(ValueError):
+            client._execute_graphql_query(
+                self.ORG_NAME, frozenset(["q"]), {}, allow_missing_fields=True
+            )
+
+    def test_other_errors_are_raised_when_unresolved_nodes_are_allowed(
+        self, sgtm_github_auth, sleep
+    ):
+        self._mock_endpoint(
+            sgtm_github_auth,
+            [
+                {
+                    "data": {"review": None},
+                    "errors": [
+                        *NODE_RESOLUTION_ERROR_RESPONSE["errors"],
+                        {"message": "Something else"},
+                    ],
+                }
+            ],
+        )
+
+        with self.assertRaises(ValueError):
+            client._execute_graphql_query(
+                self.ORG_NAME, frozenset(["q"]), {}, allow_unresolved_nodes=True
+            )
+
+
+@patch.object(client, "_execute_graphql_query")
+class TestGithubClientGetReview(BaseClass):
+    ORG_NAME = "FooOrganization"
+
+    def test_get_review(self, mock_query):
+        mock_query.return_value = {"review": {"id": "review-id", "databaseId": 1234}}
+
+        actual = client.get_review(self.ORG_NAME, "review-id")
+
+        self.assertEqual("review-id", actual.id())
+        self.assertEqual(1234, actual.database_id())
+        mock_query.assert_called_once_with(
+            self.ORG_NAME,
+            GetReview,
+            {"reviewId": "review-id"},
+            allow_unresolved_nodes=True,
+        )
+
+    def test_deleted_review_should_return_none(self, mock_query):
+        mock_query.return_value = {"review": None}
+
+        self.assertIsNone(client.get_review(self.ORG_NAME, "deleted-review-id"))
 
 
 @patch.object(client, "_execute_graphql_query")
 class TestGithubClientGetReviewForDatabaseId(BaseClass):
     ORG_NAME = "FooOrgnization"
-    REVIEW_DB_ID = "1234566"
+    REVIEW_DB_ID = 1234566
     PULL_REQUEST_ID = "PR_jiefjiejfji232--"
 
     def test_when_no_reviews_found__should_return_None(self, mock_query):
@@ -36,7 +254,7 @@ class TestGithubClientGetReviewForDatabaseId(BaseClass):
                         "edges": [
                             {
                                 "cursor": "some-cursor",
-                                "node": {"databaseId": "doesnt match"},
+                                "node": {"databaseId": 1},
                             }
                         ]
                     }
@@ -69,7 +287,7 @@ class TestGithubClientGetReviewForDatabaseId(BaseClass):
 
     def test_when_review_in_first_batch_matches__should_return_it(self, mock_query):
         matching_node = {"id": "matching-review", "databaseId": self.REVIEW_DB_ID}
-        other_node = {"id": "other-review", "databaseId": "doesnt match"}
+        other_node = {"id": "other-review", "databaseId": 1}
         mock_query.side_effect = [
             {
                 "node": {
@@ -98,7 +316,7 @@ class TestGithubClientGetReviewForDatabaseId(BaseClass):
 
     def test_when_review_in_second_batch_matches__should_return_it(self, mock_query):
         matching_node = {"id": "matching-review", "databaseId": self.REVIEW_DB_ID}
-        other_node = {"id": "other-review", "databaseId": "doesnt match"}
+        other_node = {"id": "other-review", "databaseId": 1}
         mock_query.side_effect = [
             {
                 "node": {
@@ -143,6 +361,17 @@ class TestGithubClientGetPullRequestForCommitId(BaseClass):
     COMMIT_ID = "C_jiefjiejfji232--"
     ORG_NAME = "BarOrganization"
 
+    def setUp(self):
+        client._pull_request_ids_by_commit_id.clear()
+
+    def _pull_request_node(self, pull_request_id: str, head_commit_id: str) -> dict:
+        return {
+            **builder.pull_request()
+            .commit(builder.commit().node_id(head_commit_id))
+            .to_raw(),
+            "id": pull_request_id,
+        }
+
     def test_no_pull_requests_found_should_return_none(self, mock_query):
         mock_query.return_value = {"commit": {"associatedPullRequests": {"edges": []}}}
 
@@ -154,7 +383,7 @@ class TestGithubClientGetPullRequestForCommitId(BaseClass):
         self.assertEqual(actual, None)
         mock_query.assert_called_once_with(
             self.ORG_NAME,
-            IteratePullRequestIdsForCommitId,
+            IteratePullRequestsForCommitId,
             {"commitId": self.COMMIT_ID},
         )
 
@@ -166,12 +395,9 @@ class TestGithubClientGetPullRequestForCommitId(BaseClass):
                         "edges": [
                             {
                                 "cursor": "some-cursor",
-                                "node": {
-                                    "id": "some-id",
-                                    "commits": {
-                                        "nodes": [{"commit": {"id": "last-commit"}}]
-                                    },
-                                },
+                                "node": self._pull_request_node(
+                                    "some-id", "last-commit"
+                                ),
                             }
                         ]
                     }
@@ -190,62 +416,175 @@ class TestGithubClientGetPullRequestForCommitId(BaseClass):
             [
                 call(
                     self.ORG_NAME,
-                    IteratePullRequestIdsForCommitId,
+                    IteratePullRequestsForCommitId,
                     {"commitId": self.COMMIT_ID},
                 ),
                 call(
                     self.ORG_NAME,
-                    IteratePullRequestIdsForCommitId,
+                    IteratePullRequestsForCommitId,
                     {"commitId": self.COMMIT_ID, "cursor": "some-cursor"},
                 ),
             ]
         )
+        self.assertEqual([], list(client._pull_request_ids_by_commit_id))
 
     @patch.object(client, "get_pull_request")
-    def test_pull_requests_match_last_commit_should_return_first(
+    def test_pull_requests_match_last_commit_should_return_first_in_one_query(
         self, mock_get_pull_request, mock_query
     ):
-        other_node = {"id": "pr-1", "commits": {"nodes": [{"commit": {"id": "other"}}]}}
-        matching_node = {
-            "id": "some-id",
-            "commits": {"nodes": [{"commit": {"id": self.COMMIT_ID}}]},
-        }
+        other_node = self._pull_request_node("pr-1", "other")
+        matching_node = self._pull_request_node("some-id", self.COMMIT_ID)
         mock_query.side_effect = [
             {
                 "commit": {
                     "associatedPullRequests": {
                         "edges": [
-                            {
-                                "cursor": "cursor-1",
-                                "node": other_node,
-                            },
-                            {
-                                "cursor": "cursor-2",
-                                "node": matching_node,
-                            },
+                            {"cursor": "cursor-1", "node": other_node},
+                            {"cursor": "cursor-2", "node": matching_node},
                             {
                                 "cursor": "cursor-3",
-                                "node": matching_node,
+                                "node": self._pull_request_node("pr-3", self.COMMIT_ID),
                             },
                         ]
                     }
                 }
             },
         ]
-        mock_get_pull_request.return_value = None
 
-        _ = client.get_pull_request_for_commit_id(
+        actual = client.get_pull_request_for_commit_id(
             self.ORG_NAME,
             self.COMMIT_ID,
         )
 
+        self.assertEqual("some-id", actual.id())
         mock_query.assert_called_once_with(
             self.ORG_NAME,
-            IteratePullRequestIdsForCommitId,
+            IteratePullRequestsForCommitId,
             {"commitId": self.COMMIT_ID},
         )
-        mock_get_pull_request.assert_called_once_with(
-            self.ORG_NAME, matching_node["id"]
+        mock_get_pull_request.assert_not_called()
+
+    @patch.object(client, "get_pull_request")
+    def test_repeated_statuses_for_a_commit_fetch_its_pull_request_directly(
+        self, mock_get_pull_request, mock_query
+    ):
+        mock_query.return_value = {
+            "commit": {
+                "associatedPullRequests": {
+                    "edges": [
+                        {
+                            "cursor": "cursor-1",
+                            "node": self._pull_request_node("some-id", self.COMMIT_ID),
+                        }
+                    ]
+                }
+            }
+        }
+        client.get_pull_request_for_commit_id(self.ORG_NAME, self.COMMIT_ID)
+        mock_get_pull_request.return_value = PullRequest(
+            self._pull_request_node("some-id", self.COMMIT_ID)
+        )
+
+        actual = client.get_pull_request_for_commit_id(self.ORG_NAME, self.COMMIT_ID)
+
+        self.assertIs(mock_get_pull_request.return_value, actual)
+        mock_get_pull_request.assert_called_once_with(self.ORG_NAME, "some-id")
+        self.assertEqual(1, mock_query.call_count)
+
+    @patch.object(client, "get_pull_request")
+    def test_cached_pull_request_is_searched_again_once_its_head_moves_on(
+        self, mock_get_pull_request, mock_query
+    ):
+        mock_query.side_effect = [
+            {
+                "commit": {
+                    "associatedPullRequests": {
+                        "edges": [
+                            {
+                                "cursor": "cursor-1",
+                                "node": self._pull_request_node(
+                                    "some-id", self.COMMIT_ID
+                                ),
+                            }
+                        ]
+                    }
+                }
+            },
+            {"commit": {"associatedPullRequests": {"edges": []}}},
+        ]
+        client.get_pull_request_for_commit_id(self.ORG_NAME, self.COMMIT_ID)
+        mock_get_pull_request.return_value = PullRequest(
+            self._pull_request_node("some-id", "new-head")
+        )
+
+        actual = client.get_pull_request_for_commit_id(self.ORG_NAME, self.COMMIT_ID)
+
+        self.assertIsNone(actual)
+        self.assertEqual(2, mock_query.call_count)
+        self.assertEqual([], list(client._pull_request_ids_by_commit_id))
+
+
+@patch.object(client, "_execute_graphql_query")
+class TestGithubClientGetPullRequestsByRepositoryAndNumbers(BaseClass):
+    ORG_NAME = "FooOrganization"
+    REPOSITORY_ID = "repository-id"
+
+    def _response(self, *numbers):
+        return {
+            "repository": {
+                f"pullRequest{i}": (
+                    None
+                    if number is None
+                    else {**builder.pull_request().to_raw(), "number": number}
+                )
+                for i, number in enumerate(numbers)
+            }
+        }
+
+    def test_pull_requests_are_fetched_in_batches(self, mock_query):
+        numbers = list(range(1, MAX_PULL_REQUESTS_PER_QUERY + 3))
+        mock_query.side_effect = [
+            self._response(*numbers[:MAX_PULL_REQUESTS_PER_QUERY]),
+            self._response(*numbers[MAX_PULL_REQUESTS_PER_QUERY:]),
+        ]
+
+        actual = client.get_pull_requests_by_repository_and_numbers(
+            self.ORG_NAME, self.REPOSITORY_ID, numbers
+        )
+
+        self.assertEqual(numbers, [pull_request.number() for pull_request in actual])
+        self.assertEqual(2, mock_query.call_count)
+        last_variables = mock_query.call_args[0][2]
+        self.assertEqual(
+            [numbers[-2], numbers[-1]]
+            + [numbers[-1]] * (MAX_PULL_REQUESTS_PER_QUERY - 2),
+            [last_variables[f"number{i}"] for i in range(MAX_PULL_REQUESTS_PER_QUERY)],
+        )
+        self.assertEqual(
+            [True, True] + [False] * (MAX_PULL_REQUESTS_PER_QUERY - 2),
+            [last_variables[f"include{i}"] for i in range(MAX_PULL_REQUESTS_PER_QUERY)],
+        )
+
+    def test_missing_pull_requests_are_left_out(self, mock_query):
+        mock_query.return_value = self._response(1, None, 3)
+
+        actual = client.get_pull_requests_by_repository_and_numbers(
+            self.ORG_NAME, self.REPOSITORY_ID, [1, 2, 3]
+        )
+
+        self.assertEqual([1, 3], [pull_request.number() for pull_request in actual])
+        mock_query.assert_called_once_with(
+            self.ORG_NAME,
+            GetPullRequestsByRepositoryAndNumbers,
+            {
+                "repositoryId": self.REPOSITORY_ID,
+                **{
+                    f"number{i}": [1, 2, 3][min(i, 2)]
+                    for i in range(MAX_PULL_REQUESTS_PER_QUERY)
+                },
+                **{f"include{i}": i < 3 for i in range(MAX_PULL_REQUESTS_PER_QUERY)},
+            },
+            allow_missing_fields=True,
         )
 
 
@@ -256,11 +595,12 @@ class TestGithubClientGetTeamMembers(BaseClass):
             "organization": {
                 "team": {
                     "members": {
+                        "pageInfo": {"hasNextPage": False, "endCursor": "c1"},
                         "nodes": [
                             {"login": "user1"},
                             {"login": "user2"},
                             {"login": "user3"},
-                        ]
+                        ],
                     }
                 }
             }
@@ -288,7 +628,16 @@ class TestGithubClientGetTeamMembers(BaseClass):
         )
 
     def test_get_team_members_empty_team(self, mock_query):
-        mock_query.return_value = {"organization": {"team": {"members": {"nodes": []}}}}
+        mock_query.return_value = {
+            "organization": {
+                "team": {
+                    "members": {
+                        "pageInfo": {"hasNextPage": False, "endCursor": None},
+                        "nodes": [],
+                    }
+                }
+            }
+        }
 
         actual = client.get_team_members("test-org", "empty-team")
 
@@ -299,6 +648,37 @@ class TestGithubClientGetTeamMembers(BaseClass):
             {"org": "test-org", "teamSlug": "empty-team"},
         )
 
+    def test_get_team_members_pages_through_all_members(self, mock_query):
+        def page(logins, end_cursor, has_next_page):
+            return {
+                "organization": {
+                    "team": {
+                        "members": {
+                            "pageInfo": {
+                                "hasNextPage": has_next_page,
+                                "endCursor": end_cursor,
+                            },
+                            "nodes": [{"login": login} for login in logins],
+                        }
+                    }
+                }
+            }
+
+        mock_query.side_effect = [
+            page(["user1", "user2"], "c1", True),
+            page(["user3"], "c2", False),
+        ]
+
+        actual = client.get_team_members("test-org", "big-team")
+
+        self.assertEqual(["user1", "user2", "user3"], actual)
+        mock_query.assert_called_with(
+            "test-org",
+            GetTeamMembers.GetTeamMembers,
+            {"org": "test-org", "teamSlug": "big-team", "cursor": "c1"},
+        )
+        self.assertEqual(2, mock_query.call_count)
+
 
 if __name__ == "__main__":
     from unittest import main as run_tests
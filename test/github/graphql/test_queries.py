@@ -0,0 +1,78 @@
+import json
+import os
+import subprocess
+import sys
+
+from graphql import parse  # type: ignore
+from graphql.language import FragmentDefinitionNode, OperationDefinitionNode  # type: ignore
+
+from src.github.graphql import queries
+from test.impl.base_test_case_class import BaseClass
+
+_PRINT_QUERY_IDS = (
+    "import json;"
+    " from src.github.graphql.queries import QUERY_DOCUMENTS;"
+    " print(json.dumps(sorted(d.id for d in QUERY_DOCUMENTS.values())))"
+)
+
+
+class TestQueryDocuments(BaseClass):
+    def test_registered_queries_are_valid_documents(self):
+        for document in queries.QUERY_DOCUMENTS.values():
+            definitions = parse(document.text).definitions
+            operation, fragments = definitions[0], definitions[1:]
+
+            self.assertIsInstance(operation, OperationDefinitionNode)
+            self.assertEqual(document.name, operation.name.value)
+            fragment_names = [fragment.name.value for fragment in fragments]
+            self.assertTrue(
+                all(isinstance(f, FragmentDefinitionNode) for f in fragments)
+            )
+            self.assertEqual(sorted(set(fragment_names)), fragment_names)
+
+    def test_query_ids_are_the_same_in_every_process(self):
+        ids = []
+        for hash_seed in ["1", "2"]:
+            result = subprocess.run(
+                [sys.executable, "-c", _PRINT_QUERY_IDS],
+                cwd=os.path.join(os.path.dirname(__file__), "..", "..", ".."),
+                env=dict(os.environ, ENV="test", PYTHONHASHSEED=hash_seed),
+                capture_output=True,
+                text=True,
+                timeout=60,
+            )
+            self.assertEqual(0, result.returncode, result.stderr)
+            ids.append(json.loads(result.stdout))
+
+        self.assertEqual(ids[0], ids[1])
+        self.assertEqual(sorted(d.id for d in queries.QUERY_DOCUMENTS.values()), ids[0])
+
+    def test_registered_queries_are_compiled_once(self):
+        self.assertIs(
+            queries.QUERY_DOCUMENTS[queries.GetReview],
+            queries.get_query_document(queries.GetReview),
+        )
+
+    def test_compile_query(self):
+        document = queries.compile_query(
+            frozenset(
+                [
+                    "fragment B on Foo { b }",
+                    "query Q { ...A ...B }",
+                    "fragment A on Foo { a }",
+                ]
+            )
+        )
+
+        self.assertEqual("Q", document.name)
+        self.assertEqual(
+            "query Q { ...A ...B }\nfragment A on Foo { a }\nfragment B on Foo { b }",
+            document.text,
+        )
+        self.assertEqual(64, len(document.id))
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
@@ -0,0 +1,100 @@
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from src.github import client
+from test.impl.base_test_case_class import BaseClass
+
+REPO_URL = "https://api.github.com/repos/FooOrganization/foo-repository"
+
+
+@patch.object(client, "sgtm_github_auth")
+class TestGithubClient(BaseClass):
+    OWNER = "FooOrganization"
+    REPOSITORY = "foo-repository"
+
+    def setUp(self):
+        client._get_repo.cache_clear()
+        client._get_pull_request_handle.cache_clear()
+
+    def _mock_session(self, sgtm_github_auth, status_code=200):
+        sgtm_github_auth.return_value.get_token.return_value.token = "token"
+        session = sgtm_github_auth.return_value.get_http_session.return_value
+        session.request.return_value = MagicMock(status_code=status_code, text="")
+        return session
+
+    def _requests(self, session):
+        return [
+            (args[0], args[1], kwargs["json"])
+            for args, kwargs in session.request.call_args_list
+        ]
+
+    def test_edit_pr_description_is_a_single_request(self, sgtm_github_auth):
+        session = self._mock_session(sgtm_github_auth)
+
+        client.edit_pr_description(self.OWNER, self.REPOSITORY, 12, "new description")
+
+        self.assertEqual(
+            [("PATCH", f"{REPO_URL}/pulls/12", {"body": "new description"})],
+            self._requests(session),
+        )
+
+    def test_edit_pr_title_is_a_single_request(self, sgtm_github_auth):
+        session = self._mock_session(sgtm_github_auth)
+
+        client.edit_pr_title(self.OWNER, self.REPOSITORY, 12, "new title")
+
+        self.assertEqual(
+            [("PATCH", f"{REPO_URL}/pulls/12", {"title": "new title"})],
+            self._requests(session),
+        )
+
+    def test_add_pr_comment_is_a_single_request(self, sgtm_github_auth):
+        session = self._mock_session(sgtm_github_auth)
+
+        client.add_pr_comment(self.OWNER, self.REPOSITORY, 12, "a comment")
+
+        self.assertEqual(
+            [("POST", f"{REPO_URL}/issues/12/comments", {"body": "a comment"})],
+            self._requests(session),
+        )
+
+    def test_edit_and_delete_comment_are_single_requests(self, sgtm_github_auth):
+        session = self._mock_session(sgtm_github_auth)
+
+        client.edit_comment(self.OWNER, self.REPOSITORY, 12, 34, "new body")
+        client.delete_comment(self.OWNER, self.REPOSITORY, 12, 34)
+
+        self.assertEqual(
+            [
+                ("PATCH", f"{REPO_URL}/issues/comments/34", {"body": "new body"}),
+                ("DELETE", f"{REPO_URL}/issues/comments/34", None),
+            ],
+            self._requests(session),
+        )
+
+    def test_set_pull_request_assignee_is_a_single_request(self, sgtm_github_auth):
+        session = self._mock_session(sgtm_github_auth)
+
+        client.set_pull_request_assignee(self.OWNER, self.REPOSITORY, 12, "octocat")
+
+        self.assertEqual(
+            [("PATCH", f"{REPO_URL}/issues/12", {"assignees": ["octocat"]})],
+            self._requests(session),
+        )
+
+    def test_failed_edits_raise(self, sgtm_github_auth):
+        self._mock_session(sgtm_github_auth, status_code=404)
+
+        with self.assertRaises(requests.HTTPError):
+            client.edit_pr_description(self.OWNER, self.REPOSITORY, 12, "description")
+
+    def test_handles_are_reused_across_calls(self, sgtm_github_auth):
+        session = self._mock_session(sgtm_github_auth)
+
+        client.edit_pr_title(self.OWNER, self.REPOSITORY, 12, "title")
+        client.edit_pr_description(self.OWNER, self.REPOSITORY, 12, "description")
+
+        self.assertEqual(1, client._get_pull_request_handle.cache_info().currsize)
+        self.assertEqual(1, client._get_pull_request_handle.cache_info().hits)
+        self.assertEqual(2, session.request.call_count)
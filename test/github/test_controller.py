@@ -6,6 +6,8 @@ import src.aws.dynamodb_client as dynamodb_client
 import src.aws.sqs_client as sqs_client
 import src.github.client as github_client
 import src.github.controller as github_controller
+from src.config import OBJECTS_TABLE
+from src.github.models import Comment
 from test.impl.builders import builder
 from test.impl.mock_dynamodb_test_case import MockDynamoDbTestCase
 
@@ -62,6 +64,36 @@ class GithubControllerTest(MockDynamoDbTestCase):
         create_task_mock.assert_not_called()
         update_task_mock.assert_called_with(pull_request, existing_task_id, ANY)
 
+    @patch.object(sqs_client, "queue_full_sync")
+    @patch.object(asana_controller, "update_task")
+    @patch.object(asana_controller, "create_task")
+    def test_upsert_pull_request_sees_a_task_created_since_a_miss(
+        self,
+        create_task_mock,
+        update_task_mock,
+        queue_full_sync_mock,
+        _get_asana_domain_id_mock,
+    ):
+        pull_request = builder.pull_request().build()
+        # A comment arrives before the task exists
+        github_controller.upsert_comment(
+            pull_request, builder.comment().build(), "the-org"
+        )
+        # Another invocation creates the task
+        existing_task_id = uuid4().hex
+        self.client.put_item(
+            TableName=OBJECTS_TABLE,
+            Item={
+                "github-node": {"S": pull_request.id()},
+                "asana-id": {"S": existing_task_id},
+            },
+        )
+
+        github_controller.upsert_pull_request(pull_request)
+
+        create_task_mock.assert_not_called()
+        update_task_mock.assert_called_with(pull_request, existing_task_id, ANY)
+
     @patch.object(github_client, "edit_pr_description")
     def test_add_asana_task_to_pull_request(
         self,
@@ -101,6 +133,42 @@ class GithubControllerTest(MockDynamoDbTestCase):
         github_controller.upsert_comment(pull_request, comment, org_name)
         add_comment_mock.assert_called_with(comment, existing_task_id)
 
+    @patch("src.asana.client.add_comment", return_value="new-asana-comment-id")
+    @patch("src.asana.helpers.create_attachments")
+    @patch("src.asana.helpers.asana_comment_from_github_comment")
+    @patch("src.asana.helpers.task_followers_from_comment", return_value=[])
+    @patch.object(Comment, "body_html", return_value="")
+    def test_upsert_comment_resolves_mappings_in_one_request(
+        self,
+        body_html_mock,
+        task_followers_mock,
+        asana_comment_mock,
+        create_attachments_mock,
+        add_comment_mock,
+        _get_asana_domain_id_mock,
+    ):
+        pull_request = builder.pull_request().build()
+        comment = builder.comment().build()
+        dynamodb_client.insert_github_node_to_asana_id_mapping(
+            pull_request.id(), uuid4().hex
+        )
+        dynamodb_client.DynamoDbClient.singleton().clear_asana_id_cache()
+        client = dynamodb_client.DynamoDbClient.singleton().client
+
+        with patch.object(
+            client, "batch_get_item", wraps=client.batch_get_item
+        ) as batch_get_item, patch.object(
+            client, "get_item", wraps=client.get_item
+        ) as get_item:
+            github_controller.upsert_comment(pull_request, comment, "the-org")
+
+        batch_get_item.assert_called_once()
+        # Only the comment's missing mapping is read again, right before its story is created
+        get_item.assert_called_once_with(
+            TableName=ANY, Key={"github-node": {"S": comment.id()}}
+        )
+        add_comment_mock.assert_called_once()
+
     @patch.object(sqs_client, "queue_full_sync")
     @patch.object(asana_controller, "upsert_github_comment_to_task")
     def test_queues_full_sync_on_approval_comment(
@@ -123,7 +191,9 @@ class GithubControllerTest(MockDynamoDbTestCase):
 
         github_controller.upsert_comment(pull_request, comment, org_name)
         add_comment_mock.assert_called_with(comment, existing_task_id)
-        queue_mock.assert_called_with(pull_request.id(), org_name)
+        queue_mock.assert_called_with(
+            pull_request.id(), org_name, f"{comment.id()}\nLGTM"
+        )
 
     @patch.object(sqs_client, "queue_full_sync")
     @patch.object(asana_controller, "upsert_github_comment_to_task")
@@ -139,7 +209,7 @@ class GithubControllerTest(MockDynamoDbTestCase):
 
         github_controller.upsert_comment(pull_request, comment, org_name)
         add_comment_mock.assert_not_called()
-        queue_mock.assert_called_with(pull_request.id(), org_name)
+        queue_mock.assert_called_with(pull_request.id(), org_name, ANY)
 
     @patch.object(github_client, "set_pull_request_assignee")
     def test_assign_pull_request_to_author(
@@ -0,0 +1,114 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from sgqlc.endpoint.http import HTTPEndpoint  # type: ignore
+
+from src.github import get_app_token
+from test.impl.base_test_case_class import BaseClass
+
+
+class _GraphQLStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.authorizations.append(self.headers["Authorization"])  # type: ignore
+        if body["query"] == "fail":
+            status, response = 502, b"bad gateway"
+        else:
+            status, response = 200, json.dumps({"data": {"ok": True}}).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _CountingServer(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _GraphQLStubHandler)
+        self.connections = 0
+        self.authorizations = []
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+class TestSessionURLOpener(BaseClass):
+    def setUp(self):
+        self.server = _CountingServer()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/graphql"
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_queries_share_one_connection(self):
+        session = get_app_token.new_http_session()
+        self.addCleanup(session.close)
+        endpoint = HTTPEndpoint(
+            self.url,
+            {"Authorization": "bearer token"},
+            urlopen=get_app_token.SessionURLOpener(session),
+        )
+
+        for _ in range(5):
+            self.assertEqual({"data": {"ok": True}}, endpoint("query { ok }"))
+
+        self.assertEqual(1, self.server.connections)
+
+    def test_http_errors_are_reported_like_urlopen(self):
+        session = get_app_token.new_http_session()
+        self.addCleanup(session.close)
+        endpoint = HTTPEndpoint(
+            self.url, {}, urlopen=get_app_token.SessionURLOpener(session)
+        )
+
+        with self.assertLogs("sgqlc.endpoint.http", level="ERROR"):
+            response = endpoint("fail")
+
+        self.assertIn("errors", response)
+        self.assertEqual(502, response["errors"][0]["status"])
+
+    def test_auto_refreshed_endpoint_refreshes_expired_tokens(self):
+        tokens = iter(["first-token", "second-token"])
+
+        class _Auth:
+            def get_token(self):
+                return get_app_token.GithubToken(token=next(tokens))
+
+        session = get_app_token.new_http_session()
+        self.addCleanup(session.close)
+        endpoint = get_app_token.GithubAutoRefreshedGraphQLEndpoint(
+            get_app_token.GithubAutoRefreshedAppTokenAuth(_Auth()),  # type: ignore
+            session,
+        )
+        endpoint.url = self.url
+
+        endpoint("query { ok }")
+        with patch.object(get_app_token, "is_expired", return_value=True):
+            endpoint("query { ok }")
+
+        self.assertEqual(
+            ["bearer first-token", "bearer second-token"], self.server.authorizations
+        )
+        self.assertEqual(1, self.server.connections)
+
+
+class TestSGTMGithubAppTokenAuth(BaseClass):
+    @patch.object(
+        get_app_token.SGTMGithubAppTokenAuth,
+        "get_token",
+        return_value=get_app_token.GithubToken(token="token"),
+    )
+    def test_graphql_endpoint_is_reused(self, get_token):
+        auth = get_app_token.SGTMGithubAppTokenAuth("sgtm", "FooOrganization")
+
+        self.assertIs(auth.get_graphql_endpoint(), auth.get_graphql_endpoint())
+        self.assertIs(auth.get_rest_client(), auth.get_rest_client())
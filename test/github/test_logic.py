@@ -6,6 +6,7 @@ import src.github.logic as github_logic
 from src.github.models import Commit, ReviewState, MergeableState
 from test.impl.builders import builder, build
 from test.impl.base_test_case_class import BaseClass
+from test.impl.mock_dynamodb_test_case import MockDynamoDbTestCase
 
 
 @patch.object(github_client, "merge_pull_request")
@@ -734,6 +735,9 @@ class TestMaybeAddAutomergeWarningTitleAndComment(unittest.TestCase):
 
 @patch("src.github.logic.github_graphql_client")
 class TestTeamMentionExpansion(BaseClass):
+    def setUp(self):
+        github_logic._team_members_cache.clear()
+
     def test_expand_team_mentions_success(self, mock_graphql_client):
         def get_team_members_side_effect(org, team_slug):
             if org == "org1" and team_slug == "team1":
@@ -813,6 +817,80 @@ class TestTeamMentionExpansion(BaseClass):
         self.assertEqual(1, mock_graphql_client.get_team_members.call_count)
 
 
+@patch("src.github.logic.github_graphql_client")
+class TestGetTeamMembers(MockDynamoDbTestCase):
+    @classmethod
+    def setUpClass(cls):
+        MockDynamoDbTestCase.setUpClass()
+
+    def setUp(self):
+        github_logic._team_members_cache.clear()
+
+    def test_team_members_are_cached_across_mentions(self, mock_graphql_client):
+        mock_graphql_client.get_team_members.return_value = ["user1", "user2"]
+
+        for _ in range(3):
+            self.assertEqual(
+                {"user1", "user2", "user3"},
+                github_logic._expand_team_mentions(["org1/team1", "user3"]),
+            )
+        self.assertEqual(
+            ["user1", "user2"], github_logic.get_team_members("org1", "team1")
+        )
+
+        mock_graphql_client.get_team_members.assert_called_once_with("org1", "team1")
+
+    def test_team_members_are_refetched_after_the_ttl(self, mock_graphql_client):
+        mock_graphql_client.get_team_members.side_effect = [["user1"], ["user2"]]
+
+        with patch("src.cache.time.time", return_value=1000):
+            self.assertEqual(["user1"], github_logic.get_team_members("org1", "team1"))
+        with patch(
+            "src.cache.time.time",
+            return_value=1000 + github_logic.GITHUB_TEAM_MEMBERS_TTL_SECONDS,
+        ):
+            self.assertEqual(["user2"], github_logic.get_team_members("org1", "team1"))
+
+    @patch.object(github_logic._team_members_cache, "max_size", 2)
+    def test_least_recently_used_teams_are_evicted(self, mock_graphql_client):
+        mock_graphql_client.get_team_members.side_effect = lambda org, team_slug: [
+            team_slug
+        ]
+
+        github_logic.get_team_members("org1", "team1")
+        github_logic.get_team_members("org1", "team2")
+        github_logic.get_team_members("org1", "team1")
+        github_logic.get_team_members("org1", "team3")
+
+        self.assertEqual(
+            ["org1/team1", "org1/team3"], list(github_logic._team_members_cache)
+        )
+
+    def test_failures_are_not_cached(self, mock_graphql_client):
+        mock_graphql_client.get_team_members.side_effect = [
+            Exception("API Error"),
+            ["user1"],
+        ]
+
+        with self.assertRaises(Exception):
+            github_logic.get_team_members("org1", "team1")
+        self.assertEqual(["user1"], github_logic.get_team_members("org1", "team1"))
+
+    @patch.object(github_logic._team_members_cache, "shared_cache_enabled", True)
+    def test_shared_cache_is_used_by_cold_processes(self, mock_graphql_client):
+        mock_graphql_client.get_team_members.return_value = ["user1", "user2"]
+        github_logic.get_team_members("org1", "shared-team")
+
+        # Simulate a cold Lambda process
+        github_logic._team_members_cache.clear()
+        self.assertEqual(
+            ["user1", "user2"], github_logic.get_team_members("org1", "shared-team")
+        )
+        mock_graphql_client.get_team_members.assert_called_once_with(
+            "org1", "shared-team"
+        )
+
+
 @patch.object(github_client, "delete_comment")
 @patch.object(github_client, "edit_comment")
 @patch.object(github_client, "add_pr_comment")
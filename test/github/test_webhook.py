@@ -1,5 +1,7 @@
-from unittest.mock import patch, MagicMock
+import threading
+from unittest.mock import call, patch, MagicMock
 
+import src.aws.dynamodb_client as dynamodb_client
 from src.github import webhook
 from src.github.models import PullRequest, PullRequestReviewComment, Review
 from test.impl.mock_dynamodb_test_case import MockDynamoDbTestCase
@@ -94,9 +96,10 @@ class TestHandlePullRequestReviewComment(MockDynamoDbTestCase):
         delete_comment,
     ):
         self.payload["action"] = "deleted"
+        self.payload["comment"]["pull_request_review_id"] = "unrecorded-review-id"
 
         pull_request = MagicMock(spec=PullRequest)
-        review = MagicMock(spec=Review)
+        review = MagicMock(spec=Review, id=MagicMock(return_value="review-node-id"))
         get_pull_request.return_value = pull_request
         get_review_for_database_id.return_value = review
 
@@ -107,9 +110,14 @@ class TestHandlePullRequestReviewComment(MockDynamoDbTestCase):
         )
         upsert_review.assert_called_once_with(pull_request, review, self.ORG_NAME)
         get_review_for_database_id.assert_called_once_with(
-            self.ORG_NAME, self.PULL_REQUEST_NODE_ID, self.PULL_REQUEST_REVIEW_ID
+            self.ORG_NAME, self.PULL_REQUEST_NODE_ID, "unrecorded-review-id"
         )
         delete_comment.assert_not_called()
+        # The review is found directly next time
+        self.assertEqual(
+            "review-node-id",
+            dynamodb_client.get_github_review_node_id("unrecorded-review-id"),
+        )
 
     @patch("src.github.controller.upsert_pull_request")
     @patch("src.github.graphql.client.get_review_for_database_id", return_value=None)
@@ -130,6 +138,126 @@ class TestHandlePullRequestReviewComment(MockDynamoDbTestCase):
         )
         delete_comment.assert_called_once_with(self.COMMENT_NODE_ID)
 
+    @patch("src.github.graphql.client.get_pull_request")
+    @patch("src.github.graphql.client.get_review_for_database_id")
+    @patch("src.github.graphql.client.get_review")
+    def test_comment_deletion_looks_up_recorded_reviews_directly(
+        self,
+        get_review,
+        get_review_for_database_id,
+        get_pull_request,
+        upsert_review,
+        delete_comment,
+    ):
+        self.payload["action"] = "deleted"
+        self.payload["comment"]["pull_request_review_id"] = "recorded-review-id"
+        dynamodb_client.insert_github_review_database_id_mapping(
+            "recorded-review-id", "review-node-id"
+        )
+        review = MagicMock(spec=Review)
+        get_review.return_value = review
+
+        webhook._handle_pull_request_review_comment(self.payload)
+
+        get_review.assert_called_once_with(self.ORG_NAME, "review-node-id")
+        get_review_for_database_id.assert_not_called()
+        upsert_review.assert_called_once_with(
+            get_pull_request.return_value, review, self.ORG_NAME
+        )
+        delete_comment.assert_not_called()
+
+    @patch("src.github.graphql.client.get_review_for_database_id")
+    @patch("src.github.graphql.client.get_review", return_value=None)
+    def test_comment_deletion_when_recorded_review_was_deleted(
+        self,
+        get_review,
+        get_review_for_database_id,
+        upsert_review,
+        delete_comment,
+    ):
+        self.payload["action"] = "deleted"
+        self.payload["comment"]["pull_request_review_id"] = "deleted-review-id"
+        dynamodb_client.insert_github_review_database_id_mapping(
+            "deleted-review-id", "deleted-review-node-id"
+        )
+
+        webhook._handle_pull_request_review_comment(self.payload)
+
+        get_review_for_database_id.assert_not_called()
+        upsert_review.assert_not_called()
+        delete_comment.assert_called_once_with(self.COMMENT_NODE_ID)
+
+
+@patch("src.github.logic.maybe_automerge_pull_request")
+@patch("src.github.controller.upsert_pull_request")
+@patch("src.github.graphql.client.get_pull_requests_by_repository_and_numbers")
+class TestHandleCheckSuiteWebhook(MockDynamoDbTestCase):
+    ORG_NAME = "Baz"
+    REPOSITORY_NODE_ID = "repository-node-id"
+
+    def _payload(self, *numbers: int) -> dict:
+        return {
+            "check_suite": {"pull_requests": [{"number": n} for n in numbers]},
+            "repository": {"node_id": self.REPOSITORY_NODE_ID},
+            "organization": {"login": self.ORG_NAME},
+        }
+
+    def _pull_request(self, id: str) -> MagicMock:
+        return MagicMock(spec=PullRequest, id=MagicMock(return_value=id))
+
+    def test_all_pull_requests_are_fetched_together_and_synced(
+        self,
+        get_pull_requests_by_repository_and_numbers,
+        upsert_pull_request,
+        maybe_automerge_pull_request,
+    ):
+        pull_requests = [self._pull_request("pr-1"), self._pull_request("pr-2")]
+        get_pull_requests_by_repository_and_numbers.return_value = pull_requests
+        # Only passes if both pull requests are synced at the same time
+        barrier = threading.Barrier(2, timeout=5)
+        upsert_pull_request.side_effect = lambda pull_request: barrier.wait()
+
+        response = webhook._handle_check_suite_webhook(self._payload(1, 2, 1))
+
+        self.assertEqual("200", response.status_code)
+        get_pull_requests_by_repository_and_numbers.assert_called_once_with(
+            self.ORG_NAME, self.REPOSITORY_NODE_ID, [1, 2]
+        )
+        upsert_pull_request.assert_has_calls(
+            [call(pull_request) for pull_request in pull_requests], any_order=True
+        )
+        self.assertEqual(2, maybe_automerge_pull_request.call_count)
+
+    def test_a_failed_pull_request_does_not_stop_the_others(
+        self,
+        get_pull_requests_by_repository_and_numbers,
+        upsert_pull_request,
+        maybe_automerge_pull_request,
+    ):
+        failing, other = self._pull_request("pr-1"), self._pull_request("pr-2")
+        get_pull_requests_by_repository_and_numbers.return_value = [failing, other]
+
+        def upsert(pull_request):
+            if pull_request is failing:
+                raise ValueError("failed to sync")
+
+        upsert_pull_request.side_effect = upsert
+
+        webhook._handle_check_suite_webhook(self._payload(1, 2))
+
+        upsert_pull_request.assert_any_call(other)
+
+    def test_no_pull_requests(
+        self,
+        get_pull_requests_by_repository_and_numbers,
+        upsert_pull_request,
+        maybe_automerge_pull_request,
+    ):
+        response = webhook._handle_check_suite_webhook(self._payload())
+
+        self.assertEqual("400", response.status_code)
+        get_pull_requests_by_repository_and_numbers.assert_not_called()
+
 
 if __name__ == "__main__":
     from unittest import main as run_tests
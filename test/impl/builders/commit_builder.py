@@ -10,7 +10,7 @@ class CommitBuilder(BuilderBaseClass):
         self.raw_commit = {
             "commit": {
                 "statusCheckRollup": {"state": status},
-                "node_id": create_uuid(),
+                "id": create_uuid(),
                 "checkSuites": {"nodes": []},
             }
         }
@@ -19,6 +19,10 @@ class CommitBuilder(BuilderBaseClass):
         self.raw_commit["commit"]["statusCheckRollup"]["state"] = status
         return self
 
+    def node_id(self, node_id: str) -> Union["CommitBuilder", Commit]:
+        self.raw_commit["commit"]["id"] = node_id
+        return self
+
     def check_suites(
         self, check_suites: List[Union[CheckSuiteBuilder, CheckSuite]]
     ) -> Union["CommitBuilder", Commit]:
@@ -40,7 +40,7 @@ class PullRequestBuilder(BuilderBaseClass):
                     {
                         "commit": {
                             "statusCheckRollup": {"state": Commit.BUILD_PENDING},
-                            "node_id": create_uuid(),
+                            "id": create_uuid(),
                             "checkSuites": {"nodes": []},
                         }
                     }
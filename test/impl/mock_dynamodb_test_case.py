@@ -6,6 +6,7 @@ or other external resources.
 import os
 import boto3  # type: ignore
 from moto import mock_dynamodb  # type: ignore
+from src.aws.dynamodb_client import DynamoDbClient
 from src.config import AWS_REGION, OBJECTS_TABLE, LOCK_TABLE
 from .base_test_case_class import BaseClass
 
@@ -37,6 +38,8 @@ class MockDynamoDbTestCase(BaseClass):
     @classmethod
     def setUpClass(cls):
         mock_dynamodb().__enter__()
+        # Each test class gets fresh tables, so it mustn't see mappings cached by another
+        DynamoDbClient.singleton().clear_asana_id_cache()
 
         client = boto3.client("dynamodb", region_name=AWS_REGION)
 
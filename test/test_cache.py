@@ -0,0 +1,65 @@
+from unittest.mock import patch
+
+from src.cache import Cache
+from test.impl.mock_dynamodb_test_case import MockDynamoDbTestCase
+
+
+class TestCache(MockDynamoDbTestCase):
+    @classmethod
+    def setUpClass(cls):
+        MockDynamoDbTestCase.setUpClass()
+
+    def test_values_are_cached(self):
+        cache: Cache[str] = Cache("test")
+        cache.put("key", "value")
+
+        self.assertEqual("value", cache.get("key"))
+        self.assertIsNone(cache.get("other-key"))
+
+    def test_values_expire_after_the_ttl(self):
+        cache: Cache[str] = Cache("test", ttl_seconds=10)
+        with patch("src.cache.time.time", return_value=1000):
+            cache.put("key", "value")
+        with patch("src.cache.time.time", return_value=1009):
+            self.assertEqual("value", cache.get("key"))
+            self.assertIsNone(cache.get("key", max_age_seconds=5))
+        with patch("src.cache.time.time", return_value=1010):
+            self.assertIsNone(cache.get("key"))
+
+    def test_least_recently_used_values_are_evicted(self):
+        cache: Cache[str] = Cache("test", max_size=2)
+        cache.put("key1", "value1")
+        cache.put("key2", "value2")
+        cache.get("key1")
+        cache.put("key3", "value3")
+
+        self.assertEqual(["key1", "key3"], list(cache))
+
+    def test_get_many_returns_only_cached_values(self):
+        cache: Cache[str] = Cache("test")
+        cache.put("key1", "value1")
+
+        self.assertEqual({"key1": "value1"}, cache.get_many(["key1", "key2"]))
+
+    def test_shared_cache_is_used_by_cold_processes(self):
+        cache: Cache[list] = Cache(
+            "test", shared_cache_key_prefix="test-cache", shared_cache_enabled=True
+        )
+        cache.put("key", ["value"])
+
+        # Simulate a cold Lambda process
+        cache.clear()
+        self.assertEqual(["value"], cache.get("key"))
+
+    def test_shared_cache_is_not_used_when_disabled(self):
+        cache: Cache[list] = Cache("test", shared_cache_key_prefix="test-cache-off")
+        cache.put("key", ["value"])
+
+        cache.clear()
+        self.assertIsNone(cache.get("key"))
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
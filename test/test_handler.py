@@ -1,7 +1,7 @@
 import json
 import hmac
 from python_dynamodb_lock.python_dynamodb_lock import DynamoDBLockError  # type: ignore
-from unittest.mock import patch
+from unittest.mock import patch, call
 
 import src.handler as handler
 from test.impl.base_test_case_class import BaseClass
@@ -70,18 +70,24 @@ class TestSQSRequeue(MockSQSTestCase):
             )
         self.assertEqual(response["statusCode"], "500")
 
-        messages = self.client.receive_message(QueueUrl=self.test_queue_url).get(
-            "Messages", []
-        )
+        messages = self.client.receive_message(
+            QueueUrl=self.test_queue_url, AttributeNames=["MessageGroupId"]
+        ).get("Messages", [])
 
         self.assertEqual(len(messages), 1)
         self.assertEqual(messages[0]["Body"], json.dumps(WEBHOOK_BODY_TEMPLATE))
+        # Grouped by the pull request, rather than one group for all messages
+        self.assertEqual(
+            messages[0]["Attributes"]["MessageGroupId"],
+            WEBHOOK_BODY_TEMPLATE["pull_request"]["node_id"],
+        )
 
     def test_no_requeue_for_sqs_event(self):
         response = handler.handler(
             event={
                 "Records": [
                     {
+                        "messageId": "message-1",
                         "messageAttributes": {"X-GitHub-Event": {"stringValue": None}},
                         "body": json.dumps(WEBHOOK_BODY_TEMPLATE),
                     }
@@ -89,7 +95,8 @@ class TestSQSRequeue(MockSQSTestCase):
             },
             context={},
         )
-        self.assertEqual(response["statusCode"], "400")
+        # A 400 can't succeed on retry, so the record isn't reported as failed
+        self.assertEqual(response, {"batchItemFailures": []})
 
         messages = self.client.receive_message(QueueUrl=self.test_queue_url).get(
             "Messages"
@@ -97,6 +104,137 @@ class TestSQSRequeue(MockSQSTestCase):
         self.assertIsNone(messages)
 
 
+def _sqs_record(message_id, event_type, body, message_group_id="group"):
+    return {
+        "messageId": message_id,
+        "attributes": {"MessageGroupId": message_group_id},
+        "messageAttributes": {"X-GitHub-Event": {"stringValue": event_type}},
+        "body": json.dumps(body),
+    }
+
+
+def _full_sync_body(pull_request_id):
+    return {
+        "pull_request": {"node_id": pull_request_id},
+        "organization": {"login": "Foo"},
+    }
+
+
+@patch.object(handler, "handle_github_webhook")
+class TestHandleSQSBatch(BaseClass):
+    def test_handles_every_record_in_the_batch(self, handle_github_webhook):
+        handle_github_webhook.return_value = {"statusCode": "200", "body": None}
+        records = [
+            _sqs_record("1", "pull_request", _full_sync_body("PR_1"), "PR_1"),
+            _sqs_record("2", "issue_comment", WEBHOOK_BODY_TEMPLATE, "PR_2"),
+            _sqs_record("3", "pull_request", _full_sync_body("PR_3"), "PR_3"),
+        ]
+
+        response = handler.handler(event={"Records": records}, context={})
+
+        self.assertEqual(response, {"batchItemFailures": []})
+        self.assertEqual(3, handle_github_webhook.call_count)
+
+    def test_reports_only_failed_records(self, handle_github_webhook):
+        handle_github_webhook.side_effect = [
+            {"statusCode": "200", "body": None},
+            {"statusCode": "500", "body": "error"},
+            {"statusCode": "200", "body": None},
+        ]
+        records = [
+            _sqs_record("1", "pull_request", _full_sync_body("PR_1"), "PR_1"),
+            _sqs_record("2", "pull_request", _full_sync_body("PR_2"), "PR_2"),
+            _sqs_record("3", "pull_request", _full_sync_body("PR_3"), "PR_3"),
+        ]
+
+        response = handler.handler(event={"Records": records}, context={})
+
+        self.assertEqual(response, {"batchItemFailures": [{"itemIdentifier": "2"}]})
+
+    def test_later_records_in_a_failed_message_group_are_not_handled(
+        self, handle_github_webhook
+    ):
+        handle_github_webhook.side_effect = [
+            {"statusCode": "500", "body": "error"},
+            {"statusCode": "200", "body": None},
+        ]
+        records = [
+            _sqs_record("1", "issue_comment", WEBHOOK_BODY_TEMPLATE, "PR_1"),
+            _sqs_record("2", "pull_request_review", WEBHOOK_BODY_TEMPLATE, "PR_1"),
+            _sqs_record("3", "pull_request", _full_sync_body("PR_2"), "PR_2"),
+        ]
+
+        response = handler.handler(event={"Records": records}, context={})
+
+        self.assertEqual(
+            response,
+            {"batchItemFailures": [{"itemIdentifier": "1"}, {"itemIdentifier": "2"}]},
+        )
+        self.assertEqual(2, handle_github_webhook.call_count)
+
+    def test_coalesces_full_syncs_for_the_same_pull_request(
+        self, handle_github_webhook
+    ):
+        handle_github_webhook.return_value = {"statusCode": "200", "body": None}
+        records = [
+            _sqs_record("1", "pull_request", _full_sync_body("PR_1"), "PR_1"),
+            _sqs_record("2", "issue_comment", WEBHOOK_BODY_TEMPLATE, "PR_1"),
+            _sqs_record("3", "pull_request", _full_sync_body("PR_1"), "PR_1"),
+        ]
+
+        response = handler.handler(event={"Records": records}, context={})
+
+        self.assertEqual(response, {"batchItemFailures": []})
+        # The full sync keeps its place ahead of the comment, so the comment finds the task
+        self.assertEqual(
+            [
+                call("pull_request", json.dumps(_full_sync_body("PR_1"))),
+                call("issue_comment", json.dumps(WEBHOOK_BODY_TEMPLATE)),
+            ],
+            handle_github_webhook.call_args_list,
+        )
+
+    def test_coalesced_records_are_not_retried_ahead_of_handled_records(
+        self, handle_github_webhook
+    ):
+        handle_github_webhook.side_effect = [
+            {"statusCode": "200", "body": None},
+            {"statusCode": "500", "body": "error"},
+        ]
+        records = [
+            _sqs_record("1", "pull_request", _full_sync_body("PR_1"), "PR_1"),
+            _sqs_record("2", "issue_comment", WEBHOOK_BODY_TEMPLATE, "PR_1"),
+            _sqs_record("3", "pull_request", _full_sync_body("PR_1"), "PR_1"),
+        ]
+
+        response = handler.handler(event={"Records": records}, context={})
+
+        # The full sync succeeded before the comment failed; only the comment and what follows it
+        # in the group are retried.
+        self.assertEqual(
+            response,
+            {"batchItemFailures": [{"itemIdentifier": "2"}, {"itemIdentifier": "3"}]},
+        )
+        self.assertEqual(2, handle_github_webhook.call_count)
+
+    def test_coalesced_records_fail_with_the_record_that_was_handled(
+        self, handle_github_webhook
+    ):
+        handle_github_webhook.return_value = {"statusCode": "500", "body": "error"}
+        records = [
+            _sqs_record("1", "pull_request", _full_sync_body("PR_1"), "PR_1"),
+            _sqs_record("2", "pull_request", _full_sync_body("PR_1"), "PR_1"),
+        ]
+
+        response = handler.handler(event={"Records": records}, context={})
+
+        handle_github_webhook.assert_called_once()
+        self.assertEqual(
+            response,
+            {"batchItemFailures": [{"itemIdentifier": "1"}, {"itemIdentifier": "2"}]},
+        )
+
+
 if __name__ == "__main__":
     from unittest import main as run_tests
 
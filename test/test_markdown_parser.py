@@ -1,8 +1,11 @@
 import re
+import time
 import unittest
 
+import src.markdown_parser as markdown_parser
 from src.markdown_parser import (
     convert_github_markdown_to_asana_xml,
+    extract_media_tag_attrs,
     sanitize_html_for_asana,
 )
 
@@ -530,6 +533,93 @@ class TestAnchorFlatteningAcrossInlineCalls(unittest.TestCase):
         xml3 = convert_github_markdown_to_asana_xml(md3)
         self.assertIn('<a href="https://example.com">https://example.com</a>', xml3)
 
+    def test_markdown_instance_is_reused(self):
+        convert_github_markdown_to_asana_xml("first")
+        markdown = markdown_parser._get_markdown()
+        convert_github_markdown_to_asana_xml("second")
+        self.assertIs(markdown, markdown_parser._get_markdown())
+
+    def test_anchor_state_does_not_leak_into_the_next_conversion(self):
+        # An <a> left open by one document must not stop auto-linking in the next
+        convert_github_markdown_to_asana_xml('<a href="https://example.com">unclosed')
+        xml = convert_github_markdown_to_asana_xml("See https://example.com for info")
+        self.assertIn('<a href="https://example.com">https://example.com</a>', xml)
+
+
+class TestLinkBareUrls(unittest.TestCase):
+    def _link(self, text: str) -> str:
+        return markdown_parser._link_bare_urls(text)
+
+    def test_url_is_linked(self):
+        self.assertEqual(
+            'See <a href="https://example.com/a?b=c">https://example.com/a?b=c</a> now',
+            self._link("See https://example.com/a?b=c now"),
+        )
+
+    def test_trailing_punctuation_is_not_part_of_the_url(self):
+        self.assertEqual(
+            'Go to <a href="https://example.com">https://example.com</a>.',
+            self._link("Go to https://example.com."),
+        )
+
+    def test_balanced_parentheses_are_part_of_the_url(self):
+        url = "https://en.wikipedia.org/wiki/Python_(language)"
+        self.assertEqual(f'(<a href="{url}">{url}</a>)', self._link(f"({url})"))
+
+    def test_url_ends_at_an_unclosed_parenthesis(self):
+        self.assertEqual(
+            '<a href="https://example.com/a">https://example.com/a</a>(b',
+            self._link("https://example.com/a(b"),
+        )
+
+    def test_urls_in_attributes_are_not_linked(self):
+        text = '<a href="https://example.com">'
+        self.assertEqual(text, self._link(text))
+
+    def test_pathological_input_is_scanned_in_linear_time(self):
+        # Took exponential time with the regex this scanner replaced
+        for text in [
+            "http://a" + "!" * 5000 + "(",
+            "https://a" + "(" * 5000,
+            "https://a" + "(b)" * 5000 + "!",
+        ]:
+            start = time.perf_counter()
+            self._link(text)
+            self.assertLess(time.perf_counter() - start, 1)
+
+    def test_urls_sharing_a_run_are_scanned_in_linear_time(self):
+        # Each URL used to rescan the rest of the run, taking about a minute
+        # for 72KB of "http://a("
+        for text in ["http://a(" * 8000, "http://(" * 9000]:
+            start = time.perf_counter()
+            self._link(text)
+            self.assertLess(time.perf_counter() - start, 1)
+
+    def test_each_url_in_a_run_is_linked(self):
+        self.assertEqual(
+            '<a href="http://a">http://a</a>(<a href="http://b">http://b</a>(',
+            self._link("http://a(http://b("),
+        )
+
+
+class TestExtractMediaTagAttrs(unittest.TestCase):
+    def test_img_and_video_attributes_are_extracted_in_order(self):
+        html = (
+            '<p><IMG SRC="https://example.com/a.png" alt="a &amp; b"></p>'
+            '<a href="https://example.com"><video src="https://example.com/b.mp4"'
+            " controls></video></a>"
+        )
+        self.assertEqual(
+            [
+                {"src": "https://example.com/a.png", "alt": "a & b"},
+                {"src": "https://example.com/b.mp4", "controls": None},
+            ],
+            extract_media_tag_attrs(html),
+        )
+
+    def test_media_tags_in_comments_are_ignored(self):
+        self.assertEqual([], extract_media_tag_attrs('<!-- <img src="a.png"> -->'))
+
 
 if __name__ == "__main__":
     from unittest import main as run_tests